@@ -0,0 +1,57 @@
+import random
+
+from hypr_shuffle_bag import ShuffleBag
+
+# Put your favorite swww transition types in this list
+
+TRANSITION_TYPES = ['simple', 'grow', 'center', 'outer']
+SWWW_COMMAND = ['swww', 'img']
+
+MIN_SECONDS_BETWEEN_TRANSITIONS = 10
+
+
+class BackgroundRotator(object):
+
+    # The Python counterpart of bin/hypr_background_changer's loop body, for hosting the background
+    # rotation inside bin/hypr_session_supervisor.py. Images come from the same shuffle bag.
+
+    _shuffle_bag: ShuffleBag
+    _seconds_between_transitions: float
+    _transition_types: list[str]
+    _last_transition_type: str | None
+
+
+    def __init__(self, shuffle_bag: ShuffleBag, seconds_between_transitions: float,
+                 transition_types: list[str] = None):
+        self._shuffle_bag = shuffle_bag
+        self._seconds_between_transitions = max(seconds_between_transitions, MIN_SECONDS_BETWEEN_TRANSITIONS)
+        self._transition_types = transition_types if transition_types else TRANSITION_TYPES
+        self._last_transition_type = None
+
+
+    @property
+    def seconds_between_transitions(self):
+        return self._seconds_between_transitions
+
+
+    @property
+    def transition_types(self):
+        return self._transition_types
+
+
+    def next_command(self, transition_types: list[str] = None) -> list[str] | None:
+        image = self._shuffle_bag.next_image()
+
+        if not image:
+            return None
+
+        # Do not use the same transition type twice in a row, unless there is only one to choose from.
+        # The power profile may restrict the transition types, e.g. to "simple" when on battery.
+
+        transition_types = transition_types if transition_types else self._transition_types
+        transition_types = [transition_type for transition_type in transition_types
+                            if transition_type != self._last_transition_type] or transition_types
+
+        self._last_transition_type = random.choice(transition_types)
+
+        return [*SWWW_COMMAND, '--transition-type', self._last_transition_type, image]
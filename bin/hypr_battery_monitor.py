@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+
+# Watch the battery level when using Hyprland as a DE, warn when it gets low, and lock and hibernate
+# the machine when it gets critically low. This replaces bin/currently_unused/hypr_low_batt, which
+# spawned acpi | grep | awk | cut pipelines several times per check.
+#
+# The battery is read straight from /sys/class/power_supply/BAT*/uevent, one read per battery per
+# check, and the kernel's power_supply uevents wake the monitor right away when the charger is
+# plugged in or unplugged, rather than waiting for the next check.
+#
+#       Battery <= 20% -> "Battery XX%! Charge soon!"
+#       Battery <= 15% -> "Warning Low Battery!"
+#       Battery <= 10% -> notify, then 30 seconds later hyprlock, then 1 second later hibernate,
+#                         unless the charger has been plugged in meanwhile
+#
+# Rather than checking at a fixed interval, a small ring buffer of (time, energy) samples gives a
+# rolling discharge rate, and the next check is scheduled a bit before the next level above is
+# predicted to be crossed, within --min-check-interval and --max-check-interval. At a high charge
+# that means a check every --max-check-interval seconds instead of every couple of minutes, while
+# a sudden heavy load (which shows up in power_now right away) pulls the next check in. Once at or
+# below 20%, checks happen at least every --check-interval seconds so the warnings keep repeating.
+#
+# Samples are timed with CLOCK_BOOTTIME, which unlike the monotonic clock keeps counting while the
+# machine is suspended, so the energy drained during a suspend is not taken for a sudden heavy load.
+# How far off each prediction was is printed on every check that follows one, to tune the above by.
+#
+# For example:
+#
+#                           $HOME/bin/hypr_battery_monitor.py & disown
+
+import argparse
+import os
+import subprocess
+import time
+
+from collections import deque
+
+from hypr_power_supply import (
+    POWER_SUPPLY_DIR,
+    POWER_SUPPLY_SUBSYSTEM,
+    BatteryStatus,
+    find_batteries,
+    read_battery_status
+)
+
+from hypr_uevent import UeventListener
+
+HOME_DIR = os.getenv('HOME')
+
+BATTERY_CHECK_INTERVAL_SECONDS = 120
+MIN_BATTERY_CHECK_INTERVAL_SECONDS = 15
+MAX_BATTERY_CHECK_INTERVAL_SECONDS = 1800
+DISCHARGE_SAMPLES = 8
+PREDICTION_SAFETY_FACTOR = 0.75
+SECONDS_PER_HOUR = 3600
+WARNING_BATTERY_LEVEL = 20
+LOW_BATTERY_LEVEL = 15
+CRITICAL_BATTERY_LEVEL = 10
+LOCK_DELAY_SECONDS = 30
+HIBERNATE_DELAY_SECONDS = 1
+BATTERY_LEVELS = [WARNING_BATTERY_LEVEL, LOW_BATTERY_LEVEL, CRITICAL_BATTERY_LEVEL]
+
+NOTIFY_COMMAND = ['/usr/bin/notify-send', '-u', 'critical', '-t', '5000', '-i',
+                  f'{HOME_DIR}/Pictures/favicon.ico', '--']
+LOCK_COMMAND = ['hyprlock']
+HIBERNATE_COMMAND = ['/usr/bin/systemctl', 'hibernate']
+
+
+class DischargeEstimator(object):
+
+    _samples: deque[tuple[float, int]]
+
+
+    def __init__(self, max_samples: int = DISCHARGE_SAMPLES):
+        self._samples = deque(maxlen=max_samples)
+
+
+    @property
+    def samples(self):
+        return self._samples
+
+
+    def add_sample(self, now: float, energy_now: int):
+        self._samples.append((now, energy_now))
+
+
+    def reset(self):
+        self._samples.clear()
+
+
+    def discharge_rate(self, power_now: int = 0) -> float:
+
+        # Energy drained per second, from a least squares fit of the samples. The instantaneous
+        # power_now (energy per hour) wins when it is higher, so a sudden heavy load is not hidden by
+        # the lighter load the older samples were taken under.
+
+        rolling_rate = 0.0
+
+        if len(self._samples) > 1:
+            mean_time = sum(sample_time for sample_time, _ in self._samples) / len(self._samples)
+            mean_energy = sum(energy for _, energy in self._samples) / len(self._samples)
+            time_variance = sum((sample_time - mean_time) ** 2 for sample_time, _ in self._samples)
+
+            if time_variance > 0:
+                rolling_rate = -sum((sample_time - mean_time) * (energy - mean_energy)
+                                    for sample_time, energy in self._samples) / time_variance
+
+        return max(rolling_rate, power_now / SECONDS_PER_HOUR)
+
+
+class BatteryMonitor(object):
+
+    _batteries: list[str]
+    _check_interval: float
+    _min_check_interval: float
+    _max_check_interval: float
+    _verbose: bool
+    _discharge_estimator: DischargeEstimator
+    _predicted_energy: float | None
+    _lock_at: float | None
+    _hibernate_at: float | None
+    _last_notified_at: float | None
+    _last_notified_level: int | None
+    _lock_process: subprocess.Popen | None
+
+
+    def __init__(self, power_supply_dir: str = POWER_SUPPLY_DIR,
+                 check_interval: float = BATTERY_CHECK_INTERVAL_SECONDS,
+                 min_check_interval: float = MIN_BATTERY_CHECK_INTERVAL_SECONDS,
+                 max_check_interval: float = MAX_BATTERY_CHECK_INTERVAL_SECONDS, verbose: bool = False):
+        self._batteries = find_batteries(power_supply_dir)
+        self._check_interval = check_interval
+        self._min_check_interval = min_check_interval
+        self._max_check_interval = max(max_check_interval, check_interval)
+        self._verbose = verbose
+        self._discharge_estimator = DischargeEstimator()
+        self._predicted_energy = None
+        self._lock_at = None
+        self._hibernate_at = None
+        self._last_notified_at = None
+        self._last_notified_level = None
+        self._lock_process = None
+
+
+    @property
+    def batteries(self):
+        return self._batteries
+
+
+    @property
+    def check_interval(self):
+        return self._check_interval
+
+
+    @property
+    def min_check_interval(self):
+        return self._min_check_interval
+
+
+    @property
+    def max_check_interval(self):
+        return self._max_check_interval
+
+
+    def check(self, now: float = None) -> float:
+
+        # Returns the number of seconds until the next check is due. The low battery escalation is
+        # kept as deadlines rather than sleeps, so an uevent arriving meanwhile (i.e. the charger was
+        # plugged in) cancels it right away.
+
+        now = time.clock_gettime(time.CLOCK_BOOTTIME) if now is None else now
+        battery_status = read_battery_status(self._batteries)
+
+        if self._verbose:
+            print(f'Battery => {battery_status}', flush=True)
+
+        # As with the acpi checks this replaces, anything but Charging and Full counts as running on the
+        # battery, e.g. "Not charging" or "Unknown" from a battery that does not report its status well
+
+        if not battery_status or battery_status.charging or battery_status.full:
+            self._lock_at = None
+            self._hibernate_at = None
+            self._last_notified_level = None
+            self._discharge_estimator.reset()
+            self._predicted_energy = None
+
+            # Nothing to predict while charging, the unplug uevent will wake the monitor
+
+            return self._max_check_interval
+
+        if self._hibernate_at is not None:
+            if now < self._hibernate_at:
+                return self._hibernate_at - now
+
+            self._hibernate_at = None
+            subprocess.run(HIBERNATE_COMMAND)
+
+            return self._check_interval
+
+        if self._lock_at is not None:
+            if now < self._lock_at:
+                return self._lock_at - now
+
+            self._lock_at = None
+            self._hibernate_at = now + HIBERNATE_DELAY_SECONDS
+
+            if not self._lock_process or self._lock_process.poll() is not None:
+                self._lock_process = subprocess.Popen(LOCK_COMMAND)
+
+            return HIBERNATE_DELAY_SECONDS
+
+        battery_level = battery_status.capacity
+
+        self.log_prediction_error(battery_status)
+        self._discharge_estimator.add_sample(now, battery_status.energy_now)
+
+        if battery_level <= CRITICAL_BATTERY_LEVEL:
+            self.notify('LOW BATT! Locking and hibernating in 30 seconds!', CRITICAL_BATTERY_LEVEL, now,
+                        force=True)
+            self._lock_at = now + LOCK_DELAY_SECONDS
+
+            return LOCK_DELAY_SECONDS
+        elif battery_level <= LOW_BATTERY_LEVEL:
+            self.notify('Warning Low Battery!', LOW_BATTERY_LEVEL, now)
+        elif battery_level <= WARNING_BATTERY_LEVEL:
+            self.notify(f'Battery {battery_level}%! Charge soon!', WARNING_BATTERY_LEVEL, now)
+
+        return self.next_check_delay(battery_status)
+
+
+    def next_check_delay(self, battery_status: BatteryStatus) -> float:
+        battery_level = battery_status.capacity
+        next_level = next((level for level in BATTERY_LEVELS if level < battery_level), None)
+        discharge_rate = self._discharge_estimator.discharge_rate(battery_status.power_now)
+
+        # Keep repeating the warnings at the usual interval once at or below the first level
+
+        max_delay = self._max_check_interval if battery_level > WARNING_BATTERY_LEVEL else self._check_interval
+
+        if next_level is None or discharge_rate <= 0 or not battery_status.energy_full:
+            self._predicted_energy = None
+
+            return min(self._check_interval, max_delay)
+
+        # The level is an integer percentage, so it reads next_level as soon as the energy drops below
+        # next_level + 1 percent
+
+        next_level_energy = battery_status.energy_full * (next_level + 1) / 100
+        seconds_to_next_level = max(battery_status.energy_now - next_level_energy, 0) / discharge_rate
+        delay = min(max(seconds_to_next_level * PREDICTION_SAFETY_FACTOR, self._min_check_interval), max_delay)
+
+        self._predicted_energy = battery_status.energy_now - discharge_rate * delay
+
+        if self._verbose:
+            print(f'Discharge rate => {discharge_rate * SECONDS_PER_HOUR:.0f}/h, {next_level}% predicted in '
+                  + f'{seconds_to_next_level:.0f}s, next check in {delay:.0f}s', flush=True)
+
+        return delay
+
+
+    def log_prediction_error(self, battery_status: BatteryStatus):
+        if self._predicted_energy is None or not battery_status.energy_full:
+            return
+
+        prediction_error = 100 * (battery_status.energy_now - self._predicted_energy) / battery_status.energy_full
+        self._predicted_energy = None
+
+        print(f'Prediction error => {prediction_error:+.2f}% of full charge', flush=True)
+
+
+    def notify(self, message: str, level: int, now: float, force: bool = False):
+
+        # Battery uevents also arrive as the level drops, so only repeat the same warning once per
+        # check interval, but do warn right away when a lower level is reached
+
+        if not force and self._last_notified_level == level \
+                and now - self._last_notified_at < self._check_interval:
+            return
+
+        self._last_notified_at = now
+        self._last_notified_level = level
+
+        subprocess.run([*NOTIFY_COMMAND, message])
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Watches the battery level, warns when it is low, and locks and hibernates the machine when it is
+    critically low.
+    ''',
+        epilog='Hyprland battery monitor',
+        argument_default=None,
+        usage='''
+    [-h]
+    [--check-interval <seconds>]
+    [--min-check-interval <seconds>]
+    [--max-check-interval <seconds>]
+    [--verbose]
+    '''
+        )
+
+    arg_parser.add_argument(
+        '--check-interval',
+        '-i',
+        help=f'Seconds between battery checks at or below {WARNING_BATTERY_LEVEL}%, '
+             + f'defaults to {BATTERY_CHECK_INTERVAL_SECONDS}',
+        type=float,
+        default=BATTERY_CHECK_INTERVAL_SECONDS
+        )
+
+    arg_parser.add_argument(
+        '--min-check-interval',
+        help=f'Fewest seconds between battery checks, defaults to {MIN_BATTERY_CHECK_INTERVAL_SECONDS}',
+        type=float,
+        default=MIN_BATTERY_CHECK_INTERVAL_SECONDS
+        )
+
+    arg_parser.add_argument(
+        '--max-check-interval',
+        help=f'Most seconds between battery checks, defaults to {MAX_BATTERY_CHECK_INTERVAL_SECONDS}',
+        type=float,
+        default=MAX_BATTERY_CHECK_INTERVAL_SECONDS
+        )
+
+    arg_parser.add_argument(
+        '--verbose',
+        '-v',
+        help='Print output to the CLI verbosely',
+        action='store_true'
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    uevent_listener = UeventListener({POWER_SUPPLY_SUBSYSTEM})
+
+    # Without uevents an unplug is only noticed at the next check, so keep checks frequent while charging
+
+    battery_monitor = BatteryMonitor(check_interval=cli_args.check_interval,
+                                     min_check_interval=cli_args.min_check_interval,
+                                     max_check_interval=cli_args.max_check_interval
+                                     if uevent_listener.available else cli_args.check_interval,
+                                     verbose=cli_args.verbose)
+
+    if not battery_monitor.batteries:
+        if cli_args.verbose:
+            print('No batteries found, nothing to monitor', flush=True)
+
+        exit(0)
+
+    while True:
+        next_check_seconds = battery_monitor.check()
+        uevent_listener.wait(next_check_seconds)
@@ -0,0 +1,666 @@
+#!/usr/bin/env python
+
+# Parses hyprland.conf, following its "source =" includes, into an indexed model of its entries, so the
+# tools query the config instead of each scanning its text with their own grep, cut, sed or regex.
+# Every entry knows its keyword, value, section (e.g. "general" or "decoration:blur"), and the file and
+# line it is on, so a tool can rewrite exactly that line. Lines commented out without a space after the
+# #, e.g. "#monitor = DP-3, ..." for a disconnected monitor, are kept as commented entries, since that
+# is how bin/set_hypr_monitor_config.py turns monitors off.
+#
+# The model is cached in memory and in ~/.cache/hypr/hypr_conf_model, keyed by the mtime and size of
+# every file it was parsed from (and of the directories of globbed includes), so a config that has not
+# changed is never parsed again.
+#
+# For example:
+#
+#                   $HOME/bin/hypr_conf.py --monitors
+#                   $HOME/bin/hypr_conf.py --exec-once 'swww img'
+#                   $HOME/bin/hypr_conf.py --swww-image
+#
+# Edits go through bin/hypr_config_writer.py, which takes the config lock (config_lock) and merges
+# edits made while bin/hypr_session_supervisor.py runs into one write.
+
+import argparse
+import fcntl
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+
+from contextlib import contextmanager
+
+HOME_DIR = os.getenv('HOME')
+CACHE_DIR = os.getenv('XDG_CACHE_HOME', f'{HOME_DIR}/.cache')
+HYPR_CONFIG_FILE = f'{HOME_DIR}/.config/hypr/hyprland.conf'
+HYPR_CONF_CACHE_FILE = f'{CACHE_DIR}/hypr/hypr_conf_model'
+HYPR_CONF_CACHE_VERSION = 2
+
+MONITOR_KEYWORD = 'monitor'
+WORKSPACE_KEYWORD = 'workspace'
+EXEC_ONCE_KEYWORD = 'exec-once'
+EXEC_KEYWORD = 'exec'
+SOURCE_KEYWORD = 'source'
+SWWW_IMAGE_COMMAND = 'swww img'
+DISABLE_VALUE = 'disable'
+
+ENTRY_REGEX = re.compile('^(#)?\\s*([A-Za-z0-9_.:-]+|\\$[A-Za-z0-9_]+)\\s*=\\s*(.*)$')
+SECTION_START_REGEX = re.compile('^([A-Za-z0-9_.:-]+)(\\s*\\[[^]]*])?\\s*\\{$')
+VARIABLE_REGEX = re.compile('\\$([A-Za-z0-9_]+)')
+TMP_SUFFIX = '.tmp'
+LOCK_SUFFIX = '.lock'
+
+
+class HyprConfEntry(object):
+
+    _keyword: str
+    _value: str
+    _file: str
+    _line_number: int
+    _section: str
+    _commented: bool
+
+
+    def __init__(self, keyword: str, value: str, file: str, line_number: int, section: str = '',
+                 commented: bool = False):
+        self._keyword = keyword
+        self._value = value
+        self._file = file
+        self._line_number = line_number
+        self._section = section
+        self._commented = commented
+
+
+    def __repr__(self):
+        return f'{"#" if self._commented else ""}{self._keyword} = {self._value}'
+
+
+    @property
+    def keyword(self):
+        return self._keyword
+
+
+    @property
+    def value(self):
+        return self._value
+
+
+    @property
+    def file(self):
+        return self._file
+
+
+    @property
+    def line_number(self):
+
+        # 0 based
+
+        return self._line_number
+
+
+    @property
+    def section(self):
+        return self._section
+
+
+    @property
+    def commented(self):
+        return self._commented
+
+
+    @property
+    def fields(self) -> list[str]:
+        return [field.strip() for field in self._value.split(',')]
+
+
+    def to_json(self) -> list:
+        return [self._keyword, self._value, self._file, self._line_number, self._section, self._commented]
+
+
+    @staticmethod
+    def from_json(values: list):
+        return HyprConfEntry(*values)
+
+
+class HyprConfMonitor(object):
+
+    _entry: HyprConfEntry
+
+
+    def __init__(self, entry: HyprConfEntry):
+        self._entry = entry
+
+
+    def __repr__(self):
+        return repr(self._entry)
+
+
+    @property
+    def entry(self):
+        return self._entry
+
+
+    @property
+    def name(self):
+        return self._entry.fields[0]
+
+
+    @property
+    def disabled(self):
+        return self._entry.commented or self._field(1) == DISABLE_VALUE
+
+
+    @property
+    def mode(self):
+        return None if self._field(1) == DISABLE_VALUE else self._field(1)
+
+
+    @property
+    def position(self):
+        return self._field(2)
+
+
+    @property
+    def scale(self):
+        return self._field(3)
+
+
+    def _field(self, index: int) -> str | None:
+        fields = self._entry.fields
+
+        return fields[index] if index < len(fields) else None
+
+
+class HyprConfWorkspace(object):
+
+    _entry: HyprConfEntry
+    _rules: dict[str, str]
+
+
+    def __init__(self, entry: HyprConfEntry):
+        self._entry = entry
+        self._rules = {}
+
+        for field in entry.fields[1:]:
+            rule, _, rule_value = field.partition(':')
+            self._rules[rule.strip()] = rule_value.strip()
+
+
+    def __repr__(self):
+        return repr(self._entry)
+
+
+    @property
+    def entry(self):
+        return self._entry
+
+
+    @property
+    def selector(self):
+        return self._entry.fields[0]
+
+
+    @property
+    def number(self) -> int | None:
+        return int(self.selector) if self.selector.isdigit() else None
+
+
+    @property
+    def rules(self):
+        return self._rules
+
+
+    @property
+    def monitor(self):
+        return self._rules.get('monitor')
+
+
+    @property
+    def default(self):
+        return self._rules.get('default') == 'true'
+
+
+class HyprConf(object):
+
+    _path: str
+    _dependencies: list[list]
+    _entries: list[HyprConfEntry]
+    _index: dict[str, list[HyprConfEntry]]
+    _variables: dict[str, str]
+
+
+    def __init__(self, path: str, dependencies: list[list], entries: list[HyprConfEntry], variables: dict[str, str]):
+        self._path = path
+        self._dependencies = dependencies
+        self._entries = entries
+        self._variables = variables
+        self._index = {}
+
+        for entry in entries:
+            self._index.setdefault(entry.keyword, []).append(entry)
+
+
+    @property
+    def path(self):
+        return self._path
+
+
+    @property
+    def files(self) -> list[str]:
+        return [dependency[0] for dependency in self._dependencies if os.path.isfile(dependency[0])]
+
+
+    @property
+    def dependencies(self):
+        return self._dependencies
+
+
+    @property
+    def entries(self):
+        return self._entries
+
+
+    @property
+    def variables(self):
+        return self._variables
+
+
+    def expand(self, value: str) -> str:
+        return VARIABLE_REGEX.sub(lambda match: self._variables.get(match.group(1), match.group(0)), value)
+
+
+    def find(self, keyword: str, include_commented: bool = False) -> list[HyprConfEntry]:
+        return [entry for entry in self._index.get(keyword, []) if include_commented or not entry.commented]
+
+
+    def monitors(self, include_commented: bool = False) -> list[HyprConfMonitor]:
+        return [HyprConfMonitor(entry) for entry in self.find(MONITOR_KEYWORD, include_commented)]
+
+
+    def workspaces(self) -> list[HyprConfWorkspace]:
+        return [HyprConfWorkspace(entry) for entry in self.find(WORKSPACE_KEYWORD)]
+
+
+    def exec_once(self, command_prefix: str = '') -> list[HyprConfEntry]:
+        return [entry for entry in self.find(EXEC_ONCE_KEYWORD)
+                if self.expand(entry.value).startswith(command_prefix)]
+
+
+    def swww_image(self) -> str | None:
+
+        # The image given to the "exec-once = swww img <image>" line, if there is one
+
+        for entry in self.exec_once(SWWW_IMAGE_COMMAND):
+            arguments = self.expand(entry.value).split()
+
+            if len(arguments) > 2:
+                return arguments[-1]
+
+        return None
+
+
+    def swww_image_replacements(self, image: str) -> dict[str, dict[int, str]]:
+
+        # The line replacement that sets the image of the "exec-once = swww img" line, by file and line
+        # number, for replace_lines
+
+        swww_entries = self.exec_once(SWWW_IMAGE_COMMAND)
+
+        if not swww_entries:
+            return {}
+
+        swww_entry = swww_entries[0]
+
+        return {swww_entry.file: {swww_entry.line_number: f'{EXEC_ONCE_KEYWORD} = {SWWW_IMAGE_COMMAND} {image}\n'}}
+
+
+    def is_current(self) -> bool:
+        return all(_stat_key(dependency[0]) == dependency[1:] for dependency in self._dependencies)
+
+
+    def to_json(self) -> dict:
+        return {
+            'version': HYPR_CONF_CACHE_VERSION,
+            'path': self._path,
+            'dependencies': self._dependencies,
+            'variables': self._variables,
+            'entries': [entry.to_json() for entry in self._entries]
+        }
+
+
+    @staticmethod
+    def from_json(values: dict):
+        return HyprConf(values['path'], values['dependencies'],
+                        [HyprConfEntry.from_json(entry) for entry in values['entries']], values['variables'])
+
+
+def _stat_key(path: str) -> list[int]:
+
+    # Configs are replaced by a rename, i.e. a new inode, so a rewrite to the same size within one mtime
+    # tick (e.g. one background image name for another of the same length) still changes the key
+
+    try:
+        stat = os.stat(path)
+
+        return [stat.st_mtime_ns, stat.st_size, stat.st_ino, stat.st_dev]
+    except OSError:
+        return [-1, -1, -1, -1]
+
+
+def _strip_comment(line: str) -> str:
+
+    # A # starts a comment, ## is a literal #
+
+    stripped = []
+    index = 0
+
+    while index < len(line):
+        if line[index] == '#':
+            if line.startswith('##', index):
+                stripped.append('#')
+                index += 2
+                continue
+
+            break
+
+        stripped.append(line[index])
+        index += 1
+
+    return ''.join(stripped).strip()
+
+
+def parse_hypr_conf(path: str) -> HyprConf:
+    path = os.path.abspath(os.path.expanduser(path))
+    config_dir = os.path.dirname(path)
+    dependencies = []
+    entries = []
+    variables = {}
+    parsed_files = set()
+
+    def parse_file(file_path: str):
+        dependencies.append([file_path, *_stat_key(file_path)])
+
+        if file_path in parsed_files or not os.path.isfile(file_path):
+            return
+
+        parsed_files.add(file_path)
+        sections = []
+
+        with open(file_path, 'r') as config_file:
+            lines = config_file.read().splitlines()
+
+        for line_number, line in enumerate(lines):
+            stripped_line = line.strip()
+
+            # A commented out entry has no space after the #, e.g. "#monitor = DP-3, ...", as opposed to
+            # a comment about something, e.g. "# source = ~/.config/hypr/myColors.conf"
+
+            commented = stripped_line.startswith('#') and not stripped_line.startswith('##') \
+                and len(stripped_line) > 1 and not stripped_line[1].isspace()
+
+            content = _strip_comment(stripped_line[1:] if commented else stripped_line)
+
+            if not content:
+                continue
+
+            if content == '}':
+                if sections and not commented:
+                    sections.pop()
+
+                continue
+
+            section_match = SECTION_START_REGEX.match(content)
+
+            if section_match:
+                if not commented:
+                    sections.append(section_match.group(1))
+
+                continue
+
+            entry_match = ENTRY_REGEX.match(content)
+
+            if not entry_match:
+                continue
+
+            keyword, value = entry_match.group(2), entry_match.group(3).strip()
+
+            if keyword.startswith('$'):
+                if not commented:
+                    variables[keyword[1:]] = VARIABLE_REGEX.sub(
+                            lambda match: variables.get(match.group(1), match.group(0)), value)
+
+                continue
+
+            entries.append(HyprConfEntry(keyword, value, file_path, line_number, ':'.join(sections), commented))
+
+            if keyword == SOURCE_KEYWORD and not commented and not sections:
+                source_pattern = os.path.expanduser(
+                        VARIABLE_REGEX.sub(lambda match: variables.get(match.group(1), match.group(0)), value))
+
+                if not os.path.isabs(source_pattern):
+                    source_pattern = f'{config_dir}/{source_pattern}'
+
+                if glob.has_magic(source_pattern):
+                    glob_dir = os.path.dirname(source_pattern)
+
+                    if not glob.has_magic(glob_dir):
+                        dependencies.append([glob_dir, *_stat_key(glob_dir)])
+
+                    for source_path in sorted(glob.glob(source_pattern)):
+                        parse_file(source_path)
+                else:
+                    parse_file(source_pattern)
+
+    parse_file(path)
+
+    return HyprConf(path, dependencies, entries, variables)
+
+
+_hypr_conf_cache: dict[str, HyprConf] = {}
+
+
+def load_hypr_conf(path: str = HYPR_CONFIG_FILE, cache_file: str | None = HYPR_CONF_CACHE_FILE) -> HyprConf:
+
+    # In memory first, then the cache file, and only then parse
+
+    path = os.path.abspath(os.path.expanduser(path))
+    hypr_conf = _hypr_conf_cache.get(path)
+
+    if hypr_conf and hypr_conf.is_current():
+        return hypr_conf
+
+    cached_models = {}
+
+    if cache_file:
+        try:
+            with open(cache_file, 'r') as model_file:
+                cached_models = json.load(model_file)
+
+            cached_model = cached_models.get(path)
+
+            if cached_model and cached_model.get('version') == HYPR_CONF_CACHE_VERSION:
+                hypr_conf = HyprConf.from_json(cached_model)
+
+                if hypr_conf.is_current():
+                    _hypr_conf_cache[path] = hypr_conf
+
+                    return hypr_conf
+        except (OSError, ValueError, KeyError, TypeError):
+            cached_models = {}
+
+    hypr_conf = parse_hypr_conf(path)
+    _hypr_conf_cache[path] = hypr_conf
+
+    if cache_file:
+        cached_models[path] = hypr_conf.to_json()
+
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+
+            with open(f'{cache_file}.{os.getpid()}{TMP_SUFFIX}', 'w') as model_file:
+                json.dump(cached_models, model_file)
+
+            os.replace(f'{cache_file}.{os.getpid()}{TMP_SUFFIX}', cache_file)
+        except OSError as error:
+            print(f'Could not cache the hyprland.conf model: {error}', file=sys.stderr)
+
+    return hypr_conf
+
+
+def replace_lines(data: str, replacements: dict[int, str]) -> str:
+
+    # Replaces whole lines by (0 based) line number, each replacement including its line ending
+
+    lines = data.splitlines(keepends=True)
+
+    for line_number, line in replacements.items():
+        lines[line_number] = line
+
+    return ''.join(lines)
+
+
+def write_config_file(path: str, data: str | bytes):
+
+    # Written next to the config and renamed over it, so Hyprland never reads a partial config. The temp
+    # file is unique, so two writers never write into each other's, and keeps the config's permissions.
+
+    tmp_fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix=TMP_SUFFIX,
+                                        dir=os.path.dirname(path))
+
+    try:
+        with open(tmp_fd, 'wb' if isinstance(data, bytes) else 'w') as tmp_file:
+            try:
+                os.fchmod(tmp_fd, os.stat(path).st_mode & 0o7777)
+            except FileNotFoundError:
+                os.fchmod(tmp_fd, 0o644)
+
+            tmp_file.write(data)
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+
+        raise
+
+
+def write_config_replacements(replacements: dict[str, dict[int, str]]) -> list[str]:
+
+    # Applies line replacements to each file, with one write per file that actually changes. Returns
+    # the files written.
+
+    written_files = []
+
+    for path, file_replacements in replacements.items():
+        with open(path, 'r') as config_file:
+            data = config_file.read()
+
+        new_data = replace_lines(data, file_replacements)
+
+        if new_data != data:
+            write_config_file(path, new_data)
+            written_files.append(path)
+
+    return written_files
+
+
+@contextmanager
+def config_lock(path: str):
+
+    # An advisory lock that every tool editing the Hyprland config holds from reading the config until
+    # its write is in place, so no edit is lost to another tool's rewrite. It is taken on a lock file
+    # next to the config rather than on the config itself, since renaming a new config over the old one
+    # would leave a lock on the old one behind. Held for the config and all the files it sources.
+
+    lock_fd = os.open(f'{path}{LOCK_SUFFIX}', os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+        yield
+    finally:
+        os.close(lock_fd)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Queries the Hyprland config, following its source includes.
+    ''',
+        epilog='Hyprland config queries',
+        argument_default=None,
+        usage='''
+    [-h]
+    [--config-file <file>]
+    [--monitors]
+    [--workspaces]
+    [--exec-once <command prefix>]
+    [--swww-image]
+    '''
+        )
+
+    arg_parser.add_argument(
+        '--config-file',
+        '-f',
+        help=f'Hyprland config file, defaults to {HYPR_CONFIG_FILE}',
+        default=HYPR_CONFIG_FILE
+        )
+
+    arg_parser.add_argument(
+        '--monitors',
+        '-m',
+        help='Print the monitor entries, including those commented out',
+        action='store_true'
+        )
+
+    arg_parser.add_argument(
+        '--workspaces',
+        '-w',
+        help='Print the workspace entries',
+        action='store_true'
+        )
+
+    arg_parser.add_argument(
+        '--exec-once',
+        '-e',
+        help='Print the exec-once commands starting with the given prefix',
+        )
+
+    arg_parser.add_argument(
+        '--swww-image',
+        '-i',
+        help='Print the image of the "exec-once = swww img" line',
+        action='store_true'
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    if not os.path.isfile(cli_args.config_file):
+        print(f'Error! No Hyprland config found at {cli_args.config_file}!', file=sys.stderr)
+        exit(1)
+
+    hypr_conf = load_hypr_conf(cli_args.config_file)
+
+    if cli_args.monitors:
+        for monitor in hypr_conf.monitors(include_commented=True):
+            print(monitor)
+
+    if cli_args.workspaces:
+        for workspace in hypr_conf.workspaces():
+            print(workspace)
+
+    if cli_args.exec_once is not None:
+        for exec_once_entry in hypr_conf.exec_once(cli_args.exec_once):
+            print(hypr_conf.expand(exec_once_entry.value))
+
+    if cli_args.swww_image:
+        swww_image = hypr_conf.swww_image()
+
+        if not swww_image:
+            print(f'Error! No "exec-once = {SWWW_IMAGE_COMMAND}" line with an image found!', file=sys.stderr)
+            exit(1)
+
+        print(swww_image)
@@ -0,0 +1,473 @@
+#!/usr/bin/env python
+
+# Generation store for the configs that bin/set_hypr_monitor_config.py rewrites, replacing the single
+# hyprland.conf.bak and waybar config.bak copies, which only ever held one generation and could
+# already be a broken output. The store directory holds:
+#
+#       blobs/<sha256> -> every distinct config content once, named by its hash
+#       journal        -> one appended line per generation: time, config, connection state, input
+#                         key and output blob hash, tab separated
+#       lock           -> flocked by every writer, around writing blobs and the journal, and compacting
+#
+# Recording a generation whose content was seen before costs one journal line and no blob write. The
+# input key is the hash of the config that was rewritten plus the monitor layout plan it was rewritten
+# for, so when the same input comes up again (e.g. the same monitors are plugged back in) the output it
+# produced last time can be reused without rendering it again. Only the INPUT_KEYS_TO_KEEP most recently
+# used input keys of each config stay reusable once the journal is compacted, since every hand edit or
+# new background image makes for new ones. Rolling back copies a blob next to the config and renames it
+# over the config.
+#
+# For example:
+#
+#                   $HOME/bin/hypr_config_generations.py --list
+#                   $HOME/bin/hypr_config_generations.py --config hyprland --rollback 2
+
+import argparse
+import fcntl
+import hashlib
+import os
+import sys
+import time
+
+from contextlib import contextmanager
+
+from hypr_conf import (
+    HYPR_CONFIG_FILE,
+    config_lock,
+    write_config_file
+)
+
+HOME_DIR = os.getenv('HOME')
+CACHE_DIR = os.getenv('XDG_CACHE_HOME', f'{HOME_DIR}/.cache')
+GENERATIONS_DIR = f'{CACHE_DIR}/hypr/config_generations'
+BLOBS_DIR_NAME = 'blobs'
+JOURNAL_FILE_NAME = 'journal'
+LOCK_FILE_NAME = 'lock'
+
+HYPR_CONFIG_NAME = 'hyprland'
+WAYBAR_CONFIG_NAME = 'waybar'
+CONFIG_FILES = {
+    HYPR_CONFIG_NAME: HYPR_CONFIG_FILE,
+    WAYBAR_CONFIG_NAME: f'{HOME_DIR}/.config/waybar/config'
+}
+
+# States recorded for generations that were not produced for a monitor layout
+
+EXTERNAL_STATE = 'external'
+ROLLBACK_STATE = 'rollback'
+NO_INPUT_KEY = '-'
+
+GENERATIONS_TO_KEEP = 20
+INPUT_KEYS_TO_KEEP = 64
+JOURNAL_COMPACT_LINES = 1000
+TMP_SUFFIX = '.tmp'
+
+
+class Generation(object):
+
+    _time_ns: int
+    _config_name: str
+    _state: str
+    _input_key: str
+    _blob_hash: str
+
+
+    def __init__(self, time_ns: int, config_name: str, state: str, input_key: str, blob_hash: str):
+        self._time_ns = time_ns
+        self._config_name = config_name
+        self._state = state
+        self._input_key = input_key
+        self._blob_hash = blob_hash
+
+
+    def __repr__(self):
+        return (f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._time_ns / 1e9))} '
+                + f'{self._config_name} {self._blob_hash[:12]} {self._state}')
+
+
+    @property
+    def time_ns(self):
+        return self._time_ns
+
+
+    @property
+    def config_name(self):
+        return self._config_name
+
+
+    @property
+    def state(self):
+        return self._state
+
+
+    @property
+    def input_key(self):
+        return self._input_key
+
+
+    @property
+    def blob_hash(self):
+        return self._blob_hash
+
+
+    def journal_line(self) -> bytes:
+        return (f'{self._time_ns}\t{self._config_name}\t{self._state}\t{self._input_key}\t'
+                + f'{self._blob_hash}\n').encode()
+
+
+    @staticmethod
+    def from_journal_line(line: bytes):
+        time_ns, config_name, state, input_key, blob_hash = line.decode().rstrip('\n').split('\t')
+
+        return Generation(int(time_ns), config_name, state, input_key, blob_hash)
+
+
+class GenerationStore(object):
+
+    _store_dir: str
+    _blobs_dir: str
+    _journal_file: str
+    _lock_file: str
+    _generations_to_keep: int
+    _input_keys_to_keep: int
+    _generations: list[Generation]
+    _journal_inode: int | None
+    _journal_offset: int
+
+
+    def __init__(self, store_dir: str = GENERATIONS_DIR, generations_to_keep: int = GENERATIONS_TO_KEEP,
+                 input_keys_to_keep: int = INPUT_KEYS_TO_KEEP):
+        self._store_dir = store_dir
+        self._blobs_dir = f'{store_dir}/{BLOBS_DIR_NAME}'
+        self._journal_file = f'{store_dir}/{JOURNAL_FILE_NAME}'
+        self._lock_file = f'{store_dir}/{LOCK_FILE_NAME}'
+        self._generations_to_keep = generations_to_keep
+        self._input_keys_to_keep = input_keys_to_keep
+        self._generations = []
+        self._journal_inode = None
+        self._journal_offset = 0
+
+        os.makedirs(self._blobs_dir, exist_ok=True)
+
+
+    @property
+    def store_dir(self):
+        return self._store_dir
+
+
+    @staticmethod
+    def hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+
+    @staticmethod
+    def input_key(source: bytes, plan: str) -> str:
+        return hashlib.sha256(source + b'\0' + plan.encode()).hexdigest()
+
+
+    def blob_path(self, blob_hash: str) -> str:
+        return f'{self._blobs_dir}/{blob_hash}'
+
+
+    def put_blob(self, data: bytes) -> str:
+        with self._locked():
+            return self._put_blob(data)
+
+
+    def _put_blob(self, data: bytes) -> str:
+
+        # Content that was stored before is not written again. Called with the store locked, so a
+        # compaction can not delete the blob before a generation refers to it.
+
+        blob_hash = self.hash(data)
+        blob_path = self.blob_path(blob_hash)
+
+        if not os.path.exists(blob_path):
+            tmp_path = f'{blob_path}.{os.getpid()}{TMP_SUFFIX}'
+
+            with open(tmp_path, 'wb') as blob_file:
+                blob_file.write(data)
+
+            os.replace(tmp_path, blob_path)
+
+        return blob_hash
+
+
+    def get_blob(self, blob_hash: str) -> bytes | None:
+        try:
+            with open(self.blob_path(blob_hash), 'rb') as blob_file:
+                return blob_file.read()
+        except FileNotFoundError:
+            return None
+
+
+    def generations(self, config_name: str) -> list[Generation]:
+
+        # Oldest first
+
+        return [generation for generation in self._read_journal() if generation.config_name == config_name]
+
+
+    def config_names(self) -> list[str]:
+        return sorted({generation.config_name for generation in self._read_journal()})
+
+
+    def lookup(self, config_name: str, input_key: str) -> bytes | None:
+
+        # The output produced the last time this config was rendered from the same input, if any
+
+        for generation in reversed(self._read_journal()):
+            if generation.config_name == config_name and generation.input_key == input_key:
+                return self.get_blob(generation.blob_hash)
+
+        return None
+
+
+    def last_for_state(self, config_name: str, state: str) -> Generation | None:
+        for generation in reversed(self._read_journal()):
+            if generation.config_name == config_name and generation.state == state:
+                return generation
+
+        return None
+
+
+    def record(self, config_name: str, state: str, input_key: str, previous: bytes | None,
+               output: bytes) -> Generation:
+
+        # If the config was changed by something else since the last generation, e.g. edited by hand,
+        # that content is recorded first, so it can be rolled back to as well
+
+        with self._locked():
+            generations = self.generations(config_name)
+
+            new_generations = []
+
+            if previous is not None and (not generations or generations[-1].blob_hash != self.hash(previous)):
+                new_generations.append(
+                        Generation(time.time_ns(), config_name, EXTERNAL_STATE, NO_INPUT_KEY,
+                                   self._put_blob(previous))
+                    )
+
+            generation = Generation(time.time_ns(), config_name, state, input_key, self._put_blob(output))
+            new_generations.append(generation)
+
+            self._append(new_generations)
+
+        return generation
+
+
+    def rollback(self, config_name: str, config_file: str, generations_back: int = 1) -> Generation:
+        generations = self.generations(config_name)
+
+        if generations_back < 1 or generations_back >= len(generations):
+            raise IndexError(f'Only {len(generations) - 1} {config_name} generations to roll back to')
+
+        target = generations[-1 - generations_back]
+        data = self.get_blob(target.blob_hash)
+
+        if data is None:
+            raise FileNotFoundError(f'The blob for {target} is missing from {self._blobs_dir}')
+
+        # Under the same lock as a hot swap or any other edit of the configs, see config_lock in
+        # bin/hypr_conf.py, so the rollback neither loses nor is lost to one of those
+
+        generation = Generation(time.time_ns(), config_name, ROLLBACK_STATE, NO_INPUT_KEY, target.blob_hash)
+
+        with config_lock(HYPR_CONFIG_FILE):
+            write_config_file(config_file, data)
+
+            with self._locked():
+                self._append([generation])
+
+        return generation
+
+
+    def _read_journal(self) -> list[Generation]:
+
+        # The journal is only appended to, so just read what was added since the last read, unless it
+        # was compacted (replaced) in the meantime
+
+        try:
+            fd = os.open(self._journal_file, os.O_RDONLY)
+        except FileNotFoundError:
+            self._generations = []
+            self._journal_inode = None
+            self._journal_offset = 0
+
+            return self._generations
+
+        try:
+            stat = os.fstat(fd)
+
+            if stat.st_ino != self._journal_inode or stat.st_size < self._journal_offset:
+                self._generations = []
+                self._journal_inode = stat.st_ino
+                self._journal_offset = 0
+
+            if stat.st_size > self._journal_offset:
+                data = os.pread(fd, stat.st_size - self._journal_offset, self._journal_offset)
+                complete_end = data.rfind(b'\n') + 1
+
+                self._generations.extend(Generation.from_journal_line(line)
+                                         for line in data[:complete_end].splitlines(keepends=True))
+                self._journal_offset += complete_end
+        finally:
+            os.close(fd)
+
+        return self._generations
+
+
+    @contextmanager
+    def _locked(self):
+
+        # On a lock file of its own rather than the journal, which compacting replaces
+
+        lock_fd = os.open(self._lock_file, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+            yield
+        finally:
+            os.close(lock_fd)
+
+
+    def _append(self, generations: list[Generation]):
+
+        # Called with the store locked
+
+        fd = os.open(self._journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        try:
+            os.write(fd, b''.join(generation.journal_line() for generation in generations))
+        finally:
+            os.close(fd)
+
+        if len(self._read_journal()) > JOURNAL_COMPACT_LINES:
+            self._compact()
+
+
+    def _compact(self):
+
+        # Keep the last generations_to_keep generations of each config, plus the last generation for
+        # each of its input_keys_to_keep most recently used input keys so their outputs stay reusable,
+        # and delete the blobs nothing refers to anymore. Called with the store locked.
+
+        generations = self._read_journal()
+        keep = set()
+        seen_input_keys = set()
+        kept_per_config = {}
+        input_keys_per_config = {}
+
+        for index in range(len(generations) - 1, -1, -1):
+            generation = generations[index]
+            kept = kept_per_config.get(generation.config_name, 0)
+
+            if kept < self._generations_to_keep:
+                kept_per_config[generation.config_name] = kept + 1
+                keep.add(index)
+
+            input_key = (generation.config_name, generation.input_key)
+            input_keys = input_keys_per_config.get(generation.config_name, 0)
+
+            if generation.input_key != NO_INPUT_KEY and input_key not in seen_input_keys \
+                    and input_keys < self._input_keys_to_keep:
+                seen_input_keys.add(input_key)
+                input_keys_per_config[generation.config_name] = input_keys + 1
+                keep.add(index)
+
+        kept_generations = [generations[index] for index in sorted(keep)]
+
+        with open(f'{self._journal_file}{TMP_SUFFIX}', 'wb') as tmp_file:
+            tmp_file.write(b''.join(generation.journal_line() for generation in kept_generations))
+
+        os.replace(f'{self._journal_file}{TMP_SUFFIX}', self._journal_file)
+
+        referenced_blobs = {generation.blob_hash for generation in kept_generations}
+
+        # A blob still being written by a writer that crashed is left alone too
+
+        for blob_name in os.listdir(self._blobs_dir):
+            if blob_name not in referenced_blobs and not blob_name.endswith(TMP_SUFFIX):
+                os.remove(f'{self._blobs_dir}/{blob_name}')
+
+        self._read_journal()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Lists, queries and rolls back the generations of the Hyprland and Waybar configs recorded by
+    set_hypr_monitor_config.py.
+    ''',
+        epilog='Hyprland config generations',
+        argument_default=None,
+        usage='''
+    [-h]
+    [--config <hyprland|waybar>]
+    [--list]
+    [--rollback <generations back>]
+    [--state <connection state>]
+    [--store-dir <dir>]
+    '''
+        )
+
+    arg_parser.add_argument(
+        '--config',
+        '-c',
+        help='Which config to act on, defaults to all of them for --list and hyprland otherwise',
+        choices=list(CONFIG_FILES.keys())
+        )
+
+    arg_parser.add_argument(
+        '--list',
+        '-l',
+        help='List the generations, newest first, numbered by how many generations back they are',
+        action='store_true'
+        )
+
+    arg_parser.add_argument(
+        '--rollback',
+        '-r',
+        help='Roll the config back to the generation this many generations back',
+        type=int
+        )
+
+    arg_parser.add_argument(
+        '--state',
+        '-s',
+        help='Print the config last produced for this connection state, e.g. DP-1+DP-2',
+        )
+
+    arg_parser.add_argument(
+        '--store-dir',
+        '-f',
+        help=f'Generation store directory, defaults to {GENERATIONS_DIR}',
+        default=GENERATIONS_DIR
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    generation_store = GenerationStore(cli_args.store_dir)
+
+    if cli_args.rollback is not None:
+        config_name = cli_args.config if cli_args.config else HYPR_CONFIG_NAME
+
+        try:
+            print(f'Rolled back to {generation_store.rollback(config_name, CONFIG_FILES[config_name], cli_args.rollback)}')
+        except (IndexError, FileNotFoundError) as error:
+            print(f'Error! {error}', file=sys.stderr)
+            exit(1)
+    elif cli_args.state:
+        config_name = cli_args.config if cli_args.config else HYPR_CONFIG_NAME
+        generation = generation_store.last_for_state(config_name, cli_args.state)
+
+        if not generation:
+            print(f'Error! No {config_name} config recorded for {cli_args.state}', file=sys.stderr)
+            exit(1)
+
+        sys.stdout.write(generation_store.get_blob(generation.blob_hash).decode())
+    else:
+        for config_name in [cli_args.config] if cli_args.config else generation_store.config_names():
+            for generations_back, generation in enumerate(reversed(generation_store.generations(config_name))):
+                print(f'{generations_back:3} {generation}')
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+
+from hypr_conf import (
+    HYPR_CONFIG_FILE,
+    SWWW_IMAGE_COMMAND,
+    HyprConf,
+    config_lock,
+    load_hypr_conf,
+    write_config_replacements
+)
+
+# A single writer for hyprland.conf. Every write is a full rewrite that makes Hyprland reload, and
+# several tools edit the config: the monitor hot swapping rewrites the monitor and workspace lines, and
+# bin/hypr_rand_background_image sets the image of the "exec-once = swww img" line. So:
+#
+#       - every tool holds the advisory lock from bin/hypr_conf.py (config_lock) from reading the config
+#         until its write is in place, so no tool's edit is lost to another tool's rewrite
+#       - while bin/hypr_session_supervisor.py runs, the tools hand it their edits over a unix socket
+#         instead, and it merges everything pending within a settle window, including a hot swap, into
+#         one write per config file, i.e. one reload
+#
+# Edits are merged by kind, a later edit of the same kind replacing an earlier one, e.g. only the last
+# of several background images set within the window is written. The protocol is one JSON edit per
+# connection, {"kind": "swww-image", "value": "/path/to/image"}, answered with "ok" once the edit was
+# written, or "error <reason>". Without the supervisor, or when it answers with an error, a tool writes
+# its edit itself, under the lock. An edit that reached the supervisor but was not answered in time is
+# not written again, since it may well still be pending there, and writing it twice means two reloads.
+#
+# A text editor does not take the lock, so a config edited by hand while a tool writes it may still
+# lose one of the two edits.
+#
+# For example:
+#
+#                   $HOME/bin/hypr_config_writer.py --set-swww-image /path/to/image
+
+XDG_RUNTIME_DIR = os.getenv('XDG_RUNTIME_DIR', f'/run/user/{os.getuid()}')
+CONFIG_WRITER_SOCKET = f'{XDG_RUNTIME_DIR}/hypr_config_writer.sock'
+
+SWWW_IMAGE_EDIT = 'swww-image'
+EDIT_KINDS = [SWWW_IMAGE_EDIT]
+
+CONFIG_EDIT_SETTLE_SECONDS = 0.5
+SUBMIT_TIMEOUT_SECONDS = 5
+OK_REPLY = 'ok'
+ERROR_REPLY = 'error'
+
+
+class ConfigEdit(object):
+
+    _kind: str
+    _value: str
+
+
+    def __init__(self, kind: str, value: str):
+        if kind not in EDIT_KINDS:
+            raise ValueError(f'Unknown config edit {kind}')
+
+        self._kind = kind
+        self._value = value
+
+
+    def __repr__(self):
+        return f'{self._kind} {self._value}'
+
+
+    @property
+    def kind(self):
+        return self._kind
+
+
+    @property
+    def value(self):
+        return self._value
+
+
+    def replacements(self, hypr_conf: HyprConf) -> dict[str, dict[int, str]]:
+
+        # The line replacements for the edit, by file and line number
+
+        if self._kind == SWWW_IMAGE_EDIT:
+            return hypr_conf.swww_image_replacements(self._value)
+
+        return {}
+
+
+    def to_json(self) -> dict:
+        return {'kind': self._kind, 'value': self._value}
+
+
+    @staticmethod
+    def from_json(values: dict):
+        return ConfigEdit(values['kind'], values['value'])
+
+
+def config_edit_replacements(hypr_conf: HyprConf, config_edits: list[ConfigEdit]) -> dict[str, dict[int, str]]:
+
+    # All the edits' line replacements merged, by file and line number
+
+    replacements = {}
+
+    for config_edit in config_edits:
+        for path, file_replacements in config_edit.replacements(hypr_conf).items():
+            replacements.setdefault(path, {}).update(file_replacements)
+
+    return replacements
+
+
+def write_config_edits(config_edits: list[ConfigEdit], config_path: str = HYPR_CONFIG_FILE) -> list[str]:
+
+    # Writes the edits directly, under the lock. Returns the files written.
+
+    with config_lock(config_path):
+        return write_config_replacements(config_edit_replacements(load_hypr_conf(config_path), config_edits))
+
+
+def submit_config_edit(config_edit: ConfigEdit, socket_path: str = CONFIG_WRITER_SOCKET) -> bool | None:
+
+    # Hands the edit to the supervisor and waits for it to be written. Returns True once it was
+    # written, None if the supervisor is not running or answered that it did not write it, in which
+    # case the edit is still to be written, and False if the edit was sent but no answer came back, in
+    # which case the supervisor may still write it.
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_CLOEXEC) as writer_socket:
+        writer_socket.settimeout(SUBMIT_TIMEOUT_SECONDS)
+
+        try:
+            writer_socket.connect(socket_path)
+        except OSError:
+            return None
+
+        try:
+            writer_socket.sendall(f'{json.dumps(config_edit.to_json())}\n'.encode())
+            reply = writer_socket.makefile('r').readline().strip()
+        except OSError:
+            return False
+
+    if reply == OK_REPLY:
+        return True
+
+    return None if reply.startswith(ERROR_REPLY) else False
+
+
+def submit_or_write_config_edit(config_edit: ConfigEdit, config_path: str = HYPR_CONFIG_FILE):
+
+    # The supervisor only writes the config it runs with, so an edit of any other config is written
+    # directly
+
+    submitted = submit_config_edit(config_edit) if config_path == HYPR_CONFIG_FILE else None
+
+    if submitted is None:
+        write_config_edits([config_edit], config_path)
+    elif not submitted:
+        print(f'The supervisor did not confirm writing {config_edit}, leaving it to the supervisor',
+              file=sys.stderr, flush=True)
+
+
+class ConfigWriterQueue(object):
+
+    # The supervisor's side: collects the edits handed in over the socket and writes them once their
+    # settle window has passed, unless a hot swap takes them along first (take_pending, then done)
+
+    _socket_path: str
+    _settle_seconds: float
+    _pending: dict[str, ConfigEdit]
+    _waiters: list[asyncio.Future]
+    _flush_handle: asyncio.TimerHandle | None
+    _write_tasks: set[asyncio.Task]
+    _server: asyncio.AbstractServer | None
+
+
+    def __init__(self, socket_path: str = CONFIG_WRITER_SOCKET,
+                 settle_seconds: float = CONFIG_EDIT_SETTLE_SECONDS):
+        self._socket_path = socket_path
+        self._settle_seconds = settle_seconds
+        self._pending = {}
+        self._waiters = []
+        self._flush_handle = None
+        self._write_tasks = set()
+        self._server = None
+
+
+    async def start(self):
+
+        # A socket left behind by a supervisor that was killed would make the bind fail
+
+        try:
+            os.unlink(self._socket_path)
+        except FileNotFoundError:
+            pass
+
+        self._server = await asyncio.start_unix_server(self._on_client, path=self._socket_path)
+
+
+    def close(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+
+            try:
+                os.unlink(self._socket_path)
+            except FileNotFoundError:
+                pass
+
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        self.done(self._waiters, 'the supervisor stopped')
+        self._pending = {}
+        self._waiters = []
+
+
+    def submit(self, config_edit: ConfigEdit) -> asyncio.Future:
+
+        # The window starts with the first pending edit and is not extended by later ones, so an edit
+        # is never held back for longer than the settle time
+
+        self._pending[config_edit.kind] = config_edit
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+
+        if not self._flush_handle:
+            self._flush_handle = asyncio.get_running_loop().call_later(self._settle_seconds, self._flush)
+
+        return waiter
+
+
+    def take_pending(self) -> tuple[list[ConfigEdit], list[asyncio.Future]]:
+        pending = (list(self._pending.values()), self._waiters)
+
+        self._pending = {}
+        self._waiters = []
+
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        return pending
+
+
+    @staticmethod
+    def done(waiters: list[asyncio.Future], error: str = None):
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(error)
+
+
+    def _flush(self):
+        self._flush_handle = None
+
+        # The write blocks on the config lock and the disk, so it runs in a thread rather than in the
+        # supervisor's event loop. The task is kept, since the loop only holds weak references to it.
+
+        write_task = asyncio.get_running_loop().create_task(self._write(*self.take_pending()))
+        self._write_tasks.add(write_task)
+        write_task.add_done_callback(self._write_tasks.discard)
+
+
+    async def _write(self, config_edits: list[ConfigEdit], waiters: list[asyncio.Future]):
+
+        # Whatever happens to the write, the tools waiting on it get an answer
+
+        error = 'the edit was not written'
+
+        try:
+            await asyncio.to_thread(write_config_edits, config_edits)
+            error = None
+        except Exception as write_error:
+            error = str(write_error) or repr(write_error)
+        finally:
+            self.done(waiters, error)
+
+
+    async def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await asyncio.wait_for(reader.readline(), SUBMIT_TIMEOUT_SECONDS)
+            error = await self.submit(ConfigEdit.from_json(json.loads(line)))
+        except (asyncio.TimeoutError, ValueError, KeyError, TypeError) as submit_error:
+            error = f'invalid edit: {submit_error}'
+
+        reply = OK_REPLY if error is None else f'{ERROR_REPLY} {error}'
+
+        try:
+            writer.write(f'{reply}\n'.encode())
+            await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Edits the Hyprland config, through bin/hypr_session_supervisor.py when it runs, so the edit is
+    merged with any others into one write, and directly under the config lock otherwise.
+    ''',
+        epilog='Hyprland config edits',
+        argument_default=None,
+        usage='''
+    [-h]
+    [--config-file <file>]
+    --set-swww-image <image>
+    '''
+        )
+
+    arg_parser.add_argument(
+        '--config-file',
+        '-f',
+        help=f'Hyprland config file, defaults to {HYPR_CONFIG_FILE}',
+        default=HYPR_CONFIG_FILE
+        )
+
+    arg_parser.add_argument(
+        '--set-swww-image',
+        '-s',
+        help='Set the image of the "exec-once = swww img" line',
+        required=True
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    if not os.path.isfile(cli_args.config_file):
+        print(f'Error! No Hyprland config found at {cli_args.config_file}!', file=sys.stderr)
+        exit(1)
+
+    if not load_hypr_conf(cli_args.config_file).exec_once(SWWW_IMAGE_COMMAND):
+        print(f'Error! No "exec-once = {SWWW_IMAGE_COMMAND}" line found!', file=sys.stderr)
+        exit(1)
+
+    submit_or_write_config_edit(ConfigEdit(SWWW_IMAGE_EDIT, cli_args.set_swww_image), cli_args.config_file)
@@ -0,0 +1,130 @@
+import argparse
+import os
+
+# Reads the connection status of the monitors' DRM connectors for the polling fallback of the hot
+# swapping, i.e. when netlink uevents are not available. Each cardN-<name>/status file is opened once
+# and then re-read with a single pread at offset 0 (sysfs regenerates the value on every read at offset
+# 0) into one preallocated buffer, so a poll costs one syscall per connector instead of an open, a read
+# and a close. If a connector goes away, e.g. with a dock, its file is reopened once it is back, and it
+# reads as disconnected in the meantime.
+#
+# The status is "connected", "disconnected" or "unknown", so the first byte is enough to tell.
+#
+# While nothing changes the poll interval backs off exponentially, from --poll-interval up to
+# --max-poll-interval, and drops back to --poll-interval as soon as something does change. A power
+# profile only scales --poll-interval, never the backed off interval, so it can not push the wait past
+# --max-poll-interval.
+
+STATUS_FILE = 'status'
+STATUS_BUFFER_SIZE = 16
+CONNECTED_FIRST_BYTE = ord('c')
+
+POLL_INTERVAL_SECONDS = 2
+MAX_POLL_INTERVAL_SECONDS = 16
+POLL_BACKOFF_FACTOR = 2
+
+
+class DrmStatusPoller(object):
+
+    _monitor_dirs: list[str]
+    _status_fds: dict[str, int | None]
+    _buffer: bytearray
+    _buffers: list[memoryview]
+    _poll_interval: float
+    _max_poll_interval: float
+    _current_poll_interval: float
+
+
+    def __init__(self, monitor_dirs: list[str], poll_interval: float = POLL_INTERVAL_SECONDS,
+                 max_poll_interval: float = MAX_POLL_INTERVAL_SECONDS):
+        self._monitor_dirs = monitor_dirs
+        self._status_fds = {monitor_dir: None for monitor_dir in monitor_dirs}
+        self._buffer = bytearray(STATUS_BUFFER_SIZE)
+        self._buffers = [memoryview(self._buffer)]
+        self._poll_interval = poll_interval
+        self._max_poll_interval = max(max_poll_interval, poll_interval)
+        self._current_poll_interval = poll_interval
+
+
+    @property
+    def monitor_dirs(self):
+        return self._monitor_dirs
+
+
+    @property
+    def poll_interval(self):
+        return self._current_poll_interval
+
+
+    def close(self):
+        for monitor_dir, status_fd in self._status_fds.items():
+            if status_fd is not None:
+                os.close(status_fd)
+                self._status_fds[monitor_dir] = None
+
+
+    def read_connected(self, monitor_dir: str) -> bool:
+        status_fd = self._status_fds[monitor_dir]
+
+        if status_fd is None:
+            try:
+                status_fd = os.open(f'{monitor_dir}/{STATUS_FILE}', os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                return False
+
+            self._status_fds[monitor_dir] = status_fd
+
+        try:
+            num_bytes = os.preadv(status_fd, self._buffers, 0)
+        except OSError:
+
+            # The connector went away (ENODEV), so start over with a fresh open on the next read
+
+            os.close(status_fd)
+            self._status_fds[monitor_dir] = None
+
+            return False
+
+        return num_bytes > 0 and self._buffer[0] == CONNECTED_FIRST_BYTE
+
+
+    def read_all_connected(self) -> dict[str, bool]:
+        return {monitor_dir: self.read_connected(monitor_dir) for monitor_dir in self._monitor_dirs}
+
+
+    def backoff(self, changed: bool) -> float:
+
+        # Returns the interval to wait before the next poll
+
+        if changed:
+            self._current_poll_interval = self._poll_interval
+        else:
+            self._current_poll_interval = min(self._current_poll_interval * POLL_BACKOFF_FACTOR,
+                                              self._max_poll_interval)
+
+        return self._current_poll_interval
+
+
+    def scaled_poll_interval(self, interval_scale: float) -> float:
+
+        # The interval to wait before the next poll under a power profile's interval scale
+
+        return min(max(self._poll_interval * interval_scale, self._current_poll_interval), self._max_poll_interval)
+
+
+def add_poll_arguments(arg_parser: argparse.ArgumentParser):
+    arg_parser.add_argument(
+        '--poll-interval',
+        help='Seconds between monitor connection checks when polling, i.e. without netlink uevents, '
+             + f'defaults to {POLL_INTERVAL_SECONDS}',
+        type=float,
+        default=POLL_INTERVAL_SECONDS
+        )
+
+    arg_parser.add_argument(
+        '--max-poll-interval',
+        help='Seconds the polling interval backs off to while the monitor connections do not change, '
+             + f'defaults to {MAX_POLL_INTERVAL_SECONDS}',
+        type=float,
+        default=MAX_POLL_INTERVAL_SECONDS
+        )
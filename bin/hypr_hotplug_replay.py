@@ -0,0 +1,509 @@
+#!/usr/bin/env python
+
+# Replay a hotplug trace recorded with --record-trace, by bin/hypr_session_supervisor.py or
+# bin/hypr_monitor_hot_swap.py, against a fake sysfs and config tree (see bin/hypr_idle_audit.py), at
+# real or accelerated speed, and report how the hot swapping kept up. Dock and KVM bugs are timing bugs,
+# so a trace captured when one happened can be replayed on demand, and kept as a regression benchmark.
+#
+# The fake connectors start out as in the first connector states of the trace. The hot swapping is
+# started with the monitor arguments the trace was recorded with, and once it has done its startup
+# hot swap, each later change of the connector states is written to the fake connectors' status files
+# at its time in the trace, divided by --speed. With --daemon supervisor, the default, the session
+# supervisor is replayed against, and each change is followed by a drm uevent per changed connector,
+# sent to it through HYPR_UEVENT_SOCKET (see bin/hypr_uevent.py), so its uevent path is what is
+# measured. With --daemon hot-swap, bin/hypr_monitor_hot_swap.py is, i.e. the polling fallback. The hot
+# swapping records its own trace while it runs, and the report, as JSON, compares the two:
+#
+#       latencies           -> for each change, seconds from writing it to the hot swap for it being
+#                              done, i.e. the configs written and, with Hyprland, applied
+#       detection_latencies -> for each change, seconds from writing it to the hot swapping seeing it
+#       coalesced_changes   -> changes that were gone again before the hot swapping saw them
+#       applies             -> hot swaps done after the startup one
+#       unwritten_applies   -> hot swaps that found nothing to write
+#       superseded_applies  -> hot swaps done for connector states that had already changed again
+#       redundant_applies   -> hot swaps that were either of the above
+#       unverified_applies  -> hot swaps not seen applied by Hyprland, including when there was no
+#                              Hyprland to ask, as in a replay
+#
+# The replay runs on AC power, and the poll intervals of the hot swapping, and the window the supervisor
+# lets a burst of uevents settle in, are divided by --speed too, unless given. Given --baseline, a previous report of the same trace, daemon and speed, any latency or
+# redundant apply count that grew past --tolerance is listed on stderr and the exit status is 1, e.g.:
+#
+#       $HOME/bin/hypr_session_supervisor.py ... --record-trace kvm_switch.trace
+#       $HOME/bin/hypr_hotplug_replay.py --trace kvm_switch.trace --speed 10 > kvm_switch.json
+#       $HOME/bin/hypr_hotplug_replay.py --trace kvm_switch.trace --speed 10 --baseline kvm_switch.json
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+from time import monotonic_ns, sleep
+
+from hypr_drm_poller import (
+    MAX_POLL_INTERVAL_SECONDS,
+    POLL_INTERVAL_SECONDS
+)
+
+from hypr_session_supervisor import HOTPLUG_SETTLE_SECONDS
+
+from hypr_hotplug_trace import (
+    APPLIED_EVENT,
+    CONNECTORS_EVENT,
+    START_EVENT,
+    connector_names,
+    load_hotplug_trace
+)
+
+from hypr_idle_audit import (
+    AC_UEVENT,
+    TERMINATE_GRACE_SECONDS,
+    build_fake_tree,
+    helper_environment
+)
+
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SPEED = 1
+TOLERANCE = 0.2
+LATENCY_SLACK_SECONDS = 0.05
+STARTUP_TIMEOUT_SECONDS = 10
+TRACE_CHECK_INTERVAL_SECONDS = 0.01
+NANOSECONDS_PER_SECOND = 1_000_000_000
+
+CONNECTED_STATUS = 'connected'
+DISCONNECTED_STATUS = 'disconnected'
+DAEMON_TRACE_FILE_NAME = 'replay.trace'
+UEVENT_SOCKET_FILE_NAME = 'uevent.sock'
+
+SUPERVISOR_DAEMON = 'supervisor'
+HOT_SWAP_DAEMON = 'hot-swap'
+DAEMONS = [SUPERVISOR_DAEMON, HOT_SWAP_DAEMON]
+
+# The supervisor's other helpers have nothing to do with hotplugging, and would only add noise
+
+SUPERVISOR_DISABLED_TASKS = ['background', 'battery', 'waybar']
+
+COMPARED_LATENCIES = ['median', 'p95', 'max']
+COMPARED_COUNTS = ['coalesced_changes', 'redundant_applies']
+
+
+def write_connector_states(drm_dir: str, connectors: dict[str, bool], previous_connectors: dict[str, bool]):
+
+    # Rewritten in place rather than replaced, since the hot swapping keeps the status files open
+
+    for connector, connected in connectors.items():
+        if previous_connectors.get(connector) != connected:
+            Path(f'{drm_dir}/{connector}/status').write_text(
+                    f'{CONNECTED_STATUS if connected else DISCONNECTED_STATUS}\n')
+
+
+def send_drm_uevents(uevent_socket_path: str, connectors: dict[str, bool], previous_connectors: dict[str, bool]):
+
+    # What the kernel sends for a connector status change. Nothing listening yet just loses them, as
+    # with netlink.
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as uevent_socket:
+        for connector, connected in connectors.items():
+            if previous_connectors.get(connector) == connected:
+                continue
+
+            card = connector.split('-', 1)[0]
+            devpath = f'/devices/virtual/drm/{card}'
+            uevent = f'change@{devpath}\0ACTION=change\0DEVPATH={devpath}\0SUBSYSTEM=drm\0HOTPLUG=1\0'
+
+            try:
+                uevent_socket.sendto(uevent.encode(), uevent_socket_path)
+            except OSError:
+                pass
+
+
+def wait_for_applied(daemon_trace_path: str, after_ns: int, connectors: dict[str, bool] | None,
+                     timeout: float) -> bool:
+    deadline = monotonic_ns() + int(timeout * NANOSECONDS_PER_SECOND)
+
+    while monotonic_ns() < deadline:
+        if os.path.exists(daemon_trace_path):
+            for trace_event in load_hotplug_trace(daemon_trace_path):
+                if trace_event['event'] == APPLIED_EVENT and trace_event['time_ns'] >= after_ns \
+                        and (connectors is None or trace_event['connectors'] == connectors):
+                    return True
+
+        sleep(TRACE_CHECK_INTERVAL_SECONDS)
+
+    return False
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+
+    # Nearest rank, which is good enough for the handful of changes in a trace
+
+    if not values:
+        return None
+
+    sorted_values = sorted(values)
+
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def summarize_latencies(latencies: list[float]) -> dict[str, float | None]:
+    return {
+        'min': round(min(latencies), 4) if latencies else None,
+        'median': round(percentile(latencies, 0.5), 4) if latencies else None,
+        'p95': round(percentile(latencies, 0.95), 4) if latencies else None,
+        'max': round(max(latencies), 4) if latencies else None
+    }
+
+
+def analyze_replay(replayed_changes: list[tuple[int, dict[str, bool]]], daemon_trace: list[dict],
+                   startup_done_ns: int) -> dict:
+    detections = [trace_event for trace_event in daemon_trace
+                  if trace_event['event'] == CONNECTORS_EVENT and trace_event['time_ns'] >= startup_done_ns]
+    applies = [trace_event for trace_event in daemon_trace
+               if trace_event['event'] == APPLIED_EVENT and trace_event['time_ns'] >= startup_done_ns]
+
+    changes = []
+
+    for change_number, (replayed_at, connectors) in enumerate(replayed_changes):
+        next_replayed_at = replayed_changes[change_number + 1][0] \
+            if change_number + 1 < len(replayed_changes) else None
+
+        # The change was seen if the hot swapping read these connector states before the next change
+        # was written, and the hot swap that followed that read is the one done for it
+
+        detection = next((detection for detection in detections
+                          if detection['time_ns'] >= replayed_at
+                          and (next_replayed_at is None or detection['time_ns'] < next_replayed_at)
+                          and detection['connectors'] == connectors), None)
+        change = {
+            'replayed_at': round((replayed_at - replayed_changes[0][0]) / NANOSECONDS_PER_SECOND, 4),
+            'connectors': connectors,
+            'detection_latency': None,
+            'latency': None
+        }
+
+        if detection:
+            detected_at = detection['time_ns']
+            applied = next((apply for apply in applies if apply['time_ns'] >= detected_at), None)
+
+            change['detection_latency'] = round((detected_at - replayed_at) / NANOSECONDS_PER_SECOND, 4)
+
+            if applied:
+                change['latency'] = round((applied['time_ns'] - replayed_at) / NANOSECONDS_PER_SECOND, 4)
+
+        changes.append(change)
+
+    # A hot swap was superseded if, by the time it was done, the connectors had changed again
+
+    unwritten_applies = 0
+    superseded_applies = 0
+    redundant_applies = 0
+
+    for apply in applies:
+        current_connectors = None
+
+        for replayed_at, connectors in replayed_changes:
+            if replayed_at <= apply['time_ns']:
+                current_connectors = connectors
+
+        unwritten = not apply['written']
+        superseded = current_connectors is not None and apply['connectors'] != current_connectors
+
+        unwritten_applies += unwritten
+        superseded_applies += superseded
+        redundant_applies += unwritten or superseded
+
+    latencies = [change['latency'] for change in changes if change['latency'] is not None]
+    detection_latencies = [change['detection_latency'] for change in changes
+                           if change['detection_latency'] is not None]
+
+    return {
+        'changes': len(changes),
+        'latencies': summarize_latencies(latencies),
+        'detection_latencies': summarize_latencies(detection_latencies),
+        'coalesced_changes': sum(change['detection_latency'] is None for change in changes),
+        'applies': len(applies),
+        'unwritten_applies': unwritten_applies,
+        'superseded_applies': superseded_applies,
+        'redundant_applies': redundant_applies,
+        'unverified_applies': sum(apply['verified'] is not True for apply in applies),
+        'change_details': changes
+    }
+
+
+def replay_trace(trace_events: list[dict], fake_root: str, daemon: str, speed: float, poll_interval: float,
+                 max_poll_interval: float, hotplug_settle_seconds: float, settle_seconds: float) -> dict:
+    start_event = next(trace_event for trace_event in trace_events if trace_event['event'] == START_EVENT)
+    connector_events = [trace_event for trace_event in trace_events if trace_event['event'] == CONNECTORS_EVENT]
+
+    build_fake_tree(fake_root)
+
+    # Plug the audit's fake AC adapter in, so the polling is not stretched for running on battery
+
+    Path(f'{fake_root}/sys/class/power_supply/AC/uevent').write_text(AC_UEVENT.replace('ONLINE=0', 'ONLINE=1'))
+
+    # Swap the audit's fake connectors for the ones in the trace
+
+    drm_dir = f'{fake_root}/sys/class/drm'
+    shutil.rmtree(drm_dir)
+
+    for connector in connector_names(connector_events):
+        os.makedirs(f'{drm_dir}/{connector}')
+
+    initial_connectors = {connector: False for connector in connector_names(connector_events)}
+    initial_connectors.update(connector_events[0]['connectors'])
+    write_connector_states(drm_dir, initial_connectors, {})
+
+    daemon_trace_path = f'{fake_root}/{DAEMON_TRACE_FILE_NAME}'
+    uevent_socket_path = f'{fake_root}/{UEVENT_SOCKET_FILE_NAME}'
+    environment = helper_environment(fake_root)
+
+    if daemon == SUPERVISOR_DAEMON:
+        environment['HYPR_UEVENT_SOCKET'] = uevent_socket_path
+        command = [sys.executable, f'{BIN_DIR}/hypr_session_supervisor.py', *start_event['arguments'],
+                   *[argument for task in SUPERVISOR_DISABLED_TASKS for argument in ['--disable-task', task]],
+                   '--hotplug-settle', str(hotplug_settle_seconds)]
+    else:
+        command = [sys.executable, f'{BIN_DIR}/hypr_monitor_hot_swap.py', *start_event['arguments']]
+
+    command.extend(['--poll-interval', str(poll_interval),
+                    '--max-poll-interval', str(max_poll_interval),
+                    '--record-trace', daemon_trace_path])
+
+    launched_at = monotonic_ns()
+    process = subprocess.Popen(command, env=environment, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        if not wait_for_applied(daemon_trace_path, launched_at, None, STARTUP_TIMEOUT_SECONDS):
+            raise TimeoutError(f'The hot swapping did not finish starting up within {STARTUP_TIMEOUT_SECONDS} seconds')
+
+        startup_done_ns = monotonic_ns()
+        replayed_changes = []
+        previous_connectors = initial_connectors
+        trace_start_ns = connector_events[0]['time_ns']
+
+        for connector_event in connector_events[1:]:
+            connectors = dict(previous_connectors)
+            connectors.update(connector_event['connectors'])
+
+            if connectors == previous_connectors:
+                continue
+
+            replay_at = startup_done_ns + int((connector_event['time_ns'] - trace_start_ns) / speed)
+            sleep(max(replay_at - monotonic_ns(), 0) / NANOSECONDS_PER_SECOND)
+
+            # Timed before the write, so a read that sees the change is never timed before it
+
+            replayed_changes.append((monotonic_ns(), connectors))
+            write_connector_states(drm_dir, connectors, previous_connectors)
+
+            if daemon == SUPERVISOR_DAEMON:
+                send_drm_uevents(uevent_socket_path, connectors, previous_connectors)
+
+            previous_connectors = connectors
+
+        # Give the hot swapping until it has caught up with the last change, or the settle time passed
+
+        if replayed_changes:
+            wait_for_applied(daemon_trace_path, replayed_changes[-1][0], previous_connectors, settle_seconds)
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(TERMINATE_GRACE_SECONDS)
+        except ProcessLookupError:
+            pass
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+    return analyze_replay(replayed_changes, load_hotplug_trace(daemon_trace_path), startup_done_ns)
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+
+    for statistic in COMPARED_LATENCIES:
+        value = report['latencies'][statistic]
+        baseline_value = baseline.get('latencies', {}).get(statistic)
+
+        if value is None or baseline_value is None:
+            continue
+
+        # Latencies jitter with the scheduler from run to run, so allow a little absolute slack too
+
+        if value > baseline_value * (1 + tolerance) + LATENCY_SLACK_SECONDS:
+            regressions.append(f'{statistic} latency: {baseline_value} => {value}')
+
+    for count in COMPARED_COUNTS:
+        if report[count] > baseline.get(count, report[count]):
+            regressions.append(f'{count}: {baseline[count]} => {report[count]}')
+
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Replays a hotplug trace recorded with --record-trace against a fake sysfs and config tree, and
+    reports the hot swap latencies and redundant hot swaps, as JSON.
+    ''',
+        epilog='Hyprland hotplug trace replay',
+        argument_default=None,
+        usage='''
+    [-h]
+    --trace <file>
+    [--daemon <supervisor|hot-swap>]
+    [--speed <factor>]
+    [--poll-interval <seconds>]
+    [--max-poll-interval <seconds>]
+    [--hotplug-settle <seconds>]
+    [--settle <seconds>]
+    [--baseline <report.json>]
+    [--tolerance <fraction>]
+    [--keep-tree]
+    '''
+        )
+
+    arg_parser.add_argument(
+        '--trace',
+        help='The trace to replay',
+        required=True
+        )
+
+    arg_parser.add_argument(
+        '--daemon',
+        help=f'The hot swapping to replay against, defaults to {SUPERVISOR_DAEMON}, driven by uevents, '
+             + f'{HOT_SWAP_DAEMON} is the polling fallback',
+        choices=DAEMONS,
+        default=SUPERVISOR_DAEMON
+        )
+
+    arg_parser.add_argument(
+        '--speed',
+        help=f'How many times faster than recorded to replay the trace, defaults to {SPEED}',
+        type=float,
+        default=SPEED
+        )
+
+    arg_parser.add_argument(
+        '--poll-interval',
+        help='Seconds between monitor connection checks of the hot swapping, defaults to '
+             + f'{POLL_INTERVAL_SECONDS} divided by the speed',
+        type=float
+        )
+
+    arg_parser.add_argument(
+        '--max-poll-interval',
+        help='Seconds the polling interval of the hot swapping backs off to, defaults to '
+             + f'{MAX_POLL_INTERVAL_SECONDS} divided by the speed',
+        type=float
+        )
+
+    arg_parser.add_argument(
+        '--hotplug-settle',
+        help='Seconds the supervisor lets a burst of drm uevents settle before hot swapping, defaults to '
+             + f'{HOTPLUG_SETTLE_SECONDS} divided by the speed',
+        type=float
+        )
+
+    arg_parser.add_argument(
+        '--settle',
+        help='Seconds to wait for the hot swapping to catch up after the last change, defaults to '
+             + 'twice the max poll interval or the hotplug settle window, whichever is longer',
+        type=float
+        )
+
+    arg_parser.add_argument(
+        '--baseline',
+        help='A previous report to compare against, exit status is 1 if any latency or count grew'
+        )
+
+    arg_parser.add_argument(
+        '--tolerance',
+        help=f'Fraction a latency may grow over the baseline before it counts, defaults to {TOLERANCE}',
+        type=float,
+        default=TOLERANCE
+        )
+
+    arg_parser.add_argument(
+        '--keep-tree',
+        help='Do not delete the fake tree afterwards, print where it is instead',
+        action='store_true'
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    if cli_args.speed <= 0:
+        print('Error! The speed must be greater than 0!', file=sys.stderr)
+        exit(1)
+
+    if not os.path.isfile(cli_args.trace):
+        print(f'Error! {cli_args.trace} is not a file!', file=sys.stderr)
+        exit(1)
+
+    trace_events = load_hotplug_trace(cli_args.trace)
+
+    if not any(trace_event['event'] == START_EVENT for trace_event in trace_events) \
+            or not any(trace_event['event'] == CONNECTORS_EVENT for trace_event in trace_events):
+        print(f'Error! {cli_args.trace} is not a hotplug trace!', file=sys.stderr)
+        exit(1)
+
+    poll_interval = cli_args.poll_interval or POLL_INTERVAL_SECONDS / cli_args.speed
+    max_poll_interval = cli_args.max_poll_interval or MAX_POLL_INTERVAL_SECONDS / cli_args.speed
+    hotplug_settle_seconds = cli_args.hotplug_settle or HOTPLUG_SETTLE_SECONDS / cli_args.speed
+    settle_seconds = cli_args.settle or 2 * max(max_poll_interval, hotplug_settle_seconds)
+
+    fake_root = tempfile.mkdtemp(prefix='hypr_hotplug_replay.')
+
+    try:
+        report = {
+            'trace': os.path.basename(cli_args.trace),
+            'daemon': cli_args.daemon,
+            'speed': cli_args.speed,
+            'poll_interval': poll_interval,
+            'max_poll_interval': max_poll_interval,
+            'hotplug_settle': hotplug_settle_seconds if cli_args.daemon == SUPERVISOR_DAEMON else None,
+            **replay_trace(trace_events, fake_root, cli_args.daemon, cli_args.speed, poll_interval,
+                           max_poll_interval, hotplug_settle_seconds, settle_seconds)
+        }
+    except TimeoutError as error:
+        print(f'Error! {error}!', file=sys.stderr)
+        exit(1)
+    finally:
+        if cli_args.keep_tree:
+            print(f'Fake tree kept in {fake_root}', file=sys.stderr)
+        else:
+            shutil.rmtree(fake_root, ignore_errors=True)
+
+    print(json.dumps(report, indent=4))
+
+    if cli_args.baseline:
+        with open(cli_args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+
+        # Latencies only compare fairly between replays of the same trace against the same daemon at the
+        # same speed. Baselines from before --daemon existed were replayed against hot-swap.
+
+        baseline_daemon = baseline.get('daemon', HOT_SWAP_DAEMON)
+
+        if (baseline['trace'], baseline_daemon, baseline['speed']) != (report['trace'], report['daemon'],
+                                                                         report['speed']):
+            print(f'Error! The baseline replayed {baseline["trace"]} against {baseline_daemon} at speed '
+                  + f'{baseline["speed"]:g}, not {report["trace"]} against {report["daemon"]} at speed '
+                  + f'{report["speed"]:g}!', file=sys.stderr)
+            exit(2)
+
+        regressions = find_regressions(report, baseline, cli_args.tolerance)
+
+        for regression in regressions:
+            print(f'Hotplug latency regression! {regression}', file=sys.stderr)
+
+        if regressions:
+            exit(1)
@@ -0,0 +1,109 @@
+import argparse
+import json
+import time
+
+from typing import TextIO
+
+# A trace of what the hot swapping observed and did, for reproducing dock and KVM timing bugs, see
+# bin/hypr_hotplug_replay.py. Both bin/hypr_session_supervisor.py and bin/hypr_monitor_hot_swap.py
+# record one with --record-trace. The trace is one JSON object per line:
+#
+#       {"event": "start", "time_ns": ..., "wall_time": ..., "arguments": [...]}
+#       {"event": "connectors", "time_ns": ..., "connectors": {"card1-DP-1": true, ...}}
+#       {"event": "applied", "time_ns": ..., "state": "DP-1+eDP-1", "connectors": {...}, "written": true,
+#        "verified": true}
+#
+# "start" holds the monitor arguments the hot swapping ran with, so a replay sets up the same layout.
+# "connectors" is recorded whenever the connector states were seen to change, as read when the change
+# was detected, keyed by the connector directory under /sys/class/drm. "applied" is recorded once a hot
+# swap is done, with the connector states it was done for, whether a config was written and whether
+# Hyprland was seen to apply it, or null if there was no Hyprland to ask.
+#
+# The times are from CLOCK_MONOTONIC, which every process on the machine shares, so a replay can
+# compare the times it changed the connectors at with the times the hot swapping recorded. Each line is
+# flushed as it is recorded, so a trace survives the hot swapping being killed.
+
+START_EVENT = 'start'
+CONNECTORS_EVENT = 'connectors'
+APPLIED_EVENT = 'applied'
+
+
+class HotplugTraceRecorder(object):
+
+    _trace_file: TextIO
+
+
+    def __init__(self, trace_path: str, arguments: list[str]):
+        self._trace_file = open(trace_path, 'w', buffering=1)
+
+        self._record({
+            'event': START_EVENT,
+            'time_ns': time.monotonic_ns(),
+            'wall_time': time.time(),
+            'arguments': arguments
+        })
+
+
+    def close(self):
+        self._trace_file.close()
+
+
+    def record_connectors(self, connectors: dict[str, bool]):
+
+        # Timed after the connectors were read, so the time is never before the change that was read
+
+        self._record({
+            'event': CONNECTORS_EVENT,
+            'time_ns': time.monotonic_ns(),
+            'connectors': connectors
+        })
+
+
+    def record_applied(self, state: str, connectors: dict[str, bool], written: bool, verified: bool | None):
+        self._record({
+            'event': APPLIED_EVENT,
+            'time_ns': time.monotonic_ns(),
+            'state': state,
+            'connectors': connectors,
+            'written': written,
+            'verified': verified
+        })
+
+
+    def _record(self, trace_event: dict):
+        self._trace_file.write(f'{json.dumps(trace_event, separators=(",", ":"))}\n')
+
+
+def add_record_trace_argument(arg_parser: argparse.ArgumentParser):
+    arg_parser.add_argument(
+        '--record-trace',
+        help='Record the connector states seen and the hot swaps done, with timestamps, to the given '
+             + 'file, see bin/hypr_hotplug_replay.py'
+        )
+
+
+def load_hotplug_trace(trace_path: str) -> list[dict]:
+
+    # A trace cut off mid line, e.g. by a crash, just loses that line
+
+    trace_events = []
+
+    with open(trace_path, 'r') as trace_file:
+        for line in trace_file:
+            try:
+                trace_events.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return trace_events
+
+
+def connector_names(trace_events: list[dict]) -> list[str]:
+    names = []
+
+    for trace_event in trace_events:
+        for name in trace_event.get('connectors', {}):
+            if name not in names:
+                names.append(name)
+
+    return names
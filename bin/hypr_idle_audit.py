@@ -0,0 +1,478 @@
+#!/usr/bin/env python
+
+# Measure what each resident session helper costs while the desktop is idle. Each helper is run, one
+# at a time, against a throwaway tree for a fixed period:
+#
+#       sys/class/drm           -> fake connectors, matching the monitor names in bin/hypr_start
+#       sys/class/power_supply  -> a fake battery at 50% discharging and an unplugged AC adapter
+#       home/.config            -> copies of this repo's hyprland.conf and Waybar config
+#       home/Pictures/...       -> a handful of empty "images"
+#       bin                     -> no-op stand-ins for swww, waybar, inotifywait, notify-send, acpi, etc.
+#       run                     -> $XDG_RUNTIME_DIR, for the sockets the helpers listen on
+#
+# The Python helpers read the fake sysfs tree through HYPR_SYSFS_DIR. The legacy hypr_low_batt calls
+# /usr/bin/acpi etc. by absolute path, so it is run from a copy with those paths made relative.
+#
+# For each helper the report has:
+#
+#       wakeups          -> voluntary context switches, i.e. times it slept and was woken again
+#       context_switches -> voluntary plus involuntary context switches
+#       cpu_seconds      -> user plus system CPU time
+#       process_spawns   -> processes its tree forked while it ran, i.e. every process seen in its
+#                           tree while sampling plus every one reaped from it afterwards, so a child
+#                           that both started and was reaped by its parent between two samples is
+#                           missed
+#       read_syscalls    -> read syscalls, from /proc/<pid>/io of every process in its tree
+#       write_syscalls   -> write syscalls, likewise
+#       file_opens       -> open/openat syscalls, only with --strace (and strace installed), which
+#                           also replaces process_spawns with the exact count of forks
+#
+# CPU time and context switches come from wait4() on the helper and, with this process set as the
+# child subreaper, on everything the helper left behind (e.g. "& disown"), so exited children are
+# counted too. The report is JSON, and its metric_sources say how process_spawns and file_opens were
+# counted in that run, so a sampled lower bound is not read as an exact count, and a missing file_opens
+# not as zero. Given --baseline, a previous report of the same --duration, any metric that grew past
+# --tolerance is listed on stderr and the exit status is 1, e.g.:
+#
+#       $HOME/bin/hypr_idle_audit.py --duration 120 > idle_baseline.json
+#       $HOME/bin/hypr_idle_audit.py --duration 120 --baseline idle_baseline.json
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+from time import monotonic, sleep
+
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BIN_DIR)
+
+AUDIT_DURATION_SECONDS = 60
+SAMPLE_INTERVAL_SECONDS = 0.5
+TERMINATE_GRACE_SECONDS = 2
+TOLERANCE = 0.2
+ABSOLUTE_SLACK = 2
+CPU_SLACK_SECONDS = 0.05
+
+PR_SET_CHILD_SUBREAPER = 36
+
+BACKGROUND_IMAGES_DIR = 'Pictures/background_images/hypr'
+MONITOR_ARGS = [
+    '-l', 'DP-1', '1920x1080', '75', '0x0', '1',
+    '-c', 'DP-2', '1920x1080', '60', '1920x0', '1',
+    '-r', 'HDMI-A-1', '1920x1080', '75', '3840x0', '1',
+    '-b', 'eDP-1', '1366x768', '60', '5680x0', '1',
+    '-s', 'l',
+    '-w'
+]
+CONNECTOR_STATUSES = {
+    'card0-DP-1': 'disconnected',
+    'card0-DP-2': 'connected',
+    'card0-HDMI-A-1': 'disconnected',
+    'card0-eDP-1': 'connected'
+}
+BATTERY_UEVENT = '''POWER_SUPPLY_NAME=BAT0
+POWER_SUPPLY_TYPE=Battery
+POWER_SUPPLY_STATUS=Discharging
+POWER_SUPPLY_CAPACITY=50
+POWER_SUPPLY_ENERGY_NOW=25000000
+POWER_SUPPLY_ENERGY_FULL=50000000
+POWER_SUPPLY_POWER_NOW=8000000
+'''
+AC_UEVENT = '''POWER_SUPPLY_NAME=AC
+POWER_SUPPLY_TYPE=Mains
+POWER_SUPPLY_ONLINE=0
+'''
+FAKE_COMMANDS = {
+    'swww': 'exit 0',
+    'waybar': 'exec sleep 2147483647',
+    'inotifywait': 'exec sleep 2147483647',
+    'killall': 'exit 0',
+    'notify-send': 'exit 0',
+    'hyprlock': 'exit 0',
+    'hyprctl': 'exit 0',
+    'systemctl': 'exit 0',
+    'acpi': 'echo "Battery 0: Discharging, 50%, 02:00:00 remaining"'
+}
+
+COMPARED_METRICS = ['wakeups', 'context_switches', 'cpu_seconds', 'process_spawns', 'read_syscalls',
+                    'write_syscalls', 'file_opens']
+STRACE_SUMMARY_REGEX = re.compile('^\\s*[0-9.]+\\s+[0-9.]+\\s+[0-9]+\\s+([0-9]+)\\s+(?:[0-9]+\\s+)?(\\w+)$')
+OPEN_SYSCALLS = {'open', 'openat', 'openat2', 'creat'}
+FORK_SYSCALLS = {'fork', 'vfork', 'clone', 'clone3'}
+
+SAMPLED_SPAWNS_SOURCE = (f'sampled every {SAMPLE_INTERVAL_SECONDS:g}s plus reaped orphans, a lower bound, '
+                         + 'misses children started and reaped between two samples, exact with --strace')
+STRACE_SOURCE = 'strace -f, exact'
+REQUIRES_STRACE_SOURCE = 'requires --strace'
+
+
+def metric_sources(strace: bool) -> dict[str, str]:
+    return {
+        'process_spawns': STRACE_SOURCE if strace else SAMPLED_SPAWNS_SOURCE,
+        'file_opens': STRACE_SOURCE if strace else REQUIRES_STRACE_SOURCE
+    }
+
+
+def helper_commands(fake_root: str) -> dict[str, list[str]]:
+    python = sys.executable
+
+    return {
+        'hypr_monitor_hot_swap.py': [python, f'{BIN_DIR}/hypr_monitor_hot_swap.py', *MONITOR_ARGS],
+        'hypr_background_changer': ['bash', f'{BIN_DIR}/hypr_background_changer',
+                                    '-d', BACKGROUND_IMAGES_DIR, '-s', '10'],
+        'hypr_battery_monitor.py': [python, f'{BIN_DIR}/hypr_battery_monitor.py'],
+        'hypr_low_batt': ['bash', f'{fake_root}/bin/hypr_low_batt'],
+        'run_waybar.sh': ['bash', f'{BIN_DIR}/run_waybar.sh'],
+        'hypr_session_supervisor.py': [python, f'{BIN_DIR}/hypr_session_supervisor.py', *MONITOR_ARGS,
+                                       '-d', BACKGROUND_IMAGES_DIR, '-m', '1']
+    }
+
+
+def build_fake_tree(fake_root: str):
+    drm_dir = f'{fake_root}/sys/class/drm'
+    power_supply_dir = f'{fake_root}/sys/class/power_supply'
+    home_dir = f'{fake_root}/home'
+    fake_bin_dir = f'{fake_root}/bin'
+
+    os.makedirs(f'{fake_root}/run', mode=0o700)
+
+    for connector, status in CONNECTOR_STATUSES.items():
+        os.makedirs(f'{drm_dir}/{connector}')
+        Path(f'{drm_dir}/{connector}/status').write_text(f'{status}\n')
+
+    for supply, uevent in [('BAT0', BATTERY_UEVENT), ('AC', AC_UEVENT)]:
+        os.makedirs(f'{power_supply_dir}/{supply}')
+        Path(f'{power_supply_dir}/{supply}/uevent').write_text(uevent)
+
+    os.makedirs(f'{home_dir}/.config/hypr')
+    os.makedirs(f'{home_dir}/.config/waybar')
+    os.makedirs(f'{home_dir}/{BACKGROUND_IMAGES_DIR}')
+
+    shutil.copyfile(f'{REPO_DIR}/.config/hypr/hyprland.conf', f'{home_dir}/.config/hypr/hyprland.conf')
+    shutil.copyfile(f'{REPO_DIR}/.config/waybar/config', f'{home_dir}/.config/waybar/config')
+    shutil.copyfile(f'{REPO_DIR}/.config/waybar/style.css', f'{home_dir}/.config/waybar/style.css')
+
+    for image_number in range(8):
+        Path(f'{home_dir}/{BACKGROUND_IMAGES_DIR}/background_{image_number:02}.png').touch()
+
+    # The helpers call each other through $HOME/bin
+
+    os.symlink(BIN_DIR, f'{home_dir}/bin')
+
+    os.makedirs(fake_bin_dir)
+
+    for command, body in FAKE_COMMANDS.items():
+        Path(f'{fake_bin_dir}/{command}').write_text(f'#!/bin/sh\n{body}\n')
+        os.chmod(f'{fake_bin_dir}/{command}', 0o755)
+
+    legacy_low_batt = Path(f'{BIN_DIR}/currently_unused/hypr_low_batt').read_text()
+    Path(f'{fake_bin_dir}/hypr_low_batt').write_text(legacy_low_batt.replace('/usr/bin/', ''))
+
+
+def helper_environment(fake_root: str) -> dict[str, str]:
+    environment = dict(os.environ)
+
+    environment['HOME'] = f'{fake_root}/home'
+    environment['PATH'] = f'{fake_root}/bin:{environment.get("PATH", "")}'
+    environment['HYPR_SYSFS_DIR'] = f'{fake_root}/sys'
+    environment['XDG_CACHE_HOME'] = f'{fake_root}/home/.cache'
+
+    # Keep the sockets the helpers listen on, e.g. bin/hypr_config_writer.py, away from the real ones
+
+    environment['XDG_RUNTIME_DIR'] = f'{fake_root}/run'
+    environment['PYTHONDONTWRITEBYTECODE'] = '1'
+
+    # Keep the helpers away from the Hyprland that may be running, see bin/hypr_ipc.py
+
+    environment.pop('HYPRLAND_INSTANCE_SIGNATURE', None)
+
+    return environment
+
+
+def read_process_tree(root_pid: int) -> list[int]:
+    children = {}
+
+    for proc_dir in Path('/proc').iterdir():
+        if not proc_dir.name.isdigit():
+            continue
+
+        try:
+            stat = (proc_dir / 'stat').read_text()
+        except OSError:
+            continue
+
+        # The command name may contain spaces and parentheses, the fields after it do not
+
+        parent_pid = int(stat[stat.rindex(')') + 2:].split()[1])
+        children.setdefault(parent_pid, []).append(int(proc_dir.name))
+
+    tree = [root_pid]
+
+    for pid in tree:
+        tree.extend(children.get(pid, []))
+
+    return tree
+
+
+def read_io_counters(pid: int) -> dict[str, int] | None:
+    try:
+        with open(f'/proc/{pid}/io', 'r') as file:
+            counters = {}
+
+            for line in file:
+                key, _, value = line.partition(':')
+                counters[key] = int(value)
+
+            return counters
+    except (OSError, ValueError):
+        return None
+
+
+def run_strace_pass(command: list[str], environment: dict[str, str], duration: float) -> dict[str, int]:
+    with tempfile.NamedTemporaryFile('r', suffix='.strace') as strace_output:
+        strace_command = ['strace', '-f', '-qq', '-c', '-o', strace_output.name,
+                          '-e', f'trace={",".join(sorted(OPEN_SYSCALLS | FORK_SYSCALLS))}', *command]
+
+        process = subprocess.Popen(strace_command, env=environment, start_new_session=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        sleep(duration)
+        os.killpg(process.pid, signal.SIGTERM)
+
+        try:
+            process.wait(TERMINATE_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+        syscall_counts = {}
+
+        for line in strace_output.read().splitlines():
+            match = STRACE_SUMMARY_REGEX.match(line)
+
+            if match:
+                syscall_counts[match.group(2)] = int(match.group(1))
+
+        return {
+            'file_opens': sum(syscall_counts.get(syscall, 0) for syscall in OPEN_SYSCALLS),
+            'process_spawns': sum(syscall_counts.get(syscall, 0) for syscall in FORK_SYSCALLS)
+        }
+
+
+def audit_helper(command: list[str], environment: dict[str, str], duration: float,
+                 strace: bool) -> dict[str, float | int | None]:
+    io_counters = {}
+    spawned_pids = set()
+
+    process = subprocess.Popen(command, env=environment, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    audit_end = monotonic() + duration
+
+    while monotonic() < audit_end:
+        for pid in read_process_tree(process.pid):
+            spawned_pids.add(pid)
+            pid_io_counters = read_io_counters(pid)
+
+            if pid_io_counters:
+                io_counters[pid] = pid_io_counters
+
+        sleep(min(SAMPLE_INTERVAL_SECONDS, max(audit_end - monotonic(), 0)))
+
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        sleep(TERMINATE_GRACE_SECONDS)
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+    # Reap the helper and whatever it orphaned onto this process, adding up their resource usage. An
+    # orphan that exited between two samples is only seen here.
+
+    user_seconds = 0.0
+    system_seconds = 0.0
+    voluntary_switches = 0
+    involuntary_switches = 0
+
+    while True:
+        try:
+            pid, _, resource_usage = os.wait4(-1, 0)
+        except ChildProcessError:
+            break
+
+        spawned_pids.add(pid)
+
+        user_seconds += resource_usage.ru_utime
+        system_seconds += resource_usage.ru_stime
+        voluntary_switches += resource_usage.ru_nvcsw
+        involuntary_switches += resource_usage.ru_nivcsw
+
+    process.returncode = 0
+
+    report = {
+        'wakeups': voluntary_switches,
+        'context_switches': voluntary_switches + involuntary_switches,
+        'cpu_seconds': round(user_seconds + system_seconds, 3),
+        'process_spawns': len(spawned_pids - {process.pid}),
+        'read_syscalls': sum(counters.get('syscr', 0) for counters in io_counters.values()),
+        'write_syscalls': sum(counters.get('syscw', 0) for counters in io_counters.values()),
+        'file_opens': None
+    }
+
+    if strace:
+        report.update(run_strace_pass(command, environment, duration))
+
+    return report
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+
+    # A count taken a different way than the baseline's, e.g. exact forks against sampled ones, says
+    # nothing about a regression
+
+    sources = report.get('metric_sources', {})
+    baseline_sources = baseline.get('metric_sources', {})
+    compared_metrics = [metric for metric in COMPARED_METRICS
+                        if sources.get(metric) == baseline_sources.get(metric)]
+
+    for helper, metrics in report['helpers'].items():
+        baseline_metrics = baseline.get('helpers', {}).get(helper)
+
+        if not baseline_metrics:
+            continue
+
+        for metric in compared_metrics:
+            value = metrics.get(metric)
+            baseline_value = baseline_metrics.get(metric)
+
+            if value is None or baseline_value is None:
+                continue
+
+            # Small counts and CPU times jitter from run to run, so allow a little absolute slack too
+
+            slack = CPU_SLACK_SECONDS if metric == 'cpu_seconds' else ABSOLUTE_SLACK
+
+            if value > baseline_value * (1 + tolerance) + slack:
+                regressions.append(f'{helper} {metric}: {baseline_value} => {value}')
+
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Runs each resident session helper against a fake sysfs and config tree for a fixed period and
+    reports what it cost while idle, as JSON.
+    ''',
+        epilog='Hyprland helper idle cost audit',
+        argument_default=None,
+        usage='''
+    [-h]
+    [--duration <seconds>]
+    [--helper <name>]
+    [--strace]
+    [--baseline <report.json>]
+    [--tolerance <fraction>]
+    [--keep-tree]
+    '''
+        )
+
+    arg_parser.add_argument(
+        '--duration',
+        help=f'Seconds to run each helper for, defaults to {AUDIT_DURATION_SECONDS}',
+        type=float,
+        default=AUDIT_DURATION_SECONDS
+        )
+
+    arg_parser.add_argument(
+        '--helper',
+        help='Only audit the given helper, may be given more than once',
+        action='append',
+        choices=list(helper_commands('').keys())
+        )
+
+    arg_parser.add_argument(
+        '--strace',
+        help='Run each helper a second time under strace to count file opens and forks exactly',
+        action='store_true'
+        )
+
+    arg_parser.add_argument(
+        '--baseline',
+        help='A previous report to compare against, exit status is 1 if any metric grew'
+        )
+
+    arg_parser.add_argument(
+        '--tolerance',
+        help=f'Fraction a metric may grow over the baseline before it counts, defaults to {TOLERANCE}',
+        type=float,
+        default=TOLERANCE
+        )
+
+    arg_parser.add_argument(
+        '--keep-tree',
+        help='Do not delete the fake tree afterwards, print where it is instead',
+        action='store_true'
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    if cli_args.strace and not shutil.which('strace'):
+        print('Error! --strace given, but strace is not installed!', file=sys.stderr)
+        exit(1)
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0)
+
+    fake_root = tempfile.mkdtemp(prefix='hypr_idle_audit.')
+
+    try:
+        build_fake_tree(fake_root)
+
+        environment = helper_environment(fake_root)
+        commands = helper_commands(fake_root)
+        report = {'duration_seconds': cli_args.duration, 'metric_sources': metric_sources(cli_args.strace),
+                  'helpers': {}}
+
+        for helper, command in commands.items():
+            if cli_args.helper and helper not in cli_args.helper:
+                continue
+
+            print(f'Auditing {helper} for {cli_args.duration:g} seconds', file=sys.stderr, flush=True)
+
+            report['helpers'][helper] = audit_helper(command, environment, cli_args.duration, cli_args.strace)
+    finally:
+        if cli_args.keep_tree:
+            print(f'Fake tree kept in {fake_root}', file=sys.stderr)
+        else:
+            shutil.rmtree(fake_root, ignore_errors=True)
+
+    print(json.dumps(report, indent=4))
+
+    if cli_args.baseline:
+        with open(cli_args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+
+        # Startup costs are in every report, so only reports of the same duration compare fairly
+
+        if baseline['duration_seconds'] != report['duration_seconds']:
+            print(f'Error! The baseline ran for {baseline["duration_seconds"]:g} seconds, not '
+                  + f'{report["duration_seconds"]:g}!', file=sys.stderr)
+            exit(2)
+
+        regressions = find_regressions(report, baseline, cli_args.tolerance)
+
+        for regression in regressions:
+            print(f'Idle cost regression! {regression}', file=sys.stderr)
+
+        if regressions:
+            exit(1)
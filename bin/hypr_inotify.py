@@ -0,0 +1,112 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+
+# Values from <sys/inotify.h>
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+EVENT_HEADER_FORMAT = 'iIII'
+EVENT_HEADER_SIZE = struct.calcsize(EVENT_HEADER_FORMAT)
+EVENT_BUFFER_SIZE = 64 * 1024
+
+
+class InotifyEvent(object):
+
+    _watch_descriptor: int
+    _mask: int
+    _name: str
+
+
+    def __init__(self, watch_descriptor: int, mask: int, name: str):
+        self._watch_descriptor = watch_descriptor
+        self._mask = mask
+        self._name = name
+
+
+    def __repr__(self):
+        return f'InotifyEvent({self._watch_descriptor}, {self._mask:#x}, {self._name!r})'
+
+
+    @property
+    def watch_descriptor(self):
+        return self._watch_descriptor
+
+
+    @property
+    def mask(self):
+        return self._mask
+
+
+    @property
+    def name(self):
+        return self._name
+
+
+class Inotify(object):
+
+    # A thin ctypes wrapper, so watching config files does not need inotifywait or a third party
+    # package. One instance (i.e. one fd) can hold any number of watches.
+
+    _libc: ctypes.CDLL
+    _fd: int
+
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+
+    def fileno(self) -> int:
+        return self._fd
+
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+    def add_watch(self, path: str, mask: int) -> int:
+        watch_descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+
+        if watch_descriptor < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+
+        return watch_descriptor
+
+
+    def read_events(self) -> list[InotifyEvent]:
+        events = []
+
+        while True:
+            try:
+                buffer = os.read(self._fd, EVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+
+            offset = 0
+
+            while offset < len(buffer):
+                watch_descriptor, mask, _, name_size = struct.unpack_from(EVENT_HEADER_FORMAT, buffer, offset)
+                offset += EVENT_HEADER_SIZE
+                name = buffer[offset:offset + name_size].rstrip(b'\0').decode(errors='replace')
+                offset += name_size
+
+                events.append(InotifyEvent(watch_descriptor, mask, name))
+
+        return events
@@ -0,0 +1,240 @@
+import json
+import os
+import select
+import socket
+
+from time import monotonic
+
+# A client for Hyprland's sockets, so the helpers can ask Hyprland what it actually applied without
+# spawning hyprctl:
+#
+#       .socket.sock  -> requests, one per connection, e.g. "j/monitors" answered with JSON
+#       .socket2.sock -> events, one "name>>data" line each, e.g. "monitoradded>>DP-1"
+#
+# The answers to j/monitors and j/workspaces are cached in memory for as long as the event socket has
+# not reported anything that could change them. Pending events are drained (one non-blocking recv)
+# before each query, so a cached answer is never older than the last event. Without the event socket
+# nothing is cached.
+
+HYPRLAND_INSTANCE_SIGNATURE = os.getenv('HYPRLAND_INSTANCE_SIGNATURE')
+XDG_RUNTIME_DIR = os.getenv('XDG_RUNTIME_DIR', f'/run/user/{os.getuid()}')
+
+REQUEST_SOCKET_NAME = '.socket.sock'
+EVENT_SOCKET_NAME = '.socket2.sock'
+REQUEST_TIMEOUT_SECONDS = 2
+RECEIVE_BUFFER_SIZE = 65536
+
+MONITORS_REQUEST = 'j/monitors all'
+WORKSPACES_REQUEST = 'j/workspaces'
+RELOAD_REQUEST = 'reload'
+
+CONFIG_RELOADED_EVENT = 'configreloaded'
+
+# Which events make which cached answers stale, by event name prefix
+
+INVALIDATING_EVENTS = {
+    MONITORS_REQUEST: ('monitor', 'focusedmon', 'workspace', 'moveworkspace', 'activespecial', 'configreloaded'),
+    WORKSPACES_REQUEST: ('monitor', 'workspace', 'createworkspace', 'destroyworkspace', 'moveworkspace',
+                         'renameworkspace', 'openwindow', 'closewindow', 'movewindow', 'activespecial',
+                         'configreloaded')
+}
+
+
+class HyprlandIpcError(OSError):
+    pass
+
+
+def find_socket_dir() -> str | None:
+
+    # Newer Hyprland versions keep the sockets under $XDG_RUNTIME_DIR, older ones under /tmp
+
+    if not HYPRLAND_INSTANCE_SIGNATURE:
+        return None
+
+    for socket_dir in [f'{XDG_RUNTIME_DIR}/hypr/{HYPRLAND_INSTANCE_SIGNATURE}',
+                       f'/tmp/hypr/{HYPRLAND_INSTANCE_SIGNATURE}']:
+        if os.path.exists(f'{socket_dir}/{REQUEST_SOCKET_NAME}'):
+            return socket_dir
+
+    return None
+
+
+class HyprlandIpc(object):
+
+    _socket_dir: str | None
+    _event_socket: socket.socket | None
+    _event_buffer: bytes
+    _cache: dict[str, list]
+
+
+    def __init__(self, socket_dir: str = None):
+        self._socket_dir = socket_dir if socket_dir else find_socket_dir()
+        self._event_socket = None
+        self._event_buffer = b''
+        self._cache = {}
+
+
+    @property
+    def socket_dir(self):
+        return self._socket_dir
+
+
+    @property
+    def available(self):
+        return self._socket_dir is not None and os.path.exists(f'{self._socket_dir}/{REQUEST_SOCKET_NAME}')
+
+
+    @property
+    def events_connected(self):
+        return self._event_socket is not None
+
+
+    def close(self):
+        if self._event_socket:
+            self._event_socket.close()
+            self._event_socket = None
+            self._cache.clear()
+
+
+    def connect_events(self) -> bool:
+        if self._event_socket:
+            return True
+
+        if not self._socket_dir:
+            return False
+
+        event_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_CLOEXEC)
+
+        try:
+            event_socket.connect(f'{self._socket_dir}/{EVENT_SOCKET_NAME}')
+        except OSError:
+            event_socket.close()
+
+            return False
+
+        event_socket.setblocking(False)
+        self._event_socket = event_socket
+        self._event_buffer = b''
+        self._cache.clear()
+
+        return True
+
+
+    def event_fileno(self) -> int | None:
+        return self._event_socket.fileno() if self._event_socket else None
+
+
+    def request(self, command: str) -> bytes:
+        if not self._socket_dir:
+            raise HyprlandIpcError('Hyprland is not running, or its sockets were not found')
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_CLOEXEC) as request_socket:
+            request_socket.settimeout(REQUEST_TIMEOUT_SECONDS)
+
+            try:
+                request_socket.connect(f'{self._socket_dir}/{REQUEST_SOCKET_NAME}')
+                request_socket.sendall(command.encode())
+
+                # Hyprland closes the connection after answering
+
+                chunks = []
+
+                while chunk := request_socket.recv(RECEIVE_BUFFER_SIZE):
+                    chunks.append(chunk)
+            except OSError as error:
+                raise HyprlandIpcError(f'Hyprland request {command} failed: {error}') from error
+
+        return b''.join(chunks)
+
+
+    def query(self, command: str) -> list:
+        self.read_events()
+
+        if command in self._cache:
+            return self._cache[command]
+
+        answer = json.loads(self.request(command))
+
+        if self._event_socket:
+            self._cache[command] = answer
+
+        return answer
+
+
+    def monitors(self) -> list[dict]:
+
+        # Includes disabled monitors, with "disabled": true
+
+        return self.query(MONITORS_REQUEST)
+
+
+    def workspaces(self) -> list[dict]:
+        return self.query(WORKSPACES_REQUEST)
+
+
+    def reload(self) -> bool:
+        self._cache.clear()
+
+        return self.request(RELOAD_REQUEST).strip() == b'ok'
+
+
+    def read_events(self) -> list[tuple[str, str]]:
+
+        # Drains whatever events are pending, without blocking, dropping the cached answers they affect
+
+        if not self._event_socket:
+            return []
+
+        while True:
+            try:
+                chunk = self._event_socket.recv(RECEIVE_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            except OSError:
+                chunk = b''
+
+            if not chunk:
+
+                # Hyprland went away, or restarted, so stop trusting the cache until reconnected
+
+                self.close()
+                break
+
+            self._event_buffer += chunk
+
+        events = []
+
+        if b'\n' in self._event_buffer:
+            lines, _, self._event_buffer = self._event_buffer.rpartition(b'\n')
+
+            for line in lines.split(b'\n'):
+                name, _, data = line.decode(errors='replace').partition('>>')
+                events.append((name, data))
+
+        for name, _ in events:
+            for command, event_prefixes in INVALIDATING_EVENTS.items():
+                if name.startswith(event_prefixes):
+                    self._cache.pop(command, None)
+
+        return events
+
+
+    def wait_for_event(self, event_name: str, timeout: float) -> bool:
+
+        # Blocks until the given event arrives or the timeout passes, for use outside of an event loop
+
+        if not self._event_socket:
+            return False
+
+        deadline = monotonic() + timeout
+
+        while (remaining := deadline - monotonic()) > 0:
+            readable, _, _ = select.select([self._event_socket], [], [], remaining)
+
+            if readable and any(name == event_name for name, _ in self.read_events()):
+                return True
+
+            if not self._event_socket:
+                return False
+
+        return False
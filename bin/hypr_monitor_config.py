@@ -1,9 +1,16 @@
+import os
 import re
 import sys
 
 from re import Pattern
 from pathlib import Path
 
+from hypr_drm_poller import (
+    MAX_POLL_INTERVAL_SECONDS,
+    POLL_INTERVAL_SECONDS,
+    DrmStatusPoller
+    )
+
 WAYBAR_OUTPUT_START = '    "output": ["'
 WAYBAR_OUTPUT_END = '", ],\n'
 
@@ -12,10 +19,11 @@ REFRESH_RATE_REGEX = re.compile('^[0-9]{2,3}$')
 POSITION_COORDINATE_REGEX = re.compile('^[0-9]{1,4}x0$')
 SCALING_REGEX = re.compile('^[0-9]$')
 
-DRM_DIR = '/sys/class/drm'
-STATUS_FILE = 'status'
+# HYPR_SYSFS_DIR lets the helpers run against a fake sysfs tree, see bin/hypr_idle_audit.py
+
+SYSFS_DIR = os.getenv('HYPR_SYSFS_DIR', '/sys')
+DRM_DIR = f'{SYSFS_DIR}/class/drm'
 MONITOR_DIR_REGEX = re.compile(f'^{DRM_DIR}/card[0-9]-\\S+$')
-CONNECTED_STATUS = 'connected'
 
 
 class HyprMonitor(object):
@@ -137,18 +145,22 @@ class HyprMonitorConfig(object):
     _secondary_monitor_right: bool
     _monitor_names: list[str]
     _monitors: list[HyprMonitor]
-    _waybar_position: str
+    _waybar_output: str
     _builtin_monitor_dir_regex: Pattern[str] | None
     _left_monitor_dir_regex: Pattern[str] | None
     _center_monitor_dir_regex: Pattern[str] | None
     _right_monitor_dir_regex: Pattern[str] | None
     _drm_path: Path
     _monitor_dirs: list[str]
+    _monitor_dir_monitors: dict[str, HyprMonitor]
+    _status_poller: DrmStatusPoller
+    _polled_connector_states: dict[str, bool]
 
 
     def __init__(self, left_monitor: HyprMonitor = None, center_monitor: HyprMonitor = None,
                  right_monitor: HyprMonitor = None, builtin_monitor: HyprMonitor = None,
-                 secondary_monitor: str = 'l', when_external_connected_disable_builtin: bool = False):
+                 secondary_monitor: str = 'l', when_external_connected_disable_builtin: bool = False,
+                 poll_interval: float = POLL_INTERVAL_SECONDS, max_poll_interval: float = MAX_POLL_INTERVAL_SECONDS):
         self._left_monitor = left_monitor
         self._center_monitor = center_monitor
         self._right_monitor = right_monitor
@@ -186,6 +198,20 @@ class HyprMonitorConfig(object):
                 if dir_name.is_dir() and MONITOR_DIR_REGEX.match(str(dir_name))
             ]
 
+        # Match connectors to monitors once, and only ever read the status of those that are configured
+
+        self._monitor_dir_monitors = {}
+
+        for monitor_dir in self._monitor_dirs:
+            monitor = self._monitor_for_dir(monitor_dir)
+
+            if monitor:
+                self._monitor_dir_monitors[monitor_dir] = monitor
+
+        self._status_poller = DrmStatusPoller(list(self._monitor_dir_monitors.keys()), poll_interval,
+                                              max_poll_interval)
+        self._polled_connector_states = {}
+
 
     @property
     def left_monitor(self):
@@ -232,9 +258,62 @@ class HyprMonitorConfig(object):
         return self._monitors
 
 
+    @property
+    def status_poller(self):
+        return self._status_poller
+
+
+    @property
+    def connector_states(self):
+
+        # Whether each configured connector was connected as of the last hot swap, by its directory name
+        # under /sys/class/drm, e.g. card1-DP-1
+
+        return {os.path.basename(monitor_dir): monitor.connected
+                for monitor_dir, monitor in self._monitor_dir_monitors.items()}
+
+
+    @property
+    def polled_connector_states(self):
+
+        # The connector states as read by the last any_monitor_connection_changes, i.e. what a change
+        # was detected from, keyed like connector_states
+
+        return self._polled_connector_states
+
+
+    @property
+    def waybar_output(self):
+        return self._waybar_output
+
+
     @property
     def waybar_position(self):
-        return self._waybar_position
+        return f'{WAYBAR_OUTPUT_START}{self._waybar_output}{WAYBAR_OUTPUT_END}'
+
+
+    @property
+    def enabled_monitor_names(self):
+        return [monitor.monitor_name for monitor in self._monitors if monitor.connected and not monitor.disabled]
+
+
+    @property
+    def connection_state(self):
+        return '+'.join(monitor.monitor_name for monitor in self._monitors if monitor.connected) or 'none'
+
+
+    @property
+    def layout_plan(self):
+
+        # Everything the rewritten configs depend on besides the configs themselves, i.e. the monitor
+        # lines, which monitors are connected, the secondary monitor side and the Waybar monitor
+
+        return ''.join([
+                *(repr(monitor) for monitor in self._monitors),
+                f'{self.connection_state}\n',
+                f'{"l" if self._secondary_monitor_left else "r"}\n',
+                f'{self._waybar_output}\n'
+            ])
 
 
     def three_monitors_connected(self):
@@ -420,60 +499,51 @@ class HyprMonitorConfig(object):
                                         workspace_config_line)
 
 
-    def any_monitor_connection_changes(self) -> bool:
-        monitor_connection_changes = False
+    def _monitor_for_dir(self, monitor_dir: str) -> HyprMonitor | None:
 
-        for monitor_dir in self._monitor_dirs:
+        # NOTE: Often, the name assigned to the laptop's builtin monitor will be a superset of one
+        #       or more of the names assigned to external monitors, so checking it first here to
+        #       avoid a false match.
 
-            with (open(f'{monitor_dir}/{STATUS_FILE}', 'r') as file):
-                monitor_status = file.read().strip()
+        if self._builtin_monitor_dir_regex and self._builtin_monitor_dir_regex.match(monitor_dir):
+            return self._builtin_monitor
+        elif self._left_monitor_dir_regex and self._left_monitor_dir_regex.match(monitor_dir):
+            return self._left_monitor
+        elif self._center_monitor_dir_regex and self._center_monitor_dir_regex.match(monitor_dir):
+            return self._center_monitor
+        elif self._right_monitor_dir_regex and self._right_monitor_dir_regex.match(monitor_dir):
+            return self._right_monitor
 
-                # NOTE: Often, the name assigned to the laptop's builtin monitor will be a superset of one
-                #       or more of the names assigned to external monitors, so checking it first here to
-                #       avoid a false match.
+        return None
 
-                if self._builtin_monitor_dir_regex and self._builtin_monitor_dir_regex.match(monitor_dir):
-                    monitor_connection_changes = \
-                        self._builtin_monitor.connected and monitor_status != CONNECTED_STATUS \
-                        or not self._builtin_monitor.connected and monitor_status == CONNECTED_STATUS
-                elif self._left_monitor_dir_regex and self._left_monitor_dir_regex.match(monitor_dir):
-                    monitor_connection_changes = \
-                        self._left_monitor.connected and monitor_status != CONNECTED_STATUS \
-                        or not self._left_monitor.connected and monitor_status == CONNECTED_STATUS
-                elif self._center_monitor_dir_regex and self._center_monitor_dir_regex.match(monitor_dir):
-                    monitor_connection_changes = \
-                        self._center_monitor.connected and monitor_status != CONNECTED_STATUS \
-                        or not self._center_monitor.connected and monitor_status == CONNECTED_STATUS
-                elif self._right_monitor_dir_regex and self._right_monitor_dir_regex.match(monitor_dir):
-                    monitor_connection_changes = \
-                        self._right_monitor.connected and monitor_status != CONNECTED_STATUS \
-                        or not self._right_monitor.connected and monitor_status == CONNECTED_STATUS
 
-            if monitor_connection_changes:
-                break
+    def any_monitor_connection_changes(self) -> bool:
 
-        return monitor_connection_changes
+        # One pread per configured connector, see bin/hypr_drm_poller.py. All of them are read, so the
+        # states a change was detected from are known, see polled_connector_states.
 
+        self._polled_connector_states = self.read_connector_states()
 
-    def set_connected_monitor_configs(self) -> list[str]:
+        return any(monitor.connected != self._polled_connector_states[os.path.basename(monitor_dir)]
+                   for monitor_dir, monitor in self._monitor_dir_monitors.items())
 
-        for monitor_dir in self._monitor_dirs:
 
-            with open(f'{monitor_dir}/{STATUS_FILE}', 'r') as file:
-                monitor_status = file.read().strip()
+    def read_connector_states(self) -> dict[str, bool]:
+        return {os.path.basename(monitor_dir): connected
+                for monitor_dir, connected in self._status_poller.read_all_connected().items()}
+
 
-                # NOTE: Often, the name assigned to the laptop's builtin monitor will be a superset of one
-                #       or more of the names assigned to external monitors, so checking it first here to
-                #       avoid a false match.
+    def set_connected_monitor_configs(self, connected_monitor_names: list[str] = None) -> list[str]:
 
-                if self._builtin_monitor_dir_regex and self._builtin_monitor_dir_regex.match(monitor_dir):
-                    self._builtin_monitor.connected = monitor_status == CONNECTED_STATUS
-                elif self._left_monitor_dir_regex and self._left_monitor_dir_regex.match(monitor_dir):
-                    self._left_monitor.connected = monitor_status == CONNECTED_STATUS
-                elif self._center_monitor_dir_regex and self._center_monitor_dir_regex.match(monitor_dir):
-                    self._center_monitor.connected = monitor_status == CONNECTED_STATUS
-                elif self._right_monitor_dir_regex and self._right_monitor_dir_regex.match(monitor_dir):
-                    self._right_monitor.connected = monitor_status == CONNECTED_STATUS
+        # The connected monitors are read from sysfs, unless given, e.g. to render the configs for
+        # every connection state ahead of time, see bin/hypr_prerendered_configs.py
+
+        if connected_monitor_names is None:
+            for monitor_dir, connected in self._status_poller.read_all_connected().items():
+                self._monitor_dir_monitors[monitor_dir].connected = connected
+        else:
+            for monitor in self._monitors:
+                monitor.connected = monitor.monitor_name in connected_monitor_names
 
         if self._when_external_connected_disable_builtin and self.any_external_monitors_connected():
             self._builtin_monitor.disabled = True
@@ -488,45 +558,45 @@ class HyprMonitorConfig(object):
     def set_monitor_position_coordinates(self):
 
         # Alter monitors' start position coordinates with respect to which monitors are actually
-        # connected, and set up config file line for specifying which monitor the Waybar should display on.
+        # connected, and set which monitor the Waybar should display on.
 
         if self.three_monitors_connected():
-            self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._center_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+            self._waybar_output = self._center_monitor.monitor_name
         elif self.only_center_and_right_monitors_connected():
             self._builtin_monitor.position_coordinate = self._right_monitor.position_coordinate
             self._right_monitor.position_coordinate = self._center_monitor.position_coordinate
             self._center_monitor.position_coordinate = self._left_monitor.position_coordinate
 
             if self._secondary_monitor_left:
-                self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._right_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+                self._waybar_output = self._right_monitor.monitor_name
             else:
-                self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._center_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+                self._waybar_output = self._center_monitor.monitor_name
         elif self.only_left_and_right_monitors_connected():
             self._builtin_monitor.position_coordinate = self._right_monitor.position_coordinate
             self._right_monitor.position_coordinate = self._center_monitor.position_coordinate
 
             if self._secondary_monitor_left:
-                self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._right_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+                self._waybar_output = self._right_monitor.monitor_name
             else:
-                self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._left_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+                self._waybar_output = self._left_monitor.monitor_name
         elif self.only_left_and_center_monitors_connected():
             self._builtin_monitor.position_coordinate = self._right_monitor.position_coordinate
 
             if self._secondary_monitor_left:
-                self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._center_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+                self._waybar_output = self._center_monitor.monitor_name
             else:
-                self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._left_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+                self._waybar_output = self._left_monitor.monitor_name
         elif self.only_left_monitor_connected():
             self._builtin_monitor.position_coordinate = self._center_monitor.position_coordinate
-            self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._left_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+            self._waybar_output = self._left_monitor.monitor_name
         elif self.only_center_monitor_connected():
             self._builtin_monitor.position_coordinate = self._center_monitor.position_coordinate
             self._center_monitor.position_coordinate = self._left_monitor.position_coordinate
-            self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._center_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+            self._waybar_output = self._center_monitor.monitor_name
         elif self.only_right_monitor_connected():
             self._builtin_monitor.position_coordinate = self._center_monitor.position_coordinate
             self._right_monitor.position_coordinate = self._left_monitor.position_coordinate
-            self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._right_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+            self._waybar_output = self._right_monitor.monitor_name
         elif self.no_external_monitors_connected():
             self._builtin_monitor.position_coordinate = self._left_monitor.position_coordinate
-            self._waybar_position = f'{WAYBAR_OUTPUT_START}{self._builtin_monitor.monitor_name}{WAYBAR_OUTPUT_END}'
+            self._waybar_output = self._builtin_monitor.monitor_name
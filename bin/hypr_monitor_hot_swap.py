@@ -4,8 +4,17 @@
 
 # NOTE:
 #
-# bin/run_waybar.sh must be running for the Waybar to move to the correct monitor based on the config
-# change made in a hot swap, i.e. instead of "exec-once = waybar", use "exec-once = ~/bin/run_waybar.sh"
+# The session runs bin/hypr_session_supervisor.py (started by bin/run_hypr_env_scripts), which does the
+# same hot swapping driven by uevents rather than polling, and restarts Waybar itself when its config
+# changes. This script is still handy on its own, but then it only writes the configs, so Waybar only
+# moves to the correct monitor if something else restarts it, e.g. bin/run_waybar.sh.
+#
+# On its own, it keeps Hyprland's event socket open for as long as it runs and drains it on every poll,
+# so the answers bin/hypr_ipc.py caches stay valid between hot swaps.
+#
+# After each hot swap, both check through Hyprland's socket (bin/hypr_ipc.py) that the monitors Hyprland
+# reports match the layout that was written, and only if they do not, have Hyprland reload the config,
+# up to MAX_REAPPLY_ATTEMPTS times.
 
 # Note:
 #
@@ -18,49 +27,45 @@
 # an external monitor.
 
 import argparse
-import os
-import subprocess
+import sys
 
-from time import sleep
-from signal import SIGKILL
+from time import monotonic
 
 import set_hypr_monitor_config
 
+from hypr_config_writer import ConfigEdit
+from hypr_drm_poller import add_poll_arguments
+from hypr_hotplug_trace import (
+    HotplugTraceRecorder,
+    add_record_trace_argument
+)
+from hypr_power_supply import POWER_SUPPLY_SUBSYSTEM
+from hypr_uevent import UeventListener
+
+from hypr_ipc import (
+    CONFIG_RELOADED_EVENT,
+    HyprlandIpc,
+    HyprlandIpcError
+)
+
+from hypr_power_profile import (
+    POWER_PROFILE_CHECK_INTERVAL_SECONDS,
+    add_power_profile_arguments,
+    build_power_profile_watcher
+)
+
 from hypr_monitor_config import (
     HyprMonitor,
     HyprMonitorConfig
 )
 
-PIDOF_COMMAND = 'pidof'
-WAYBAR_PROCESS_NAME = 'waybar'
-WAYBAR_COMMAND = 'waybar'
-MONITOR_CHECK_INTERVAL_SECONDS = 2
+# How long Hyprland gets to reload the config after a write, and how many times it is asked to reload
+# again when the live layout does not match
 
-if __name__ == "__main__":
-    arg_parser = argparse.ArgumentParser(
-        description='''
-    Edits the Hyprland configuration file to set up a monitor configuration based on what monitors are
-    connected.
-    
-    Note: This script is intended for use with up to 3 monitors placed side-by-side, or up to 3 
-    side-by-side external monitors and a builtin laptop monitor. 
-    ''',
-        epilog='Hyprland monitor configuration',
-        argument_default=None,
-        usage='''
-    [-h]
-    [--left-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
-    [--center-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
-    [--right-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
-    [--builtin-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
-    [--dry-run]
-    [--verbose]
-    --secondary-monitor <l|r>
-    
-    For help with these values, see https://wiki.hyprland.org/configuring/monitors/
-    '''
-        )
+HYPRLAND_APPLY_TIMEOUT_SECONDS = 2
+MAX_REAPPLY_ATTEMPTS = 2
 
+def add_monitor_arguments(arg_parser: argparse.ArgumentParser):
     arg_parser.add_argument(
         '--left-monitor',
         '-l',
@@ -104,6 +109,212 @@ if __name__ == "__main__":
         action='store_true'
         )
 
+
+def validate_monitor_arguments(cli_args: argparse.Namespace) -> bool:
+    for config in [cli_args.left_monitor, cli_args.center_monitor, cli_args.right_monitor,
+                   cli_args.builtin_monitor]:
+        if config and not HyprMonitorConfig.validate_monitor_config_args(config):
+            return False
+
+    return True
+
+
+def monitor_arguments(cli_args: argparse.Namespace) -> list[str]:
+
+    # The monitor arguments back in command line form, e.g. for a hotplug trace to be replayed with
+
+    arguments = []
+
+    for option, monitor_config in [('--left-monitor', cli_args.left_monitor),
+                                   ('--center-monitor', cli_args.center_monitor),
+                                   ('--right-monitor', cli_args.right_monitor),
+                                   ('--builtin-monitor', cli_args.builtin_monitor)]:
+        if monitor_config:
+            arguments.extend([option, *monitor_config])
+
+    arguments.extend(['--secondary-monitor', cli_args.secondary_monitor])
+
+    if cli_args.when_external_connected_disable_builtin:
+        arguments.append('--when-external-connected-disable-builtin')
+
+    return arguments
+
+
+def build_hypr_monitor_config(cli_args: argparse.Namespace) -> HyprMonitorConfig:
+    return HyprMonitorConfig(
+            HyprMonitor(*cli_args.left_monitor) if cli_args.left_monitor else None,
+            HyprMonitor(*cli_args.center_monitor) if cli_args.center_monitor else None,
+            HyprMonitor(*cli_args.right_monitor) if cli_args.right_monitor else None,
+            HyprMonitor(*cli_args.builtin_monitor) if cli_args.builtin_monitor else None,
+            cli_args.secondary_monitor,
+            cli_args.when_external_connected_disable_builtin,
+            cli_args.poll_interval,
+            cli_args.max_poll_interval
+        )
+
+
+def hot_swap(hypr_monitor_config: HyprMonitorConfig, cli_args: argparse.Namespace,
+             config_edits: list[ConfigEdit] = None) -> bool:
+
+    # The position coordinates are shifted around based on which monitors were connected last time,
+    # so start again from the ones given on the command line
+
+    if cli_args.left_monitor:
+        hypr_monitor_config.left_monitor.position_coordinate = cli_args.left_monitor[3]
+
+    if cli_args.center_monitor:
+        hypr_monitor_config.center_monitor.position_coordinate = cli_args.center_monitor[3]
+
+    if cli_args.right_monitor:
+        hypr_monitor_config.right_monitor.position_coordinate = cli_args.right_monitor[3]
+
+    if cli_args.builtin_monitor:
+        hypr_monitor_config.builtin_monitor.position_coordinate = cli_args.builtin_monitor[3]
+
+    return set_hypr_monitor_config.run(secondary_monitor=cli_args.secondary_monitor,
+                                       dry_run=cli_args.dry_run,
+                                       verbose=cli_args.verbose,
+                                       hypr_monitor_config=hypr_monitor_config,
+                                       config_edits=config_edits)
+
+
+def live_monitor_mismatches(hypr_monitor_config: HyprMonitorConfig, live_monitors: list[dict]) -> list[str]:
+
+    # How what Hyprland reports (j/monitors all) differs from the layout that was just written
+
+    live_monitors_by_name = {live_monitor['name']: live_monitor for live_monitor in live_monitors}
+    mismatches = []
+
+    for monitor in hypr_monitor_config.monitors:
+        live_monitor = live_monitors_by_name.get(monitor.monitor_name)
+
+        if not monitor.connected:
+            continue
+
+        if monitor.disabled:
+            if live_monitor and not live_monitor.get('disabled'):
+                mismatches.append(f'{monitor.monitor_name} is enabled, but should be disabled')
+
+            continue
+
+        if not live_monitor or live_monitor.get('disabled'):
+            mismatches.append(f'{monitor.monitor_name} is not enabled')
+            continue
+
+        live_resolution = f'{live_monitor["width"]}x{live_monitor["height"]}'
+        live_position = f'{live_monitor["x"]}x{live_monitor["y"]}'
+
+        if live_resolution != monitor.resolution:
+            mismatches.append(f'{monitor.monitor_name} is at {live_resolution}, not {monitor.resolution}')
+
+        if live_position != monitor.position_coordinate:
+            mismatches.append(f'{monitor.monitor_name} is positioned at {live_position}, '
+                              + f'not {monitor.position_coordinate}')
+
+        if abs(float(live_monitor['refreshRate']) - float(monitor.refresh_rate)) >= 1:
+            mismatches.append(f'{monitor.monitor_name} refreshes at {live_monitor["refreshRate"]:.2f}Hz, '
+                              + f'not {monitor.refresh_rate}Hz')
+
+        if abs(float(live_monitor['scale']) - float(monitor.scaling)) > 0.01:
+            mismatches.append(f'{monitor.monitor_name} is scaled by {live_monitor["scale"]}, not {monitor.scaling}')
+
+    return mismatches
+
+
+def hot_swap_and_verify(hypr_monitor_config: HyprMonitorConfig, cli_args: argparse.Namespace,
+                        hyprland_ipc: HyprlandIpc, config_edits: list[ConfigEdit] = None) -> tuple[bool, bool | None]:
+
+    # Hot swaps, then asks Hyprland (through its socket, see bin/hypr_ipc.py) whether it applied the
+    # new layout, and only if it did not, has it reload the config again. Returns whether a config was
+    # written and whether the live layout matches, or None if there is no Hyprland to ask.
+
+    if cli_args.dry_run or not hyprland_ipc.available:
+        return hot_swap(hypr_monitor_config, cli_args, config_edits), None
+
+    # Listen before writing, so the configreloaded event for this write is not missed. Unless the
+    # caller keeps the event socket drained, it is closed again afterwards, so events do not pile up on
+    # it between hot swaps.
+
+    events_were_connected = hyprland_ipc.events_connected
+    hyprland_ipc.connect_events()
+    hyprland_ipc.read_events()
+
+    try:
+        config_written = hot_swap(hypr_monitor_config, cli_args, config_edits)
+
+        if config_written:
+            hyprland_ipc.wait_for_event(CONFIG_RELOADED_EVENT, HYPRLAND_APPLY_TIMEOUT_SECONDS)
+
+        for attempt in range(MAX_REAPPLY_ATTEMPTS + 1):
+            try:
+                mismatches = live_monitor_mismatches(hypr_monitor_config, hyprland_ipc.monitors())
+            except (HyprlandIpcError, ValueError, KeyError) as error:
+                print(f'Could not check the monitor layout Hyprland applied: {error}', file=sys.stderr, flush=True)
+
+                return config_written, False
+
+            if not mismatches:
+                if cli_args.verbose:
+                    print('Hyprland applied the monitor layout', flush=True)
+
+                return config_written, True
+
+            print(f'Hyprland did not apply the monitor layout: {"; ".join(mismatches)}', file=sys.stderr, flush=True)
+
+            if attempt < MAX_REAPPLY_ATTEMPTS:
+                try:
+                    hyprland_ipc.reload()
+                except HyprlandIpcError as error:
+                    print(f'Could not reload the Hyprland config: {error}', file=sys.stderr, flush=True)
+
+                    return config_written, False
+
+                hyprland_ipc.wait_for_event(CONFIG_RELOADED_EVENT, HYPRLAND_APPLY_TIMEOUT_SECONDS)
+
+        return config_written, False
+    finally:
+        if not events_were_connected:
+            hyprland_ipc.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Edits the Hyprland configuration file to set up a monitor configuration based on what monitors are
+    connected.
+    
+    Note: This script is intended for use with up to 3 monitors placed side-by-side, or up to 3 
+    side-by-side external monitors and a builtin laptop monitor. 
+    ''',
+        epilog='Hyprland monitor configuration',
+        argument_default=None,
+        usage='''
+    [-h]
+    [--left-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--center-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--right-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--builtin-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--dry-run]
+    [--verbose]
+    --secondary-monitor <l|r>
+    [--when-external-connected-disable-builtin]
+    [--battery-interval-scale <scale>]
+    [--battery-transition <transition type>]
+    [--low-battery-level <percent>]
+    [--low-battery-interval-scale <scale>]
+    [--low-battery-transition <transition type>]
+    [--poll-interval <seconds>]
+    [--max-poll-interval <seconds>]
+    [--record-trace <file>]
+    
+    For help with these values, see https://wiki.hyprland.org/configuring/monitors/
+    '''
+        )
+
+    add_monitor_arguments(arg_parser)
+    add_power_profile_arguments(arg_parser)
+    add_poll_arguments(arg_parser)
+
     arg_parser.add_argument(
             '--verbose',
             '-v',
@@ -118,74 +329,66 @@ if __name__ == "__main__":
             action='store_true'
             )
 
+    add_record_trace_argument(arg_parser)
+
     cli_args = arg_parser.parse_args()
 
-    LEFT_MONITOR_CONFIGS = cli_args.left_monitor
-    CENTER_MONITOR_CONFIGS = cli_args.center_monitor
-    RIGHT_MONITOR_CONFIGS = cli_args.right_monitor
-    BUILTIN_MONITOR_CONFIGS = cli_args.builtin_monitor
+    if not validate_monitor_arguments(cli_args):
+        exit(1)
 
-    for config in [cli_args.left_monitor, cli_args.center_monitor, cli_args.right_monitor,
-                   cli_args.builtin_monitor]:
-        if config and not HyprMonitorConfig.validate_monitor_config_args(config):
-            exit(1)
-
-    hypr_monitor_config = HyprMonitorConfig(
-            HyprMonitor(
-                    LEFT_MONITOR_CONFIGS[0],
-                    LEFT_MONITOR_CONFIGS[1],
-                    LEFT_MONITOR_CONFIGS[2],
-                    LEFT_MONITOR_CONFIGS[3],
-                    LEFT_MONITOR_CONFIGS[4]
-                ) if LEFT_MONITOR_CONFIGS else None,
-            HyprMonitor(
-                    CENTER_MONITOR_CONFIGS[0],
-                    CENTER_MONITOR_CONFIGS[1],
-                    CENTER_MONITOR_CONFIGS[2],
-                    CENTER_MONITOR_CONFIGS[3],
-                    CENTER_MONITOR_CONFIGS[4]
-                ) if CENTER_MONITOR_CONFIGS else None,
-            HyprMonitor(
-                    RIGHT_MONITOR_CONFIGS[0],
-                    RIGHT_MONITOR_CONFIGS[1],
-                    RIGHT_MONITOR_CONFIGS[2],
-                    RIGHT_MONITOR_CONFIGS[3],
-                    RIGHT_MONITOR_CONFIGS[4]
-                ) if RIGHT_MONITOR_CONFIGS else None,
-            HyprMonitor(
-                    BUILTIN_MONITOR_CONFIGS[0],
-                    BUILTIN_MONITOR_CONFIGS[1],
-                    BUILTIN_MONITOR_CONFIGS[2],
-                    BUILTIN_MONITOR_CONFIGS[3],
-                    BUILTIN_MONITOR_CONFIGS[4]
-                ) if BUILTIN_MONITOR_CONFIGS else None,
-            cli_args.secondary_monitor,
-            cli_args.when_external_connected_disable_builtin
-        )
+    hypr_monitor_config = build_hypr_monitor_config(cli_args)
+    hotplug_trace = HotplugTraceRecorder(cli_args.record_trace, monitor_arguments(cli_args)) \
+        if cli_args.record_trace else None
+
+    if hotplug_trace:
+        hotplug_trace.record_connectors(hypr_monitor_config.read_connector_states())
+
+    config_written = set_hypr_monitor_config.run(secondary_monitor=cli_args.secondary_monitor,
+                                                 dry_run=cli_args.dry_run,
+                                                 verbose=cli_args.verbose,
+                                                 hypr_monitor_config=hypr_monitor_config)
+
+    if hotplug_trace:
+        hotplug_trace.record_applied(hypr_monitor_config.connection_state, hypr_monitor_config.connector_states,
+                                     config_written, None)
 
-    set_hypr_monitor_config.run(secondary_monitor=cli_args.secondary_monitor,
-                                dry_run=cli_args.dry_run,
-                                verbose=cli_args.verbose,
-                                hypr_monitor_config=hypr_monitor_config)
+    set_hypr_monitor_config.compile_stale_prerendered_configs()
+
+    # Poll less often when on battery, see bin/hypr_power_profile.py. Plugging in or unplugging the
+    # charger sends a power_supply uevent, which is when the profile is re-checked. The poll interval
+    # itself backs off while the monitor connections do not change, see bin/hypr_drm_poller.py
+
+    power_profile_watcher = build_power_profile_watcher(cli_args)
+    power_supply_listener = UeventListener({POWER_SUPPLY_SUBSYSTEM})
+    power_profile_checked_at = monotonic()
+    status_poller = hypr_monitor_config.status_poller
+    hyprland_ipc = HyprlandIpc()
 
     while True:
-        sleep(MONITOR_CHECK_INTERVAL_SECONDS)
+        power_supply_uevents = power_supply_listener.wait(
+                status_poller.scaled_poll_interval(power_profile_watcher.current_profile.interval_scale))
+
+        if power_supply_uevents or monotonic() - power_profile_checked_at > POWER_PROFILE_CHECK_INTERVAL_SECONDS:
+            power_profile_watcher.update()
+            power_profile_checked_at = monotonic()
+
+        monitor_connection_changes = hypr_monitor_config.any_monitor_connection_changes()
+        status_poller.backoff(monitor_connection_changes)
 
-        if hypr_monitor_config.any_monitor_connection_changes():
+        # Reconnects if Hyprland was not up yet or restarted, and drops the cached answers that the events
+        # since the last poll made stale
 
-            if LEFT_MONITOR_CONFIGS:
-                hypr_monitor_config.left_monitor.position_coordinate = LEFT_MONITOR_CONFIGS[3]
+        hyprland_ipc.connect_events()
+        hyprland_ipc.read_events()
 
-            if CENTER_MONITOR_CONFIGS:
-                hypr_monitor_config.center_monitor.position_coordinate = CENTER_MONITOR_CONFIGS[3]
+        if monitor_connection_changes:
+            if hotplug_trace:
+                hotplug_trace.record_connectors(hypr_monitor_config.polled_connector_states)
 
-            if RIGHT_MONITOR_CONFIGS:
-                hypr_monitor_config.right_monitor.position_coordinate = RIGHT_MONITOR_CONFIGS[3]
+            config_written, layout_applied = hot_swap_and_verify(hypr_monitor_config, cli_args, hyprland_ipc)
 
-            if BUILTIN_MONITOR_CONFIGS:
-                hypr_monitor_config.builtin_monitor.position_coordinate = BUILTIN_MONITOR_CONFIGS[3]
+            if hotplug_trace:
+                hotplug_trace.record_applied(hypr_monitor_config.connection_state,
+                                             hypr_monitor_config.connector_states, config_written, layout_applied)
 
-            set_hypr_monitor_config.run(secondary_monitor=cli_args.secondary_monitor,
-                                        dry_run=cli_args.dry_run,
-                                        verbose=cli_args.verbose,
-                                        hypr_monitor_config=hypr_monitor_config)
+            set_hypr_monitor_config.compile_stale_prerendered_configs()
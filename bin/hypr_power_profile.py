@@ -0,0 +1,180 @@
+import argparse
+
+from hypr_background_rotator import TRANSITION_TYPES
+
+from hypr_power_supply import (
+    POWER_SUPPLY_DIR,
+    find_ac_adapters,
+    find_batteries,
+    read_ac_online,
+    read_battery_status
+)
+
+# Which cadence the background helpers run at, based on the power source:
+#
+#       ac          -> full cadence, all transition types
+#       battery     -> intervals stretched by --battery-interval-scale, --battery-transition only
+#       low-battery -> at or below --low-battery-level percent, intervals stretched by
+#                      --low-battery-interval-scale, --low-battery-transition only
+#
+# A transition of "none" makes swww switch the image without animating at all.
+
+AC_PROFILE = 'ac'
+BATTERY_PROFILE = 'battery'
+LOW_BATTERY_PROFILE = 'low-battery'
+
+NO_TRANSITION = 'none'
+
+BATTERY_INTERVAL_SCALE = 5
+BATTERY_TRANSITION = 'simple'
+LOW_BATTERY_LEVEL = 30
+LOW_BATTERY_INTERVAL_SCALE = 15
+LOW_BATTERY_TRANSITION = NO_TRANSITION
+
+# How often to re-check the power source when no power_supply uevent has said it changed, mostly so
+# crossing --low-battery-level is noticed on batteries that do not send uevents as they drain
+
+POWER_PROFILE_CHECK_INTERVAL_SECONDS = 60
+
+
+class PowerProfile(object):
+
+    _name: str
+    _interval_scale: float
+    _transition_types: list[str] | None
+
+
+    def __init__(self, name: str, interval_scale: float = 1, transition_types: list[str] = None):
+        self._name = name
+        self._interval_scale = interval_scale
+        self._transition_types = transition_types
+
+
+    def __repr__(self):
+        return (f'{self._name} (intervals x{self._interval_scale:g}, transitions '
+                + f'{self._transition_types if self._transition_types else "all"})')
+
+
+    @property
+    def name(self):
+        return self._name
+
+
+    @property
+    def interval_scale(self):
+        return self._interval_scale
+
+
+    @property
+    def transition_types(self):
+        return self._transition_types
+
+
+class PowerProfileWatcher(object):
+
+    _adapters: list[str]
+    _batteries: list[str]
+    _low_battery_level: int
+    _profiles: dict[str, PowerProfile]
+    _current_profile: PowerProfile
+
+
+    def __init__(self, power_supply_dir: str = POWER_SUPPLY_DIR,
+                 battery_interval_scale: float = BATTERY_INTERVAL_SCALE,
+                 battery_transition: str = BATTERY_TRANSITION,
+                 low_battery_level: int = LOW_BATTERY_LEVEL,
+                 low_battery_interval_scale: float = LOW_BATTERY_INTERVAL_SCALE,
+                 low_battery_transition: str = LOW_BATTERY_TRANSITION):
+        self._adapters = find_ac_adapters(power_supply_dir)
+        self._batteries = find_batteries(power_supply_dir)
+        self._low_battery_level = low_battery_level
+
+        self._profiles = {
+            AC_PROFILE: PowerProfile(AC_PROFILE),
+            BATTERY_PROFILE: PowerProfile(BATTERY_PROFILE, battery_interval_scale, [battery_transition]),
+            LOW_BATTERY_PROFILE: PowerProfile(LOW_BATTERY_PROFILE, low_battery_interval_scale,
+                                              [low_battery_transition])
+        }
+
+        self._current_profile = self._profiles[AC_PROFILE]
+        self.update()
+
+
+    @property
+    def current_profile(self):
+        return self._current_profile
+
+
+    @property
+    def profiles(self):
+        return self._profiles
+
+
+    def update(self) -> bool:
+
+        # Returns whether the profile changed, and prints the switch when it did
+
+        if read_ac_online(self._adapters, self._batteries):
+            profile = self._profiles[AC_PROFILE]
+        else:
+            battery_status = read_battery_status(self._batteries)
+
+            if battery_status and battery_status.capacity <= self._low_battery_level:
+                profile = self._profiles[LOW_BATTERY_PROFILE]
+            else:
+                profile = self._profiles[BATTERY_PROFILE]
+
+        if profile is self._current_profile:
+            return False
+
+        print(f'Power profile {self._current_profile.name} => {profile}', flush=True)
+
+        self._current_profile = profile
+
+        return True
+
+
+def add_power_profile_arguments(arg_parser: argparse.ArgumentParser):
+    arg_parser.add_argument(
+        '--battery-interval-scale',
+        help=f'Stretch background and polling intervals by this on battery, defaults to {BATTERY_INTERVAL_SCALE}',
+        type=float,
+        default=BATTERY_INTERVAL_SCALE
+        )
+
+    arg_parser.add_argument(
+        '--battery-transition',
+        help=f'Background transition type on battery, defaults to {BATTERY_TRANSITION}',
+        choices=[*TRANSITION_TYPES, NO_TRANSITION],
+        default=BATTERY_TRANSITION
+        )
+
+    arg_parser.add_argument(
+        '--low-battery-level',
+        help=f'Battery percentage at or below which the low battery profile is used, defaults to {LOW_BATTERY_LEVEL}',
+        type=int,
+        default=LOW_BATTERY_LEVEL
+        )
+
+    arg_parser.add_argument(
+        '--low-battery-interval-scale',
+        help='Stretch background and polling intervals by this on low battery, '
+             + f'defaults to {LOW_BATTERY_INTERVAL_SCALE}',
+        type=float,
+        default=LOW_BATTERY_INTERVAL_SCALE
+        )
+
+    arg_parser.add_argument(
+        '--low-battery-transition',
+        help=f'Background transition type on low battery, defaults to {LOW_BATTERY_TRANSITION}',
+        choices=[*TRANSITION_TYPES, NO_TRANSITION],
+        default=LOW_BATTERY_TRANSITION
+        )
+
+
+def build_power_profile_watcher(cli_args: argparse.Namespace) -> PowerProfileWatcher:
+    return PowerProfileWatcher(battery_interval_scale=cli_args.battery_interval_scale,
+                               battery_transition=cli_args.battery_transition,
+                               low_battery_level=cli_args.low_battery_level,
+                               low_battery_interval_scale=cli_args.low_battery_interval_scale,
+                               low_battery_transition=cli_args.low_battery_transition)
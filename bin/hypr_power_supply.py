@@ -0,0 +1,222 @@
+import os
+import re
+import sys
+
+from pathlib import Path
+
+# HYPR_SYSFS_DIR lets the helpers run against a fake sysfs tree, see bin/hypr_idle_audit.py
+
+SYSFS_DIR = os.getenv('HYPR_SYSFS_DIR', '/sys')
+POWER_SUPPLY_DIR = f'{SYSFS_DIR}/class/power_supply'
+POWER_SUPPLY_SUBSYSTEM = 'power_supply'
+UEVENT_FILE = 'uevent'
+BATTERY_DIR_REGEX = re.compile('^BAT\\S*$')
+ADAPTER_TYPES = {'Mains', 'USB'}
+
+UEVENT_PREFIX = 'POWER_SUPPLY_'
+CHARGING_STATUS = 'Charging'
+DISCHARGING_STATUS = 'Discharging'
+FULL_STATUS = 'Full'
+MICRO_UNITS = 1000000
+ENERGY_UNITS = 'energy'
+CHARGE_UNITS = 'charge'
+
+
+class BatteryStatus(object):
+
+    _status: str
+    _capacity: int
+    _energy_now: int
+    _energy_full: int
+    _power_now: int
+
+
+    def __init__(self, status: str, capacity: int, energy_now: int, energy_full: int, power_now: int):
+        self._status = status
+        self._capacity = capacity
+        self._energy_now = energy_now
+        self._energy_full = energy_full
+        self._power_now = power_now
+
+
+    def __repr__(self):
+        return (f'{self._status} {self._capacity}% '
+                + f'({self._energy_now}/{self._energy_full}, {self._power_now} drawn)')
+
+
+    @property
+    def status(self):
+        return self._status
+
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+
+    @property
+    def energy_now(self):
+        return self._energy_now
+
+
+    @property
+    def energy_full(self):
+        return self._energy_full
+
+
+    @property
+    def power_now(self):
+        return self._power_now
+
+
+    @property
+    def charging(self):
+        return self._status == CHARGING_STATUS
+
+
+    @property
+    def full(self):
+        return self._status == FULL_STATUS
+
+
+    @property
+    def discharging(self):
+        return self._status == DISCHARGING_STATUS
+
+
+def find_batteries(power_supply_dir: str = POWER_SUPPLY_DIR) -> list[str]:
+    power_supply_path = Path(power_supply_dir)
+
+    if not power_supply_path.is_dir():
+        return []
+
+    return sorted(str(supply_dir) for supply_dir in power_supply_path.iterdir()
+                  if BATTERY_DIR_REGEX.match(supply_dir.name))
+
+
+def find_ac_adapters(power_supply_dir: str = POWER_SUPPLY_DIR) -> list[str]:
+    power_supply_path = Path(power_supply_dir)
+    adapters = []
+
+    if not power_supply_path.is_dir():
+        return adapters
+
+    for supply_dir in [str(supply_dir) for supply_dir in power_supply_path.iterdir()]:
+        try:
+            if read_uevent_file(supply_dir).get('type') in ADAPTER_TYPES:
+                adapters.append(supply_dir)
+        except OSError:
+            continue
+
+    return sorted(adapters)
+
+
+def read_ac_online(adapters: list[str], batteries: list[str]) -> bool:
+
+    # Without any adapter to ask (e.g. a desktop, or a laptop whose charger does not show up as a
+    # power supply), go by whether the battery is discharging
+
+    if adapters:
+        for adapter in adapters:
+            try:
+                if read_uevent_file(adapter).get('online') == '1':
+                    return True
+            except OSError:
+                continue
+
+        return False
+
+    battery_status = read_battery_status(batteries)
+
+    return not battery_status or not battery_status.discharging
+
+
+def read_uevent_file(supply_dir: str) -> dict[str, str]:
+
+    # Every attribute of a power supply is also in its uevent file, so one read gets status,
+    # capacity, energy_now, power_now, etc. instead of opening each attribute file separately
+
+    with open(f'{supply_dir}/{UEVENT_FILE}', 'r') as file:
+        properties = {}
+
+        for line in file.read().splitlines():
+            key, separator, value = line.partition('=')
+
+            if separator and key.startswith(UEVENT_PREFIX):
+                properties[key[len(UEVENT_PREFIX):].lower()] = value
+
+        return properties
+
+
+def battery_energy(properties: dict[str, str]) -> tuple[str, int, int, int]:
+
+    # Some batteries only report charge (uAh) and current (uA) rather than energy (uWh) and power (uW).
+    # Those are converted with the battery's voltage (uV) where it reports one, so that batteries of
+    # both kinds can be added up. Returns the units, and the energy now, energy when full and power
+    # drawn in them.
+
+    voltage = int(properties.get('voltage_min_design', properties.get('voltage_now', 0)))
+    current_now = abs(int(properties.get('current_now', 0)))
+
+    if 'energy_now' in properties:
+        power_now = abs(int(properties['power_now'])) if 'power_now' in properties \
+            else current_now * voltage // MICRO_UNITS
+
+        return ENERGY_UNITS, int(properties['energy_now']), int(properties.get('energy_full', 0)), power_now
+
+    charge_now = int(properties.get('charge_now', 0))
+    charge_full = int(properties.get('charge_full', 0))
+
+    if not voltage:
+        return CHARGE_UNITS, charge_now, charge_full, current_now
+
+    return (ENERGY_UNITS, charge_now * voltage // MICRO_UNITS, charge_full * voltage // MICRO_UNITS,
+            current_now * voltage // MICRO_UNITS)
+
+
+def read_battery_status(batteries: list[str]) -> BatteryStatus | None:
+    statuses = []
+    capacity = None
+    readings = []
+
+    for battery in batteries:
+        try:
+            properties = read_uevent_file(battery)
+        except OSError:
+            continue
+
+        statuses.append(properties.get('status', ''))
+        readings.append((battery, *battery_energy(properties)))
+
+        if len(batteries) == 1 and 'capacity' in properties:
+            capacity = int(properties['capacity'])
+
+    if not statuses:
+        return None
+
+    # Charge without a voltage to convert it by cannot be added to energy, so when the batteries
+    # disagree, only the ones reporting energy are counted
+
+    if len({units for _, units, _, _, _ in readings}) > 1:
+        skipped = [battery for battery, units, _, _, _ in readings if units != ENERGY_UNITS]
+        print(f'Leaving {", ".join(skipped)} out of the battery level, it reports charge but no voltage',
+              file=sys.stderr, flush=True)
+        readings = [reading for reading in readings if reading[1] == ENERGY_UNITS]
+
+    energy_now = sum(reading[2] for reading in readings)
+    energy_full = sum(reading[3] for reading in readings)
+    power_now = sum(reading[4] for reading in readings)
+
+    if capacity is None:
+        capacity = round(100 * energy_now / energy_full) if energy_full else 0
+
+    if CHARGING_STATUS in statuses:
+        status = CHARGING_STATUS
+    elif DISCHARGING_STATUS in statuses:
+        status = DISCHARGING_STATUS
+    elif all(status == FULL_STATUS for status in statuses):
+        status = FULL_STATUS
+    else:
+        status = statuses[0]
+
+    return BatteryStatus(status, capacity, energy_now, energy_full, power_now)
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+
+from itertools import product
+
+from hypr_conf import (
+    TMP_SUFFIX,
+    write_config_file
+)
+from hypr_monitor_config import HyprMonitorConfig
+
+# Pre-rendered Hyprland and Waybar configs, one set per connection state and secondary monitor side,
+# compiled by bin/set_hypr_monitor_config.py --compile. With up to four monitors there are at most 16
+# connection states, and the configs for each are fully determined by the monitor arguments and the
+# configs themselves, so they can all be rendered ahead of time. A hot swap then only has to copy the
+# pre-rendered file for the new state next to the config and rename it over the config, without
+# parsing or rendering anything. The cache directory holds:
+#
+#       <sha256>      -> every distinct pre-rendered config once, named by its hash
+#       manifest.json -> the monitor arguments, the configs covered, and which pre-rendered file goes
+#                        where for each connection state and side
+#
+# The cache is only used while the monitor arguments are the ones it was compiled for and each config
+# it covers still holds one of its pre-rendered outputs, i.e. was not edited since (hot swaps only ever
+# put pre-rendered outputs in place). Otherwise the configs are rendered as before and the cache is
+# marked stale, to be compiled again once the hot swap is done, outside the config lock. A config newly sourced through a glob, without any covered config being
+# edited, is only picked up by compiling again.
+
+HOME_DIR = os.getenv('HOME')
+CACHE_DIR = os.getenv('XDG_CACHE_HOME', f'{HOME_DIR}/.cache')
+PRERENDERED_DIR = f'{CACHE_DIR}/hypr/prerendered'
+MANIFEST_FILE_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+MONITOR_SLOTS = ['left_monitor', 'center_monitor', 'right_monitor', 'builtin_monitor']
+DISABLE_BUILTIN_ARGUMENT = 'when_external_connected_disable_builtin'
+SECONDARY_MONITOR_SIDES = ['l', 'r']
+
+
+def monitor_arguments(hypr_monitor_config: HyprMonitorConfig) -> dict:
+
+    # The arguments the monitor config was built from. Only valid before the connected monitors are
+    # set, which moves the monitors' positions around.
+
+    arguments = {DISABLE_BUILTIN_ARGUMENT: hypr_monitor_config.when_external_connected_disable_builtin}
+
+    for slot in MONITOR_SLOTS:
+        monitor = getattr(hypr_monitor_config, slot)
+        arguments[slot] = [monitor.monitor_name, monitor.resolution, monitor.refresh_rate,
+                           monitor.position_coordinate, monitor.scaling] if monitor else None
+
+    return arguments
+
+
+def connection_states(monitor_names: list[str]) -> list[list[str]]:
+
+    # Every combination of connected monitors, from none to all
+
+    return [[monitor_name for monitor_name, connected in zip(monitor_names, combination) if connected]
+            for combination in product([False, True], repeat=len(monitor_names))]
+
+
+def artifact_key(connection_state: str, secondary_monitor: str) -> str:
+    return f'{connection_state}/{secondary_monitor}'
+
+
+class PrerenderedConfigs(object):
+
+    _cache_dir: str
+    _manifest_path: str
+    _manifest: dict | None
+    _manifest_stat: tuple[int, int] | None
+    _config_hashes: dict[str, set[str]]
+    _stale_arguments: dict | None
+
+
+    def __init__(self, cache_dir: str = PRERENDERED_DIR):
+        self._cache_dir = cache_dir
+        self._manifest_path = f'{cache_dir}/{MANIFEST_FILE_NAME}'
+        self._manifest = None
+        self._manifest_stat = None
+        self._config_hashes = {}
+        self._stale_arguments = None
+
+
+    @property
+    def compiled(self):
+        return self._load_manifest() is not None
+
+
+    def mark_stale(self, arguments: dict):
+        self._stale_arguments = arguments
+
+
+    def take_stale_arguments(self) -> dict | None:
+
+        # The arguments to compile again for, if the cache was found stale since the last call
+
+        stale_arguments = self._stale_arguments
+        self._stale_arguments = None
+
+        return stale_arguments
+
+
+    @staticmethod
+    def hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+
+    def artifact_path(self, artifact_hash: str) -> str:
+        return f'{self._cache_dir}/{artifact_hash}'
+
+
+    def is_current(self, arguments: dict) -> bool:
+        return self._read_current_configs(arguments) is not None
+
+
+    def apply(self, arguments: dict, connection_state: str,
+              secondary_monitor: str) -> dict[str, tuple[str, bytes, bytes]] | None:
+
+        # Puts the pre-rendered configs for the connection state in place. Returns the configs that
+        # changed, as {path: (config name, previous content, new content)}, or None if the cache can
+        # not be used, in which case nothing was changed.
+
+        current_configs = self._read_current_configs(arguments)
+
+        if current_configs is None:
+            return None
+
+        artifacts = self._manifest['artifacts'].get(artifact_key(connection_state, secondary_monitor))
+
+        if artifacts is None:
+            return None
+
+        # Read every pre-rendered config needed before putting any in place, so a missing one leaves
+        # the configs as they were
+
+        changed_configs = {}
+
+        for config_path, artifact_hash in artifacts.items():
+            previous, previous_hash = current_configs[config_path]
+
+            if previous_hash == artifact_hash:
+                continue
+
+            try:
+                with open(self.artifact_path(artifact_hash), 'rb') as artifact_file:
+                    data = artifact_file.read()
+            except OSError:
+                return None
+
+            changed_configs[config_path] = (self._manifest['configs'][config_path], previous, data)
+
+        for config_path, (_, _, data) in changed_configs.items():
+            write_config_file(config_path, data)
+
+        return changed_configs
+
+
+    def save(self, arguments: dict, configs: dict[str, str], artifacts: dict[str, dict[str, bytes]]):
+
+        # Replaces whatever was compiled before. configs maps each config path to its name in the
+        # generation store, artifacts maps each artifact key to the content of each config.
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'arguments': arguments,
+            'configs': configs,
+            'artifacts': {}
+        }
+
+        for key, config_artifacts in artifacts.items():
+            manifest['artifacts'][key] = {}
+
+            for config_path, data in config_artifacts.items():
+                artifact_hash = self.hash(data)
+                artifact_path = self.artifact_path(artifact_hash)
+
+                if not os.path.exists(artifact_path):
+                    write_config_file(artifact_path, data)
+
+                manifest['artifacts'][key][config_path] = artifact_hash
+
+        write_config_file(self._manifest_path, json.dumps(manifest))
+
+        referenced_artifacts = {artifact_hash for config_artifacts in manifest['artifacts'].values()
+                                for artifact_hash in config_artifacts.values()}
+
+        # A file still being written is left alone, e.g. by a compile that was killed
+
+        for file_name in os.listdir(self._cache_dir):
+            if file_name != MANIFEST_FILE_NAME and file_name not in referenced_artifacts \
+                    and not file_name.endswith(TMP_SUFFIX):
+                os.remove(f'{self._cache_dir}/{file_name}')
+
+
+    def _read_current_configs(self, arguments: dict) -> dict[str, tuple[bytes, str]] | None:
+
+        # The content and hash of each config the cache covers, or None if the cache is stale
+
+        manifest = self._load_manifest()
+
+        if manifest is None or manifest['arguments'] != arguments:
+            return None
+
+        current_configs = {}
+
+        for config_path in manifest['configs']:
+            try:
+                with open(config_path, 'rb') as config_file:
+                    data = config_file.read()
+            except OSError:
+                return None
+
+            data_hash = self.hash(data)
+
+            if data_hash not in self._config_hashes.get(config_path, ()):
+                return None
+
+            current_configs[config_path] = (data, data_hash)
+
+        return current_configs
+
+
+    def _load_manifest(self) -> dict | None:
+
+        # Re-read only when the manifest was compiled again since the last read
+
+        try:
+            stat = os.stat(self._manifest_path)
+        except FileNotFoundError:
+            self._manifest = None
+            self._manifest_stat = None
+
+            return None
+
+        if (stat.st_ino, stat.st_mtime_ns) != self._manifest_stat:
+            try:
+                with open(self._manifest_path, 'r') as manifest_file:
+                    manifest = json.load(manifest_file)
+            except ValueError:
+                manifest = None
+
+            if manifest and manifest.get('version') != MANIFEST_VERSION:
+                manifest = None
+
+            self._manifest = manifest
+            self._manifest_stat = (stat.st_ino, stat.st_mtime_ns)
+            self._config_hashes = {}
+
+            for config_artifacts in (manifest['artifacts'].values() if manifest else []):
+                for config_path, artifact_hash in config_artifacts.items():
+                    self._config_hashes.setdefault(config_path, set()).add(artifact_hash)
+
+        return self._manifest
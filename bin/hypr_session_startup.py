@@ -0,0 +1,540 @@
+#!/usr/bin/env python
+
+# Start the Hyprland session as a graph of steps, each run as soon as the steps it depends on are done,
+# instead of one after the other. Steps that do not depend on each other run in parallel, and the
+# steps that need Hyprland or swww wait until their sockets actually answer rather than on ordering luck:
+#
+#       wallpaper   -> pick the next background image from the shuffle bag and set it on the swww line
+#       layout      -> set up the monitor layout, see bin/set_hypr_monitor_config.py
+#       hyprland    -> start Hyprland once both are in place (or with --no-launch, wait for the one a
+#                      display manager starts), ready when its request socket answers with the monitors
+#       swww        -> wait for swww-daemon, started by the "exec-once = swww-daemon" line, ready when
+#                      "swww query" gets an answer from it
+#       background  -> show the image through swww
+#       workspace   -> switch to workspace 1 through the Hyprland socket
+#       desktop     -> usable once the background is shown and workspace 1 is focused
+#
+# The "exec-once = swww img" and "exec-once = hyprctl dispatch workspace 1" lines stay in hyprland.conf,
+# so a session started some other way still gets them. They may fire before swww-daemon or the monitors
+# are up, which is why the background and workspace steps apply them again once those are ready.
+#
+# The wallpaper and layout steps both rewrite hyprland.conf, each under the config lock, see
+# bin/hypr_config_writer.py, so neither edit is lost.
+#
+# Once the desktop is usable, it prints the critical path, i.e. the chain of steps, each waiting on the
+# one before it, that the time to a usable desktop was spent on, and exits. Hyprland keeps running.
+#
+# For example:
+#
+#       $HOME/bin/hypr_session_startup.py \
+#           -l DP-1 1920x1080 75 0x0 1 \
+#           -c DP-2 1920x1080 60 1920x0 1 \
+#           -r HDMI-A-1 1920x1080 75 3840x0 1 \
+#           -b eDP-1 1366x768 60 5680x0 1 \
+#           -s l \
+#           -w \
+#           -d Pictures/background_images/hypr
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import socket
+import subprocess
+import sys
+
+from time import monotonic
+
+import hypr_monitor_hot_swap
+
+from hypr_conf import load_hypr_conf
+from hypr_shuffle_bag import ShuffleBag
+
+from hypr_config_writer import (
+    SWWW_IMAGE_EDIT,
+    ConfigEdit,
+    submit_or_write_config_edit
+)
+
+from hypr_ipc import (
+    HYPRLAND_INSTANCE_SIGNATURE,
+    MONITORS_REQUEST,
+    REQUEST_SOCKET_NAME,
+    XDG_RUNTIME_DIR,
+    HyprlandIpc,
+    HyprlandIpcError,
+    find_socket_dir
+)
+
+HOME_DIR = os.getenv('HOME')
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HYPRLAND_COMMAND = ['Hyprland']
+TTY_PATH = '/dev/tty'
+SWWW_IMAGE_COMMAND = ['swww', 'img']
+SWWW_QUERY_COMMAND = ['swww', 'query']
+WORKSPACE_REQUEST = 'dispatch workspace 1'
+
+# Newer Hyprland versions keep the sockets under $XDG_RUNTIME_DIR, older ones under /tmp. Next to them
+# is hyprland.lock, its pid on the first line and the name of its Wayland socket on the second. The
+# swww socket is not looked for, since its name changed between swww versions, swww query is asked.
+
+HYPRLAND_SOCKET_GLOBS = [f'{XDG_RUNTIME_DIR}/hypr/*/{REQUEST_SOCKET_NAME}', f'/tmp/hypr/*/{REQUEST_SOCKET_NAME}']
+HYPRLAND_LOCK_FILE_NAME = 'hyprland.lock'
+
+READINESS_POLL_SECONDS = 0.05
+HYPRLAND_READY_TIMEOUT_SECONDS = 30
+SWWW_READY_TIMEOUT_SECONDS = 10
+SWWW_QUERY_TIMEOUT_SECONDS = 1
+
+
+class StartupStepError(Exception):
+    pass
+
+
+class StartupStep(object):
+
+    _name: str
+    _dependencies: list
+    _action: object
+    _started_at: float | None
+    _finished_at: float | None
+    _error: str | None
+
+
+    def __init__(self, name: str, dependencies: list, action):
+        self._name = name
+        self._dependencies = dependencies
+        self._action = action
+        self._started_at = None
+        self._finished_at = None
+        self._error = None
+
+
+    def __repr__(self):
+        if self._error:
+            return f'{self._name}: {self._error}'
+
+        if self._finished_at is None:
+            return f'{self._name}: not run'
+
+        return f'{self._name}: {self._started_at:.3f}s -> {self._finished_at:.3f}s ({self.duration:.3f}s)'
+
+
+    @property
+    def name(self):
+        return self._name
+
+
+    @property
+    def dependencies(self):
+        return self._dependencies
+
+
+    @property
+    def started_at(self):
+        return self._started_at
+
+
+    @property
+    def finished_at(self):
+        return self._finished_at
+
+
+    @property
+    def duration(self):
+        return self._finished_at - self._started_at
+
+
+    @property
+    def error(self):
+        return self._error
+
+
+    @property
+    def succeeded(self):
+        return self._finished_at is not None and self._error is None
+
+
+    async def run(self, dependency_tasks: list[asyncio.Task], started_at: float):
+
+        # Times are relative to when the graph started running
+
+        await asyncio.gather(*dependency_tasks)
+
+        failed_dependencies = [dependency.name for dependency in self._dependencies if not dependency.succeeded]
+
+        if failed_dependencies:
+            self._error = f'skipped, {", ".join(failed_dependencies)} did not finish'
+            return
+
+        self._started_at = monotonic() - started_at
+
+        # A step that fails is reported along with the others, rather than taking the whole startup down
+
+        try:
+            await self._action()
+        except Exception as error:
+            self._error = str(error)
+        finally:
+            self._finished_at = monotonic() - started_at
+
+
+class StartupGraph(object):
+
+    # Steps can only depend on steps added before them, so the graph can not have a cycle
+
+    _steps: dict[str, StartupStep]
+
+
+    def __init__(self):
+        self._steps = {}
+
+
+    @property
+    def steps(self):
+        return list(self._steps.values())
+
+
+    def add(self, name: str, dependencies: list[str], action) -> StartupStep:
+        step = StartupStep(name, [self._steps[dependency] for dependency in dependencies], action)
+        self._steps[name] = step
+
+        return step
+
+
+    async def run(self):
+        started_at = monotonic()
+        tasks = {}
+
+        for step in self._steps.values():
+            tasks[step.name] = asyncio.create_task(
+                    step.run([tasks[dependency.name] for dependency in step.dependencies], started_at))
+
+        await asyncio.gather(*tasks.values())
+
+
+    def critical_path(self, step: StartupStep) -> list[StartupStep]:
+
+        # Walks back from the step through whichever of each step's dependencies finished last, i.e.
+        # the one it actually waited for
+
+        path = [step]
+
+        while step.dependencies:
+            step = max(step.dependencies, key=lambda dependency: dependency.finished_at)
+            path.insert(0, step)
+
+        return path
+
+
+async def wait_until(check, timeout: float, what: str):
+
+    # Polls check until it returns something other than None, which is then returned. The checks make
+    # blocking socket requests, so they run in a thread, leaving the loop to the steps running meanwhile.
+
+    deadline = monotonic() + timeout
+
+    while (result := await asyncio.to_thread(check)) is None:
+        if monotonic() > deadline:
+            raise StartupStepError(f'{what} was not ready after {timeout} seconds')
+
+        await asyncio.sleep(READINESS_POLL_SECONDS)
+
+    return result
+
+
+def hyprland_wayland_display(socket_dir: str) -> str | None:
+    try:
+        with open(f'{socket_dir}/{HYPRLAND_LOCK_FILE_NAME}', 'r') as lock_file:
+            lock_lines = lock_file.read().splitlines()
+    except OSError:
+        lock_lines = []
+
+    if len(lock_lines) > 1 and lock_lines[1]:
+        return lock_lines[1]
+
+    return os.getenv('WAYLAND_DISPLAY')
+
+
+def socket_accepts(socket_path: str) -> bool:
+
+    # A socket file left behind by a previous session is there, but nothing listens on it
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_CLOEXEC) as probe_socket:
+        try:
+            probe_socket.connect(socket_path)
+        except OSError:
+            return False
+
+    return True
+
+
+def hyprland_socket_dirs() -> set[str]:
+    return {os.path.dirname(socket_path) for socket_glob in HYPRLAND_SOCKET_GLOBS
+            for socket_path in glob.glob(socket_glob)}
+
+
+class SessionStartup(object):
+
+    _cli_args: argparse.Namespace
+    _graph: StartupGraph
+    _image: str | None
+    _hyprland_process: subprocess.Popen | None
+    _stale_socket_dirs: set[str]
+    _hyprland_ipc: HyprlandIpc | None
+    _swww_environment: dict[str, str] | None
+
+
+    def __init__(self, cli_args: argparse.Namespace):
+        self._cli_args = cli_args
+        self._image = None
+        self._hyprland_process = None
+        self._stale_socket_dirs = set()
+        self._hyprland_ipc = None
+        self._swww_environment = None
+
+        self._graph = StartupGraph()
+        self._graph.add('wallpaper', [], self.pick_wallpaper)
+        self._graph.add('layout', [], self.set_monitor_layout)
+        self._graph.add('hyprland', ['wallpaper', 'layout'], self.start_hyprland)
+        self._graph.add('swww', ['hyprland'], self.wait_for_swww)
+        self._graph.add('background', ['wallpaper', 'swww'], self.show_background)
+        self._graph.add('workspace', ['hyprland'], self.focus_first_workspace)
+        self._graph.add('desktop', ['background', 'workspace'], self.desktop_usable)
+
+
+    @property
+    def graph(self):
+        return self._graph
+
+
+    async def pick_wallpaper(self):
+        if not self._cli_args.background_images_dir:
+            self._image = load_hypr_conf().swww_image()
+            return
+
+        try:
+            await asyncio.to_thread(self._set_next_image)
+        except (OSError, ValueError) as error:
+            raise StartupStepError(f'could not set the background image: {error}')
+
+
+    def _set_next_image(self):
+        self._image = ShuffleBag(f'{HOME_DIR}/{self._cli_args.background_images_dir}').next_image()
+
+        if self._image:
+            submit_or_write_config_edit(ConfigEdit(SWWW_IMAGE_EDIT, self._image))
+        else:
+            self._image = load_hypr_conf().swww_image()
+
+
+    async def set_monitor_layout(self):
+
+        # --compile renders the configs for every monitor connection state ahead of time, see
+        # bin/hypr_prerendered_configs.py
+
+        layout_process = await asyncio.create_subprocess_exec(
+                sys.executable, f'{BIN_DIR}/set_hypr_monitor_config.py',
+                *hypr_monitor_hot_swap.monitor_arguments(self._cli_args), '--compile'
+            )
+
+        if await layout_process.wait() != 0:
+            raise StartupStepError(f'set_hypr_monitor_config.py exited with {layout_process.returncode}')
+
+
+    async def start_hyprland(self):
+        if self._cli_args.no_launch:
+            socket_dir = find_socket_dir() if HYPRLAND_INSTANCE_SIGNATURE else None
+        else:
+            socket_dir = None
+            self._stale_socket_dirs = hyprland_socket_dirs()
+
+            # Hyprland's output goes to the TTY it is started from, as with "Hyprland & disown" before,
+            # rather than into this script's log. Hyprland keeps a log of its own in its socket dir.
+
+            try:
+                hyprland_output = open(TTY_PATH, 'wb')
+            except OSError:
+                hyprland_output = subprocess.DEVNULL
+
+            try:
+                self._hyprland_process = subprocess.Popen(HYPRLAND_COMMAND, stdout=hyprland_output,
+                                                          stderr=hyprland_output)
+            except OSError as error:
+                raise StartupStepError(f'could not start Hyprland: {error}')
+            finally:
+                if hyprland_output is not subprocess.DEVNULL:
+                    hyprland_output.close()
+
+        socket_dir = await wait_until(lambda: socket_dir or self._new_hyprland_socket_dir(),
+                                      self._cli_args.ready_timeout, 'Hyprland')
+        self._hyprland_ipc = HyprlandIpc(socket_dir)
+
+        # The request socket is created before the monitors are set up, so it is only ready once it
+        # reports at least one
+
+        await wait_until(self._hyprland_monitors, self._cli_args.ready_timeout, 'Hyprland')
+
+
+    def _new_hyprland_socket_dir(self) -> str | None:
+        if self._hyprland_process and self._hyprland_process.poll() is not None:
+            raise StartupStepError(f'Hyprland exited with {self._hyprland_process.returncode}')
+
+        for socket_dir in hyprland_socket_dirs() - self._stale_socket_dirs:
+            if socket_accepts(f'{socket_dir}/{REQUEST_SOCKET_NAME}'):
+                return socket_dir
+
+        return None
+
+
+    def _hyprland_monitors(self) -> list | None:
+        if self._hyprland_process and self._hyprland_process.poll() is not None:
+            raise StartupStepError(f'Hyprland exited with {self._hyprland_process.returncode}')
+
+        try:
+            monitors = json.loads(self._hyprland_ipc.request(MONITORS_REQUEST))
+        except (HyprlandIpcError, ValueError):
+            return None
+
+        return monitors or None
+
+
+    async def wait_for_swww(self):
+
+        # The swww client finds the daemon's socket through the Wayland display, which is not set
+        # when started from a TTY
+
+        self._swww_environment = dict(os.environ,
+                                      HYPRLAND_INSTANCE_SIGNATURE=os.path.basename(self._hyprland_ipc.socket_dir))
+        wayland_display = hyprland_wayland_display(self._hyprland_ipc.socket_dir)
+
+        if wayland_display:
+            self._swww_environment['WAYLAND_DISPLAY'] = wayland_display
+
+        await wait_until(self._swww_answers, SWWW_READY_TIMEOUT_SECONDS, 'swww-daemon')
+
+
+    def _swww_answers(self) -> bool | None:
+        try:
+            swww_query = subprocess.run(SWWW_QUERY_COMMAND, env=self._swww_environment, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, timeout=SWWW_QUERY_TIMEOUT_SECONDS)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+
+        return True if swww_query.returncode == 0 else None
+
+
+    async def show_background(self):
+        if not self._image:
+            return
+
+        swww_process = await asyncio.create_subprocess_exec(*SWWW_IMAGE_COMMAND, self._image,
+                                                            env=self._swww_environment)
+
+        if await swww_process.wait() != 0:
+            raise StartupStepError(f'swww img exited with {swww_process.returncode}')
+
+
+    async def focus_first_workspace(self):
+        try:
+            await asyncio.to_thread(self._hyprland_ipc.request, WORKSPACE_REQUEST)
+        except HyprlandIpcError as error:
+            raise StartupStepError(str(error))
+
+
+    async def desktop_usable(self):
+        pass
+
+
+    def report(self) -> bool:
+
+        # Prints the critical path and the time to a usable desktop. Returns whether the desktop
+        # became usable.
+
+        if self._cli_args.verbose:
+            for step in self._graph.steps:
+                print(step)
+
+        desktop = self._graph.steps[-1]
+
+        if not desktop.succeeded:
+            for step in self._graph.steps:
+                if step.error and not step.error.startswith('skipped'):
+                    print(f'Error! Startup step {step}', file=sys.stderr)
+
+            return False
+
+        critical_path = self._graph.critical_path(desktop)
+
+        print(f'Critical path: {" -> ".join(f"{step.name} ({step.duration:.3f}s)" for step in critical_path)}')
+        print(f'Usable desktop after {desktop.finished_at:.3f}s')
+
+        return True
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Starts a Hyprland session: picks the background image and sets up the monitor layout in parallel,
+    starts Hyprland, then shows the background and focuses workspace 1 once Hyprland and swww are
+    ready. Prints the critical path and the time to a usable desktop.
+    ''',
+        epilog='Hyprland session startup',
+        argument_default=None,
+        usage='''
+    [-h]
+    [--left-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--center-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--right-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--builtin-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    --secondary-monitor <l|r>
+    [--when-external-connected-disable-builtin]
+    [--background-images-dir <dir relative to $HOME>]
+    [--no-launch]
+    [--ready-timeout <seconds>]
+    [--verbose]
+
+    For help with the monitor values, see https://wiki.hyprland.org/configuring/monitors/
+    '''
+        )
+
+    hypr_monitor_hot_swap.add_monitor_arguments(arg_parser)
+
+    arg_parser.add_argument(
+        '--background-images-dir',
+        '-d',
+        help='Background images directory, relative to $HOME, the image in hyprland.conf is kept if not given'
+        )
+
+    arg_parser.add_argument(
+        '--no-launch',
+        help='Do not start Hyprland, wait for the one a display manager starts instead',
+        action='store_true'
+        )
+
+    arg_parser.add_argument(
+        '--ready-timeout',
+        help=f'Seconds to wait for Hyprland to be ready, defaults to {HYPRLAND_READY_TIMEOUT_SECONDS}',
+        type=float,
+        default=HYPRLAND_READY_TIMEOUT_SECONDS
+        )
+
+    arg_parser.add_argument(
+        '--verbose',
+        '-v',
+        help='Print when each step started and finished',
+        action='store_true'
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    if not hypr_monitor_hot_swap.validate_monitor_arguments(cli_args):
+        exit(1)
+
+    session_startup = SessionStartup(cli_args)
+    asyncio.run(session_startup.graph.run())
+
+    if not session_startup.report():
+        exit(1)
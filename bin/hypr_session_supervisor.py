@@ -0,0 +1,703 @@
+#!/usr/bin/env python
+
+# Host all of the resident session helpers in one process, on one asyncio event loop, instead of
+# four separate loops each with their own timers:
+#
+#       hotplug    -> what bin/hypr_monitor_hot_swap.py did, but woken by drm uevents rather than
+#                     polling (polling is only the fallback when netlink is missing, see bin/hypr_drm_poller.py)
+#       background -> what bin/hypr_background_changer did, images from the same shuffle bag
+#       battery    -> bin/hypr_battery_monitor.py
+#       waybar     -> what bin/run_waybar.sh did, restarting Waybar when its config changes
+#
+# The power-profile task watches the power source and stretches the background interval, restricts
+# the background transitions, and relaxes the hotplug polling fallback when on battery, returning to
+# full cadence on AC. See bin/hypr_power_profile.py for the profiles and their options.
+#
+# All uevents arrive on one netlink socket, all config file changes on one inotify fd and all Hyprland
+# events on one connection to its event socket (see bin/hypr_ipc.py), and each helper is a task that
+# is restarted on its own (with a backoff) if it crashes, without taking the others down.
+#
+# It also queues the edits other tools make to hyprland.conf, e.g. bin/hypr_rand_background_image
+# setting the image of the swww line, and writes everything pending within a settle window in one go,
+# folded into a hot swap if one happens meanwhile, so Hyprland reloads once. See bin/hypr_config_writer.py.
+#
+# This is meant to be started from within Hyprland, see bin/run_hypr_env_scripts. The monitor layout
+# for the start of the session is set up by bin/set_hypr_monitor_config.py, see bin/hypr_start.
+#
+# For example:
+#
+#       $HOME/bin/hypr_session_supervisor.py \
+#           -l DP-1 1920x1080 75 0x0 1 \
+#           -c DP-2 1920x1080 60 1920x0 1 \
+#           -r HDMI-A-1 1920x1080 75 3840x0 1 \
+#           -b eDP-1 1366x768 60 5680x0 1 \
+#           -s l \
+#           -w \
+#           -d Pictures/background_images/hypr \
+#           -m 1 & disown
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import traceback
+
+from time import monotonic
+
+import hypr_monitor_hot_swap
+import set_hypr_monitor_config
+
+from hypr_background_rotator import BackgroundRotator
+from hypr_config_writer import ConfigWriterQueue
+from hypr_drm_poller import add_poll_arguments
+from hypr_hotplug_trace import (
+    HotplugTraceRecorder,
+    add_record_trace_argument
+)
+from hypr_monitor_config import HyprMonitorConfig
+from hypr_battery_monitor import (
+    BATTERY_CHECK_INTERVAL_SECONDS,
+    MAX_BATTERY_CHECK_INTERVAL_SECONDS,
+    BatteryMonitor
+)
+from hypr_power_supply import POWER_SUPPLY_SUBSYSTEM
+from hypr_power_profile import (
+    POWER_PROFILE_CHECK_INTERVAL_SECONDS,
+    PowerProfileWatcher,
+    add_power_profile_arguments,
+    build_power_profile_watcher
+)
+from hypr_shuffle_bag import ShuffleBag
+from hypr_uevent import (
+    UEVENTS_LOST_KEY,
+    UeventListener
+)
+
+from hypr_ipc import (
+    CONFIG_RELOADED_EVENT,
+    HyprlandIpc,
+    HyprlandIpcError
+)
+
+from hypr_monitor_hot_swap import (
+    HYPRLAND_APPLY_TIMEOUT_SECONDS,
+    MAX_REAPPLY_ATTEMPTS
+)
+
+from hypr_inotify import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_MOVED_TO,
+    Inotify
+)
+
+HOME_DIR = os.getenv('HOME')
+
+DRM_SUBSYSTEM = 'drm'
+HOTPLUG_SETTLE_SECONDS = 0.5
+
+WAYBAR_CONFIG_DIR = f'{HOME_DIR}/.config/waybar'
+WAYBAR_CONFIG_FILES = {'config', 'style.css'}
+WAYBAR_COMMAND = ['waybar']
+WAYBAR_RESTART_DELAY_SECONDS = 1
+
+TASK_RESTART_MIN_SECONDS = 1
+TASK_RESTART_MAX_SECONDS = 60
+
+TASK_NAMES = ['hotplug', 'background', 'battery', 'waybar', 'power-profile']
+
+
+class EventHub(object):
+
+    # Owns the single netlink socket, the single inotify fd and the single Hyprland event socket of the
+    # process, and wakes whichever tasks are interested in what arrives on them
+
+    _loop: asyncio.AbstractEventLoop
+    _uevent_listener: UeventListener
+    _inotify: Inotify | None
+    _hyprland_ipc: HyprlandIpc
+    _hyprland_event_fd: int | None
+    _subsystem_events: dict[str, list[asyncio.Event]]
+    _watches: dict[int, list[tuple[set[str], asyncio.Event]]]
+    _hyprland_events: dict[str, list[asyncio.Event]]
+
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._subsystem_events = {}
+        self._watches = {}
+        self._hyprland_events = {}
+        self._uevent_listener = UeventListener()
+        self._hyprland_ipc = HyprlandIpc()
+        self._hyprland_event_fd = None
+
+        if self._uevent_listener.available:
+            loop.add_reader(self._uevent_listener.fileno(), self._on_uevents)
+
+        try:
+            self._inotify = Inotify()
+            loop.add_reader(self._inotify.fileno(), self._on_inotify_events)
+        except OSError:
+            self._inotify = None
+
+        self.connect_hyprland_events()
+
+
+    @property
+    def uevents_available(self):
+        return self._uevent_listener.available
+
+
+    @property
+    def inotify_available(self):
+        return self._inotify is not None
+
+
+    @property
+    def hyprland_ipc(self):
+        return self._hyprland_ipc
+
+
+    def close(self):
+        if self._uevent_listener.available:
+            self._loop.remove_reader(self._uevent_listener.fileno())
+            self._uevent_listener.close()
+
+        if self._inotify:
+            self._loop.remove_reader(self._inotify.fileno())
+            self._inotify.close()
+
+        if self._hyprland_event_fd is not None:
+            self._loop.remove_reader(self._hyprland_event_fd)
+            self._hyprland_ipc.close()
+
+
+    def connect_hyprland_events(self) -> bool:
+
+        # Keeps the Hyprland event socket drained, which is what keeps the cached j/monitors answers of
+        # the IPC client current, see bin/hypr_ipc.py. Reconnects if Hyprland restarted.
+
+        if self._hyprland_event_fd is None and self._hyprland_ipc.connect_events():
+            self._hyprland_event_fd = self._hyprland_ipc.event_fileno()
+            self._loop.add_reader(self._hyprland_event_fd, self._on_hyprland_events)
+
+        return self._hyprland_event_fd is not None
+
+
+    def subscribe_hyprland_event(self, event_name: str) -> asyncio.Event:
+        hyprland_event = asyncio.Event()
+        self._hyprland_events.setdefault(event_name, []).append(hyprland_event)
+
+        return hyprland_event
+
+
+    def unsubscribe_hyprland_event(self, event_name: str, hyprland_event: asyncio.Event):
+        self._hyprland_events.get(event_name, []).remove(hyprland_event)
+
+
+    def subscribe_uevents(self, subsystem: str) -> asyncio.Event:
+
+        # Each subscriber gets its own event to wait on and clear
+
+        subsystem_event = asyncio.Event()
+        self._subsystem_events.setdefault(subsystem, []).append(subsystem_event)
+
+        return subsystem_event
+
+
+    def unsubscribe_uevents(self, subsystem: str, subsystem_event: asyncio.Event):
+        self._subsystem_events.get(subsystem, []).remove(subsystem_event)
+
+
+    def watch_files(self, directory: str, file_names: set[str]) -> asyncio.Event:
+
+        # Watch the directory rather than the files, since the files get replaced by a rename when
+        # edited by most editors and by bin/set_hypr_monitor_config.py
+
+        changed = asyncio.Event()
+
+        if self._inotify:
+            watch_descriptor = self._inotify.add_watch(directory, IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            watches = self._watches.setdefault(watch_descriptor, [])
+
+            # A restarted task asks for the same watch again, so hand it the one it had before
+
+            for watched_file_names, watched_changed in watches:
+                if watched_file_names == file_names:
+                    return watched_changed
+
+            watches.append((file_names, changed))
+
+        return changed
+
+
+    def _on_uevents(self):
+        for uevent in self._uevent_listener.receive():
+
+            # Lost uevents could have been of any subsystem, so everybody rescans
+
+            if UEVENTS_LOST_KEY in uevent:
+                subsystem_events = [subsystem_event for subsystem_events in self._subsystem_events.values()
+                                    for subsystem_event in subsystem_events]
+            else:
+                subsystem_events = self._subsystem_events.get(uevent.get('SUBSYSTEM'), [])
+
+            for subsystem_event in subsystem_events:
+                subsystem_event.set()
+
+
+    def _on_hyprland_events(self):
+        for event_name, _ in self._hyprland_ipc.read_events():
+            for hyprland_event in self._hyprland_events.get(event_name, []):
+                hyprland_event.set()
+
+        if not self._hyprland_ipc.events_connected:
+            self._loop.remove_reader(self._hyprland_event_fd)
+            self._hyprland_event_fd = None
+
+
+    def _on_inotify_events(self):
+        for inotify_event in self._inotify.read_events():
+            for file_names, changed in self._watches.get(inotify_event.watch_descriptor, []):
+                if inotify_event.name in file_names:
+                    changed.set()
+
+
+async def wait_for_event(event: asyncio.Event, timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(event.wait(), max(timeout, 0))
+    except asyncio.TimeoutError:
+        return False
+
+    event.clear()
+
+    return True
+
+
+class SessionSupervisor(object):
+
+    _cli_args: argparse.Namespace
+    _event_hub: EventHub | None
+    _stopping: asyncio.Event | None
+    _config_writer_queue: ConfigWriterQueue | None
+    _hotplug_trace: HotplugTraceRecorder | None
+    _power_profile_watcher: PowerProfileWatcher
+    _power_profile_subscribers: list[asyncio.Event]
+
+
+    def __init__(self, cli_args: argparse.Namespace):
+        self._cli_args = cli_args
+        self._event_hub = None
+        self._stopping = None
+        self._config_writer_queue = None
+        self._hotplug_trace = None
+        self._power_profile_watcher = build_power_profile_watcher(cli_args)
+        self._power_profile_subscribers = []
+
+
+    def log(self, message: str):
+        if self._cli_args.verbose:
+            print(message, flush=True)
+
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        self._event_hub = EventHub(loop)
+        self._stopping = asyncio.Event()
+
+        for stop_signal in [signal.SIGTERM, signal.SIGINT, signal.SIGHUP]:
+            loop.add_signal_handler(stop_signal, self._stopping.set)
+
+        # One trace for the whole run, so a restarted hotplug task keeps recording to it
+
+        if self._cli_args.record_trace:
+            self._hotplug_trace = HotplugTraceRecorder(self._cli_args.record_trace,
+                                                       hypr_monitor_hot_swap.monitor_arguments(self._cli_args))
+
+        # Without the queue, the tools write their edits themselves, under the config lock
+
+        if not self._cli_args.dry_run:
+            self._config_writer_queue = ConfigWriterQueue()
+
+            try:
+                await self._config_writer_queue.start()
+            except OSError as error:
+                print(f'Could not start the config writer queue: {error}', file=sys.stderr, flush=True)
+                self._config_writer_queue = None
+
+        task_factories = {
+            'hotplug': self.watch_hotplug,
+            'background': self.rotate_background,
+            'battery': self.watch_battery,
+            'waybar': self.supervise_waybar,
+            'power-profile': self.watch_power_profile
+        }
+
+        tasks = [asyncio.create_task(self.supervise(name, task_factory))
+                 for name, task_factory in task_factories.items() if name not in self._cli_args.disable_task]
+
+        await self._stopping.wait()
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self._config_writer_queue:
+            self._config_writer_queue.close()
+
+        if self._hotplug_trace:
+            self._hotplug_trace.close()
+
+        self._event_hub.close()
+
+
+    async def supervise(self, name: str, task_factory):
+        restart_delay = TASK_RESTART_MIN_SECONDS
+
+        while True:
+            started_at = monotonic()
+
+            try:
+                await task_factory()
+                self.log(f'{name} task finished')
+
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                print(f'Error! {name} task crashed:', file=sys.stderr)
+                traceback.print_exc()
+
+            if monotonic() - started_at > TASK_RESTART_MAX_SECONDS:
+                restart_delay = TASK_RESTART_MIN_SECONDS
+
+            print(f'Restarting {name} task in {restart_delay} seconds', file=sys.stderr, flush=True)
+
+            await asyncio.sleep(restart_delay)
+
+            restart_delay = min(restart_delay * 2, TASK_RESTART_MAX_SECONDS)
+
+
+    async def hot_swap(self, hypr_monitor_config: HyprMonitorConfig,
+                       config_reloaded: asyncio.Event) -> tuple[bool, bool | None]:
+
+        # Hot swap, then check through the Hyprland socket that Hyprland applied the new layout, and
+        # only if it did not, have it reload the config again. Returns whether a config was written and
+        # whether the live layout matches, or None if there is no Hyprland to ask.
+
+        hyprland_events_connected = self._event_hub.connect_hyprland_events()
+        config_reloaded.clear()
+
+        # Whatever edits are queued are written along with the new layout, rather than in a write of
+        # their own once their settle window has passed
+
+        config_edits, waiters = self._config_writer_queue.take_pending() if self._config_writer_queue else ([], [])
+
+        # Reading the connectors, rendering and writing the configs (which may wait on the config lock,
+        # or compile the pre-rendered configs again) is done in a thread, so the other tasks keep running
+
+        try:
+            config_written = await asyncio.to_thread(hypr_monitor_hot_swap.hot_swap, hypr_monitor_config,
+                                                     self._cli_args, config_edits)
+        except BaseException as error:
+
+            # Including the task being cancelled, so the tools never wait on an edit nobody writes
+
+            ConfigWriterQueue.done(waiters, repr(error))
+            raise
+
+        ConfigWriterQueue.done(waiters)
+
+        if self._cli_args.dry_run or not hyprland_events_connected:
+            return config_written, None
+
+        if config_written:
+            await wait_for_event(config_reloaded, HYPRLAND_APPLY_TIMEOUT_SECONDS)
+
+        # The Hyprland requests block for up to their socket timeout, so they are made in a thread too
+
+        for attempt in range(MAX_REAPPLY_ATTEMPTS + 1):
+            try:
+                mismatches = hypr_monitor_hot_swap.live_monitor_mismatches(
+                        hypr_monitor_config, await asyncio.to_thread(self._event_hub.hyprland_ipc.monitors))
+            except (HyprlandIpcError, ValueError, KeyError) as error:
+                print(f'Could not check the monitor layout Hyprland applied: {error}', file=sys.stderr, flush=True)
+                return config_written, False
+
+            if not mismatches:
+                self.log('Hyprland applied the monitor layout')
+                return config_written, True
+
+            print(f'Hyprland did not apply the monitor layout: {"; ".join(mismatches)}', file=sys.stderr, flush=True)
+
+            if attempt < MAX_REAPPLY_ATTEMPTS:
+                config_reloaded.clear()
+
+                try:
+                    await asyncio.to_thread(self._event_hub.hyprland_ipc.reload)
+                except HyprlandIpcError as error:
+                    print(f'Could not reload the Hyprland config: {error}', file=sys.stderr, flush=True)
+                    return config_written, False
+
+                await wait_for_event(config_reloaded, HYPRLAND_APPLY_TIMEOUT_SECONDS)
+
+        return config_written, False
+
+
+    async def traced_hot_swap(self, hypr_monitor_config: HyprMonitorConfig, config_reloaded: asyncio.Event):
+
+        # Records the hot swap in the trace, if one is being recorded, see bin/hypr_hotplug_trace.py
+
+        config_written, layout_applied = await self.hot_swap(hypr_monitor_config, config_reloaded)
+
+        if self._hotplug_trace:
+            self._hotplug_trace.record_applied(hypr_monitor_config.connection_state,
+                                               hypr_monitor_config.connector_states, config_written, layout_applied)
+
+        # Once the swap is verified, compile the pre-rendered configs again if it found them stale
+
+        await asyncio.to_thread(set_hypr_monitor_config.compile_stale_prerendered_configs)
+
+
+    async def watch_hotplug(self):
+        hypr_monitor_config = hypr_monitor_hot_swap.build_hypr_monitor_config(self._cli_args)
+        drm_changed = self._event_hub.subscribe_uevents(DRM_SUBSYSTEM)
+        config_reloaded = self._event_hub.subscribe_hyprland_event(CONFIG_RELOADED_EVENT)
+
+        try:
+            if self._hotplug_trace:
+                self._hotplug_trace.record_connectors(hypr_monitor_config.read_connector_states())
+
+            await self.traced_hot_swap(hypr_monitor_config, config_reloaded)
+
+            while True:
+                if self._event_hub.uevents_available:
+                    await drm_changed.wait()
+                    drm_changed.clear()
+
+                    # Connecting a dock sends a burst of uevents, one per connector, so let it settle
+
+                    await asyncio.sleep(self._cli_args.hotplug_settle)
+                    drm_changed.clear()
+                else:
+                    await asyncio.sleep(hypr_monitor_config.status_poller.scaled_poll_interval(
+                            self._power_profile_watcher.current_profile.interval_scale))
+
+                monitor_connection_changes = hypr_monitor_config.any_monitor_connection_changes()
+
+                if not self._event_hub.uevents_available:
+                    hypr_monitor_config.status_poller.backoff(monitor_connection_changes)
+
+                if monitor_connection_changes:
+                    self.log('Monitor connections changed, hot swapping the monitor configuration')
+
+                    if self._hotplug_trace:
+                        self._hotplug_trace.record_connectors(hypr_monitor_config.polled_connector_states)
+
+                    await self.traced_hot_swap(hypr_monitor_config, config_reloaded)
+        finally:
+            self._event_hub.unsubscribe_uevents(DRM_SUBSYSTEM, drm_changed)
+            self._event_hub.unsubscribe_hyprland_event(CONFIG_RELOADED_EVENT, config_reloaded)
+
+
+    async def rotate_background(self):
+        if not self._cli_args.background_images_dir:
+            return
+
+        background_rotator = BackgroundRotator(
+                ShuffleBag(f'{HOME_DIR}/{self._cli_args.background_images_dir}'),
+                self._cli_args.minutes_between_transitions * 60
+            )
+
+        power_profile_changed = self.subscribe_power_profile()
+
+        try:
+            while True:
+                waiting_since = monotonic()
+
+                # A profile change stretches or shrinks the interval already being waited on
+
+                while await wait_for_event(power_profile_changed,
+                                           waiting_since - monotonic() + background_rotator.seconds_between_transitions
+                                           * self._power_profile_watcher.current_profile.interval_scale):
+                    pass
+
+                # Picking the image waits on the shuffle bag's lock and stats its directories
+
+                swww_command = await asyncio.to_thread(background_rotator.next_command,
+                                                       self._power_profile_watcher.current_profile.transition_types)
+
+                if swww_command:
+                    self.log(f'Changing background => {swww_command}')
+
+                    swww_process = await asyncio.create_subprocess_exec(*swww_command)
+                    await swww_process.wait()
+        finally:
+            self._power_profile_subscribers.remove(power_profile_changed)
+
+
+    async def watch_battery(self):
+        power_supply_changed = self._event_hub.subscribe_uevents(POWER_SUPPLY_SUBSYSTEM)
+
+        # Without uevents an unplug is only noticed at the next check, so keep checks frequent while charging
+
+        battery_monitor = BatteryMonitor(max_check_interval=MAX_BATTERY_CHECK_INTERVAL_SECONDS
+                                         if self._event_hub.uevents_available else BATTERY_CHECK_INTERVAL_SECONDS,
+                                         verbose=self._cli_args.verbose)
+
+        try:
+            if not battery_monitor.batteries:
+                return
+
+            while True:
+                # A check may run notify-send or the hibernate command, so it does not block the other tasks
+
+                next_check_seconds = await asyncio.to_thread(battery_monitor.check)
+                await wait_for_event(power_supply_changed, next_check_seconds)
+        finally:
+            self._event_hub.unsubscribe_uevents(POWER_SUPPLY_SUBSYSTEM, power_supply_changed)
+
+
+    def subscribe_power_profile(self) -> asyncio.Event:
+        power_profile_changed = asyncio.Event()
+        self._power_profile_subscribers.append(power_profile_changed)
+
+        return power_profile_changed
+
+
+    async def watch_power_profile(self):
+        power_supply_changed = self._event_hub.subscribe_uevents(POWER_SUPPLY_SUBSYSTEM)
+
+        try:
+            while True:
+                await wait_for_event(power_supply_changed, POWER_PROFILE_CHECK_INTERVAL_SECONDS)
+
+                if self._power_profile_watcher.update():
+                    for power_profile_changed in self._power_profile_subscribers:
+                        power_profile_changed.set()
+        finally:
+            self._event_hub.unsubscribe_uevents(POWER_SUPPLY_SUBSYSTEM, power_supply_changed)
+
+
+    async def supervise_waybar(self):
+        config_changed = self._event_hub.watch_files(WAYBAR_CONFIG_DIR, WAYBAR_CONFIG_FILES)
+
+        while True:
+            config_changed.clear()
+
+            waybar_process = await asyncio.create_subprocess_exec(*WAYBAR_COMMAND)
+            waybar_exited = asyncio.create_task(waybar_process.wait())
+            config_change = asyncio.create_task(config_changed.wait())
+
+            try:
+                await asyncio.wait({waybar_exited, config_change}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                config_was_changed = config_change.done()
+                config_change.cancel()
+
+                if waybar_process.returncode is None:
+                    waybar_process.terminate()
+                    await waybar_exited
+
+            if config_was_changed:
+                self.log('Waybar config changed, restarting Waybar')
+            else:
+                self.log(f'Waybar exited with {waybar_process.returncode}, restarting it')
+
+                await asyncio.sleep(WAYBAR_RESTART_DELAY_SECONDS)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Runs the monitor hot swapping, background image rotation, battery monitoring and Waybar
+    supervision for a Hyprland session, all in one process.
+    ''',
+        epilog='Hyprland session supervisor',
+        argument_default=None,
+        usage='''
+    [-h]
+    [--left-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--center-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--right-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    [--builtin-monitor <name> <resolution> <refresh-rate> <starting-coordinate> <scale>]
+    --secondary-monitor <l|r>
+    [--when-external-connected-disable-builtin]
+    [--background-images-dir <dir relative to $HOME>]
+    [--minutes-between-transitions <minutes>]
+    [--disable-task <hotplug|background|battery|waybar|power-profile>]
+    [--battery-interval-scale <scale>]
+    [--battery-transition <transition type>]
+    [--low-battery-level <percent>]
+    [--low-battery-interval-scale <scale>]
+    [--low-battery-transition <transition type>]
+    [--poll-interval <seconds>]
+    [--max-poll-interval <seconds>]
+    [--hotplug-settle <seconds>]
+    [--record-trace <file>]
+    [--dry-run]
+    [--verbose]
+
+    For help with the monitor values, see https://wiki.hyprland.org/configuring/monitors/
+    '''
+        )
+
+    hypr_monitor_hot_swap.add_monitor_arguments(arg_parser)
+
+    arg_parser.add_argument(
+        '--background-images-dir',
+        '-d',
+        help='Background images directory, relative to $HOME, no background rotation if not given'
+        )
+
+    arg_parser.add_argument(
+        '--minutes-between-transitions',
+        '-m',
+        help='Minutes between background image transitions, defaults to 1',
+        type=float,
+        default=1
+        )
+
+    add_power_profile_arguments(arg_parser)
+    add_poll_arguments(arg_parser)
+
+    arg_parser.add_argument(
+        '--hotplug-settle',
+        help='Seconds to let a burst of drm uevents settle before hot swapping, defaults to '
+             + f'{HOTPLUG_SETTLE_SECONDS}',
+        type=float,
+        default=HOTPLUG_SETTLE_SECONDS
+        )
+
+    add_record_trace_argument(arg_parser)
+
+    arg_parser.add_argument(
+        '--disable-task',
+        help='Do not run the given helper, may be given more than once',
+        action='append',
+        choices=TASK_NAMES,
+        default=[]
+        )
+
+    arg_parser.add_argument(
+        '--dry-run',
+        help='Output new monitor config files, but do not overwrite existing configs',
+        action='store_true'
+        )
+
+    arg_parser.add_argument(
+        '--verbose',
+        '-v',
+        help='Print output to the CLI verbosely',
+        action='store_true'
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    if not hypr_monitor_hot_swap.validate_monitor_arguments(cli_args):
+        exit(1)
+
+    asyncio.run(SessionSupervisor(cli_args).run())
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+# Persistent shuffle bag for choosing background images. Shared by bin/hypr_rand_background_image
+# (at session start) and bin/hypr_background_changer (during the session), so that every image in the
+# background images directory is shown once before any image is repeated, across reboots.
+#
+# The state file holds the whole bag in a compact binary layout:
+#
+#       header  -> magic, number of images, cursor, hash of the mtimes of the directories, size of
+#                  the directories blob
+#       order   -> one uint32 catalog index per image, in shuffled order
+#       offsets -> one uint32 byte offset per image (plus one end offset) into the paths blob
+#       paths   -> the absolute image paths, utf-8 encoded, back to back
+#       dirs    -> the images directory and every directory below it, utf-8 encoded, NUL separated
+#
+# Picking the next image only reads the header, the directories, one order slot, two offsets and one
+# path, stats each directory, and writes back the 4 byte cursor. The images directory is only walked
+# again when the bag is first created, when the mtime of any of the directories changes (an image or
+# a directory was added to, removed from or renamed in it), or when --rebuild is given. When the cursor
+# reaches the end of the bag the order array is reshuffled in place, making sure the first image of the
+# new round is not the last image of the previous one.
+#
+# Every pick stats every directory in the tree while holding the lock. That is nothing for the handful of
+# directories a background images tree has, but it grows with the number of subdirectories, so keep the
+# tree shallow.
+#
+# As with the * globs the shell scripts used before, hidden files and directories are skipped, and so
+# is anything that is not an image swww can show (by its extension), e.g. a Thumbs.db or a .directory.
+#
+# For example:
+#
+#                   $HOME/bin/hypr_shuffle_bag.py -d Pictures/background_images/hypr
+
+import argparse
+import fcntl
+import hashlib
+import os
+import random
+import struct
+import sys
+
+HOME_DIR = os.getenv('HOME')
+CACHE_DIR = os.getenv('XDG_CACHE_HOME', f'{HOME_DIR}/.cache')
+SHUFFLE_BAG_STATE_FILE = f'{CACHE_DIR}/hypr/background_shuffle_bag'
+
+IMAGE_EXTENSIONS = {'.avif', '.bmp', '.gif', '.jpeg', '.jpg', '.png', '.pnm', '.tga', '.tif', '.tiff', '.webp'}
+
+SHUFFLE_BAG_MAGIC = b'HSB3'
+HEADER_FORMAT = '<4sIIqI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CURSOR_OFFSET = struct.calcsize('<4sI')
+SLOT_FORMAT = '<I'
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+
+
+class ShuffleBag(object):
+
+    _images_dir: str
+    _state_file: str
+
+
+    def __init__(self, images_dir: str, state_file: str = SHUFFLE_BAG_STATE_FILE):
+        self._images_dir = os.path.abspath(images_dir)
+        self._state_file = state_file
+
+
+    @property
+    def images_dir(self):
+        return self._images_dir
+
+
+    @property
+    def state_file(self):
+        return self._state_file
+
+
+    def next_image(self, rebuild: bool = False) -> str | None:
+        os.makedirs(os.path.dirname(self._state_file), exist_ok=True)
+
+        fd = os.open(self._state_file, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            # Both tools may pick at the same time, e.g. at session start, so serialize on the state file
+
+            fcntl.flock(fd, fcntl.LOCK_EX)
+
+            header = os.pread(fd, HEADER_SIZE, 0)
+
+            if rebuild or not self._header_is_current(fd, header):
+                self._build(fd)
+                header = os.pread(fd, HEADER_SIZE, 0)
+
+            _, num_images, cursor, _, _ = struct.unpack(HEADER_FORMAT, header)
+
+            if num_images == 0:
+                return None
+
+            if cursor >= num_images:
+                self._reshuffle(fd, num_images)
+                cursor = 0
+
+            image_index = self._read_slot(fd, HEADER_SIZE + cursor * SLOT_SIZE)
+
+            offsets_start = HEADER_SIZE + num_images * SLOT_SIZE
+            path_start, path_end = struct.unpack(
+                    '<II',
+                    os.pread(fd, 2 * SLOT_SIZE, offsets_start + image_index * SLOT_SIZE)
+                )
+
+            paths_start = offsets_start + (num_images + 1) * SLOT_SIZE
+            image = os.pread(fd, path_end - path_start, paths_start + path_start).decode()
+
+            os.pwrite(fd, struct.pack(SLOT_FORMAT, cursor + 1), CURSOR_OFFSET)
+
+            return image
+        finally:
+            os.close(fd)
+
+
+    def _header_is_current(self, fd: int, header: bytes) -> bool:
+        if len(header) != HEADER_SIZE:
+            return False
+
+        magic, _, _, dirs_mtime_hash, dirs_size = struct.unpack(HEADER_FORMAT, header)
+
+        if magic != SHUFFLE_BAG_MAGIC:
+            return False
+
+        # The directories are stored last, the first of them being the images directory the bag was built
+        # for, so a bag of another images directory is rebuilt too
+
+        dirs = os.pread(fd, dirs_size, os.fstat(fd).st_size - dirs_size).decode().split('\0')
+
+        try:
+            return dirs[0] == self._images_dir and dirs_mtime_hash == self.mtime_hash(dirs)
+        except FileNotFoundError:
+            return False
+
+
+    @staticmethod
+    def mtime_hash(dirs: list[str]) -> int:
+
+        # Any image added, removed or renamed changes the mtime of the directory it is in
+
+        mtimes = b''.join(struct.pack('<q', os.stat(dir_path).st_mtime_ns) for dir_path in dirs)
+
+        return int.from_bytes(hashlib.blake2b(mtimes, digest_size=8).digest(), 'little', signed=True)
+
+
+    def _build(self, fd: int):
+        images = []
+        dirs = []
+
+        for dir_path, dir_names, file_names in os.walk(self._images_dir):
+            dir_names[:] = sorted(dir_name for dir_name in dir_names if not dir_name.startswith('.'))
+            dirs.append(dir_path)
+            images.extend(f'{dir_path}/{file_name}' for file_name in sorted(file_names)
+                          if not file_name.startswith('.')
+                          and os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS)
+
+        encoded_images = [image.encode() for image in images]
+        offsets = [0]
+
+        for encoded_image in encoded_images:
+            offsets.append(offsets[-1] + len(encoded_image))
+
+        order = list(range(len(images)))
+        random.shuffle(order)
+
+        encoded_dirs = '\0'.join(dirs).encode()
+
+        state = b''.join([
+                struct.pack(HEADER_FORMAT, SHUFFLE_BAG_MAGIC, len(images), 0, self.mtime_hash(dirs),
+                            len(encoded_dirs)),
+                struct.pack(f'<{len(order)}I', *order),
+                struct.pack(f'<{len(offsets)}I', *offsets),
+                b''.join(encoded_images),
+                encoded_dirs
+            ])
+
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, state, 0)
+
+
+    def _reshuffle(self, fd: int, num_images: int):
+        order_size = num_images * SLOT_SIZE
+        order = list(struct.unpack(f'<{num_images}I', os.pread(fd, order_size, HEADER_SIZE)))
+        last_image_index = order[-1]
+
+        random.shuffle(order)
+
+        # Never show the same image twice in a row across the boundary between two rounds
+
+        if num_images > 1 and order[0] == last_image_index:
+            swap_index = random.randrange(1, num_images)
+            order[0], order[swap_index] = order[swap_index], order[0]
+
+        os.pwrite(fd, struct.pack(f'<{num_images}I', *order), HEADER_SIZE)
+
+
+    @staticmethod
+    def _read_slot(fd: int, offset: int) -> int:
+        return struct.unpack(SLOT_FORMAT, os.pread(fd, SLOT_SIZE, offset))[0]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description='''
+    Prints the next background image from a shuffle bag persisted across sessions. Every image in the
+    background images directory is chosen once before any image is chosen again.
+    ''',
+        epilog='Hyprland background image shuffle bag',
+        argument_default=None,
+        usage='''
+    [-h]
+    --background-images-dir <dir relative to $HOME>
+    [--state-file <file>]
+    [--rebuild]
+    '''
+        )
+
+    arg_parser.add_argument(
+        '--background-images-dir',
+        '-d',
+        help='Background images directory, relative to $HOME',
+        required=True
+        )
+
+    arg_parser.add_argument(
+        '--state-file',
+        '-f',
+        help=f'Shuffle bag state file, defaults to {SHUFFLE_BAG_STATE_FILE}',
+        default=SHUFFLE_BAG_STATE_FILE
+        )
+
+    arg_parser.add_argument(
+        '--rebuild',
+        '-r',
+        help='Rescan the background images directory and start a new shuffled round',
+        action='store_true'
+        )
+
+    cli_args = arg_parser.parse_args()
+
+    background_images_dir = f'{HOME_DIR}/{cli_args.background_images_dir}'
+
+    if not os.path.isdir(background_images_dir):
+        print(f'Error! Background images directory {background_images_dir} does not exist!', file=sys.stderr)
+        exit(1)
+
+    next_image = ShuffleBag(background_images_dir, cli_args.state_file).next_image(cli_args.rebuild)
+
+    if not next_image:
+        print(f'Error! No images found in {background_images_dir}!', file=sys.stderr)
+        exit(1)
+
+    print(next_image)
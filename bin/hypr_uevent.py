@@ -0,0 +1,139 @@
+import errno
+import os
+import select
+import socket
+
+from time import sleep
+
+# Kernel uevents, i.e. what udev itself listens to, are broadcast on this netlink family/group
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+UEVENT_BUFFER_SIZE = 64 * 1024
+
+SUBSYSTEM_KEY = 'SUBSYSTEM'
+
+# When uevents come in faster than they are read (e.g. a dock with many devices) the kernel drops them
+# and the next read fails with ENOBUFS. A uevent with just this key is then handed out in place of the
+# lost ones, whatever their subsystem, so callers rescan instead of trusting what they last saw.
+
+UEVENTS_LOST_KEY = 'UEVENTS_LOST'
+UEVENTS_LOST = {UEVENTS_LOST_KEY: '1'}
+
+# HYPR_UEVENT_SOCKET makes the listener bind a unix datagram socket at that path instead, so fake
+# uevents, in the same format, can be sent to it, see bin/hypr_hotplug_replay.py
+
+UEVENT_SOCKET = os.getenv('HYPR_UEVENT_SOCKET')
+
+
+class UeventListener(object):
+
+    _socket: socket.socket | None
+    _subsystems: set[str] | None
+
+
+    def __init__(self, subsystems: set[str] = None):
+        self._subsystems = subsystems
+
+        try:
+            if UEVENT_SOCKET:
+                self._socket = self._bind_fake_socket(UEVENT_SOCKET)
+            else:
+                self._socket = socket.socket(socket.AF_NETLINK,
+                                             socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+                                             NETLINK_KOBJECT_UEVENT)
+                self._socket.bind((0, UEVENT_KERNEL_GROUP))
+        except (AttributeError, OSError):
+
+            # No netlink available (e.g. inside a container), so callers just fall back to their
+            # timeouts, i.e. plain polling
+
+            self._socket = None
+
+
+    @property
+    def available(self):
+        return self._socket is not None
+
+
+    def fileno(self) -> int:
+        return self._socket.fileno() if self._socket else -1
+
+
+    def close(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+
+    def receive(self) -> list[dict[str, str]]:
+        uevents = []
+
+        if not self._socket:
+            return uevents
+
+        while True:
+            try:
+                message = self._socket.recv(UEVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as error:
+                if error.errno != errno.ENOBUFS:
+                    raise
+
+                if UEVENTS_LOST not in uevents:
+                    uevents.append(dict(UEVENTS_LOST))
+
+                continue
+
+            uevent = self.parse(message)
+
+            if uevent and (not self._subsystems or uevent.get(SUBSYSTEM_KEY) in self._subsystems):
+                uevents.append(uevent)
+
+        return uevents
+
+
+    def wait(self, timeout: float) -> list[dict[str, str]]:
+        if not self._socket:
+            sleep(max(timeout, 0))
+            return []
+
+        readable, _, _ = select.select([self._socket], [], [], max(timeout, 0))
+
+        return self.receive() if readable else []
+
+
+    @staticmethod
+    def _bind_fake_socket(socket_path: str) -> socket.socket:
+        fake_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC)
+
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+
+        fake_socket.bind(socket_path)
+
+        return fake_socket
+
+
+    @staticmethod
+    def parse(message: bytes) -> dict[str, str] | None:
+
+        # A kernel uevent is "<action>@<devpath>\0KEY=VALUE\0KEY=VALUE\0..."
+
+        fields = message.decode(errors='replace').split('\0')
+
+        if not fields or '@' not in fields[0]:
+            return None
+
+        uevent = {}
+
+        for field in fields[1:]:
+            key, separator, value = field.partition('=')
+
+            if separator:
+                uevent[key] = value
+
+        return uevent
@@ -0,0 +1,377 @@
+import json
+import os
+
+# A model of the Waybar config (JSON with comments and trailing commas, i.e. JSONC), parsed once and
+# cached by the file's mtime and size. It records, for every bar, the byte offsets of its "output"
+# value, so a hot swap only splices new values in at those offsets instead of rewriting the config
+# line by line. Both the single line form ("output": ["DP-2", ],) and any multi line form are found.
+#
+# The config may be one bar (a top level object) or several bars (a top level array of objects).
+# With several bars, each bar is taken to belong to the monitor it is named after ("name": "DP-2"),
+# or else the first monitor in its "output", and is enabled (output set to that monitor) or disabled
+# (output set to [], which Waybar matches against no monitor at all) based on whether that monitor is
+# in use. Give each such bar a "name", since a bar known only by its output can not be found again
+# once it was disabled. With one bar, the bar is just moved to the monitor it should be on. A bar with
+# no "output" at all is on every monitor and is left alone.
+
+OUTPUT_KEY = 'output'
+NAME_KEY = 'name'
+WHITESPACE = b' \t\r\n'
+TMP_SUFFIX = '.tmp'
+
+
+class WaybarConfigError(ValueError):
+    pass
+
+
+class WaybarBar(object):
+
+    _name: str | None
+    _outputs: list[str]
+    _output_start: int | None
+    _output_end: int | None
+    _object_end: int
+
+
+    def __init__(self, name: str | None, outputs: list[str], output_start: int | None, output_end: int | None,
+                 object_end: int):
+        self._name = name
+        self._outputs = outputs
+        self._output_start = output_start
+        self._output_end = output_end
+        self._object_end = object_end
+
+
+    @property
+    def name(self):
+        return self._name
+
+
+    @property
+    def outputs(self):
+        return self._outputs
+
+
+    @property
+    def output_start(self):
+        return self._output_start
+
+
+    @property
+    def output_end(self):
+        return self._output_end
+
+
+    @property
+    def object_end(self):
+        return self._object_end
+
+
+    @property
+    def monitor_name(self) -> str | None:
+        if self._name:
+            return self._name
+
+        return next((output for output in self._outputs if not output.startswith('!')), None)
+
+
+class _JsoncScanner(object):
+
+    _data: bytes
+
+
+    def __init__(self, data: bytes):
+        self._data = data
+
+
+    def skip(self, position: int) -> int:
+
+        # Skip whitespace and comments
+
+        data = self._data
+
+        while position < len(data):
+            if data[position] in WHITESPACE:
+                position += 1
+            elif data.startswith(b'//', position):
+                line_end = data.find(b'\n', position)
+                position = len(data) if line_end < 0 else line_end + 1
+            elif data.startswith(b'/*', position):
+                comment_end = data.find(b'*/', position + 2)
+
+                if comment_end < 0:
+                    raise WaybarConfigError(f'Unterminated comment at byte {position}')
+
+                position = comment_end + 2
+            else:
+                break
+
+        return position
+
+
+    def expect(self, position: int, token: bytes) -> int:
+        position = self.skip(position)
+
+        if not self._data.startswith(token, position):
+            raise WaybarConfigError(f'Expected {token.decode()} at byte {position}')
+
+        return position + len(token)
+
+
+    def peek(self, position: int) -> bytes:
+        position = self.skip(position)
+
+        return self._data[position:position + 1]
+
+
+    def string(self, position: int) -> tuple[int, str]:
+        position = self.skip(position)
+        start = position
+
+        if self._data[position:position + 1] != b'"':
+            raise WaybarConfigError(f'Expected a string at byte {position}')
+
+        position += 1
+
+        while position < len(self._data):
+            if self._data[position] == ord('\\'):
+                position += 2
+            elif self._data[position] == ord('"'):
+                return position + 1, json.loads(self._data[start:position + 1])
+            else:
+                position += 1
+
+        raise WaybarConfigError(f'Unterminated string at byte {start}')
+
+
+    def value(self, position: int) -> int:
+
+        # Skip over any value, returning where it ends
+
+        position = self.skip(position)
+        token = self._data[position:position + 1]
+
+        if token == b'"':
+            return self.string(position)[0]
+
+        if token == b'{':
+            return self.members(position, lambda key, start, end: None)
+
+        if token == b'[':
+            return self.elements(position, lambda start, end: None)
+
+        end = position
+
+        while end < len(self._data) and self._data[end:end + 1] not in b',]}/ \t\r\n':
+            end += 1
+
+        if end == position:
+            raise WaybarConfigError(f'Expected a value at byte {position}')
+
+        return end
+
+
+    def members(self, position: int, on_member) -> int:
+        position = self.expect(position, b'{')
+
+        while self.peek(position) != b'}':
+            position, key = self.string(position)
+            position = self.expect(position, b':')
+            value_start = self.skip(position)
+            position = self.value(value_start)
+
+            on_member(key, value_start, position)
+
+            if self.peek(position) == b',':
+                position = self.expect(position, b',')
+            elif self.peek(position) != b'}':
+                raise WaybarConfigError(f'Expected , or }} at byte {self.skip(position)}')
+
+        return self.expect(position, b'}')
+
+
+    def elements(self, position: int, on_element) -> int:
+        position = self.expect(position, b'[')
+
+        while self.peek(position) != b']':
+            element_start = self.skip(position)
+            position = self.value(element_start)
+
+            on_element(element_start, position)
+
+            if self.peek(position) == b',':
+                position = self.expect(position, b',')
+            elif self.peek(position) != b']':
+                raise WaybarConfigError(f'Expected , or ] at byte {self.skip(position)}')
+
+        return self.expect(position, b']')
+
+
+class WaybarConfig(object):
+
+    _path: str
+    _data: bytes
+    _mtime_ns: int
+    _size: int
+    _multiple_bars: bool
+    _bars: list[WaybarBar]
+
+
+    def __init__(self, path: str, data: bytes, mtime_ns: int, size: int):
+        self._path = path
+        self._data = data
+        self._mtime_ns = mtime_ns
+        self._size = size
+        self._bars = []
+
+        scanner = _JsoncScanner(data)
+
+        if scanner.peek(0) == b'[':
+            end = scanner.elements(0, lambda start, end: self._bars.append(self._parse_bar(scanner, start)))
+        else:
+            self._bars.append(self._parse_bar(scanner, 0))
+            end = self._bars[0].object_end
+
+        # An array holding just one bar is still one bar that follows the Waybar monitor around
+
+        self._multiple_bars = len(self._bars) > 1
+
+        if scanner.skip(end) != len(data):
+            raise WaybarConfigError(f'Unexpected content after byte {end} in {path}')
+
+
+    @property
+    def path(self):
+        return self._path
+
+
+    @property
+    def data(self):
+        return self._data
+
+
+    @property
+    def mtime_ns(self):
+        return self._mtime_ns
+
+
+    @property
+    def size(self):
+        return self._size
+
+
+    @property
+    def multiple_bars(self):
+        return self._multiple_bars
+
+
+    @property
+    def bars(self):
+        return self._bars
+
+
+    def _parse_bar(self, scanner: _JsoncScanner, position: int) -> WaybarBar:
+        bar_members = {}
+
+        def on_member(key: str, start: int, end: int):
+            if key in [OUTPUT_KEY, NAME_KEY]:
+                bar_members[key] = (start, end)
+
+        if scanner.peek(position) != b'{':
+            raise WaybarConfigError(f'Expected a bar object at byte {scanner.skip(position)} in {self._path}')
+
+        object_end = scanner.members(position, on_member)
+
+        name = None
+        outputs = []
+        output_start, output_end = bar_members.get(OUTPUT_KEY, (None, None))
+
+        if NAME_KEY in bar_members:
+            name = scanner.string(bar_members[NAME_KEY][0])[1]
+
+        if output_start is not None:
+            if scanner.peek(output_start) == b'[':
+                scanner.elements(output_start,
+                                 lambda start, end: outputs.append(scanner.string(start)[1]))
+            else:
+                outputs.append(scanner.string(output_start)[1])
+
+        return WaybarBar(name, outputs, output_start, output_end, object_end)
+
+
+    def with_outputs(self, primary_output: str, enabled_outputs: list[str]) -> bytes:
+
+        # Returns the config with every bar's "output" patched in at its offsets, leaving every other
+        # byte (comments, formatting, the other modules) exactly as it was. A bar without an "output"
+        # shows on every monitor, as Waybar does it, so it is left as it is.
+
+        patches = []
+
+        for bar in self._bars:
+            if bar.output_start is None:
+                continue
+
+            if self._multiple_bars:
+                outputs = [bar.monitor_name] if bar.monitor_name in enabled_outputs else []
+            else:
+                outputs = [primary_output]
+
+            if outputs != bar.outputs:
+                patches.append((bar.output_start, bar.output_end, self.render_outputs(outputs)))
+
+        data = self._data
+
+        for start, end, replacement in sorted(patches, reverse=True):
+            data = data[:start] + replacement + data[end:]
+
+        return data
+
+
+    @staticmethod
+    def render_outputs(outputs: list[str]) -> bytes:
+
+        # Same form as the existing config, i.e. ["DP-2", ]
+
+        return ('[' + ''.join(f'{json.dumps(output)}, ' for output in outputs) + ']').encode()
+
+
+_waybar_config_cache: dict[str, WaybarConfig] = {}
+
+
+def load_waybar_config(path: str) -> WaybarConfig:
+    stat = os.stat(path)
+    waybar_config = _waybar_config_cache.get(path)
+
+    if waybar_config and waybar_config.mtime_ns == stat.st_mtime_ns and waybar_config.size == stat.st_size:
+        return waybar_config
+
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    waybar_config = WaybarConfig(path, data, stat.st_mtime_ns, stat.st_size)
+    _waybar_config_cache[path] = waybar_config
+
+    return waybar_config
+
+
+def write_waybar_config(path: str, data: bytes) -> bool:
+
+    # Returns whether anything was written. Unchanged content is not written at all, so Waybar is not
+    # restarted for nothing. The temp file is next to the config so the rename stays atomic.
+
+    waybar_config = load_waybar_config(path)
+
+    if data == waybar_config.data:
+        return False
+
+    tmp_path = f'{path}{TMP_SUFFIX}'
+
+    with open(tmp_path, 'wb') as tmp_file:
+        tmp_file.write(data)
+
+    os.replace(tmp_path, path)
+
+    stat = os.stat(path)
+    _waybar_config_cache[path] = WaybarConfig(path, data, stat.st_mtime_ns, stat.st_size)
+
+    return True
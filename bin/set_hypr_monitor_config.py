@@ -14,7 +14,6 @@
 import argparse
 import os
 import sys
-import shutil
 import re
 
 from hypr_monitor_config import (
@@ -22,56 +21,87 @@ from hypr_monitor_config import (
     HyprMonitorConfig
     )
 
+from hypr_config_generations import (
+    HYPR_CONFIG_NAME,
+    WAYBAR_CONFIG_NAME,
+    GenerationStore
+    )
+
+from hypr_conf import (
+    MONITOR_KEYWORD,
+    WORKSPACE_KEYWORD,
+    HyprConf,
+    HyprConfEntry,
+    HyprConfMonitor,
+    HyprConfWorkspace,
+    config_lock,
+    load_hypr_conf,
+    replace_lines,
+    write_config_file
+    )
+
+from hypr_waybar_config import (
+    WaybarConfigError,
+    load_waybar_config,
+    write_waybar_config
+    )
+
+from hypr_config_writer import (
+    ConfigEdit,
+    config_edit_replacements
+    )
+
+from hypr_prerendered_configs import (
+    DISABLE_BUILTIN_ARGUMENT,
+    MONITOR_SLOTS,
+    SECONDARY_MONITOR_SIDES,
+    PrerenderedConfigs,
+    artifact_key,
+    connection_states,
+    monitor_arguments
+    )
+
 HOME_DIR = os.getenv('HOME')
 HYPR_CONFIG_FILE = f'{HOME_DIR}/.config/hypr/hyprland.conf'
-HYPR_CONFIG_FILE_BAK = f'{HOME_DIR}/.config/hypr/hyprland.conf.bak'
 HYPR_CONFIG_TMP_FILE = '/tmp/hypr_config'
 
 WAYBAR_CONFIG_FILE = f'{HOME_DIR}/.config/waybar/config'
-WAYBAR_CONFIG_FILE_BAK = f'{HOME_DIR}/.config/waybar/config.bak'
 WAYBAR_CONFIG_TMP_FILE = '/tmp/waybar_config'
-WAYBAR_POSITION_REGEX = re.compile('^\\s*"output":\\s*\\[\\S+\\s*],\\s*$')
 
+# One of each per process, so the hot swapping daemons keep the generation journal and the manifest of
+# the pre-rendered configs parsed between hot swaps, instead of reading them again for every one
 
-def run(left_monitor_configs: list = None, center_monitor_configs: list = None,
-        right_monitor_configs: list = None, builtin_monitor_configs: list = None,
-        secondary_monitor: str = 'l', when_external_connected_disable_builtin: bool = False,
-        dry_run: bool = False, verbose: bool = False, hypr_monitor_config: HyprMonitorConfig = None):
-
-    shutil.copyfile(HYPR_CONFIG_FILE, HYPR_CONFIG_FILE_BAK)
-    shutil.copyfile(WAYBAR_CONFIG_FILE, WAYBAR_CONFIG_FILE_BAK)
-
-    if hypr_monitor_config:
-        left_monitor_name = hypr_monitor_config.left_monitor.monitor_name \
-            if hypr_monitor_config.left_monitor else None
-        center_monitor_name = hypr_monitor_config.center_monitor.monitor_name \
-            if hypr_monitor_config.center_monitor else None
-        right_monitor_name = hypr_monitor_config.right_monitor.monitor_name \
-            if hypr_monitor_config.right_monitor else None
-        builtin_monitor_name = hypr_monitor_config.builtin_monitor.monitor_name \
-            if hypr_monitor_config.builtin_monitor else None
-    else:
-        left_monitor_name = left_monitor_configs[0] if left_monitor_configs else None
-        center_monitor_name = center_monitor_configs[0] if center_monitor_configs else None
-        right_monitor_name = right_monitor_configs[0] if right_monitor_configs else None
-        builtin_monitor_name = builtin_monitor_configs[0] if builtin_monitor_configs else None
+_generation_store: GenerationStore | None = None
+_prerendered_configs: PrerenderedConfigs | None = None
 
-    left_monitor_config_line_regex = re.compile(f'^(#)?monitor\\s*=\\s*{left_monitor_name}.*$') \
-        if left_monitor_name else None
 
-    center_monitor_config_line_regex = re.compile(f'^(#)?monitor\\s*=\\s*{center_monitor_name}.*$') \
-        if center_monitor_name else None
+def shared_generation_store() -> GenerationStore:
+    global _generation_store
 
-    right_monitor_config_line_regex = re.compile(f'^(#)?monitor\\s*=\\s*{right_monitor_name}.*$') \
-        if right_monitor_name else None
+    if _generation_store is None:
+        _generation_store = GenerationStore()
 
-    builtin_monitor_config_line_regex = re.compile(f'^(#)?monitor\\s*=\\s*{builtin_monitor_name}.*$') \
-        if builtin_monitor_name else None
+    return _generation_store
 
-    workspace_one_through_five_config_line = re.compile('^workspace\\s*=\\s*[1-5],.*$')
-    workspace_six_through_seven_config_line = re.compile('^workspace\\s*=\\s*[6-7],.*$')
-    workspace_eight_through_ten_config_line = re.compile('^workspace\\s*=\\s*([8-9]|10),.*$')
-    workspace_eleven_config_line = re.compile('^workspace\\s*=\\s*11,.*$')
+
+def shared_prerendered_configs() -> PrerenderedConfigs:
+    global _prerendered_configs
+
+    if _prerendered_configs is None:
+        _prerendered_configs = PrerenderedConfigs()
+
+    return _prerendered_configs
+
+
+def run(left_monitor_configs: list = None, center_monitor_configs: list = None,
+        right_monitor_configs: list = None, builtin_monitor_configs: list = None,
+        secondary_monitor: str = 'l', when_external_connected_disable_builtin: bool = False,
+        dry_run: bool = False, verbose: bool = False, hypr_monitor_config: HyprMonitorConfig = None,
+        config_edits: list[ConfigEdit] = None) -> bool:
+
+    # Returns whether the Hyprland config was written, i.e. whether Hyprland will reload it. Any
+    # config_edits (see bin/hypr_config_writer.py) are written along with the monitor layout, in the
+    # same write.
 
     if not hypr_monitor_config:
         hypr_monitor_config = HyprMonitorConfig(
@@ -107,6 +137,20 @@ def run(left_monitor_configs: list = None, center_monitor_configs: list = None,
                 when_external_connected_disable_builtin
         )
 
+    # Taken before the connected monitors are set, which moves the monitors' positions around
+
+    prerender_arguments = monitor_arguments(hypr_monitor_config)
+
+    # Held from reading the configs until the new ones are in place, so an edit another tool makes
+    # meanwhile is neither lost nor overwritten, see config_lock in bin/hypr_conf.py
+
+    with config_lock(HYPR_CONFIG_FILE):
+        return set_monitor_configs(hypr_monitor_config, prerender_arguments, dry_run, verbose, config_edits or [])
+
+
+def set_monitor_configs(hypr_monitor_config: HyprMonitorConfig, prerender_arguments: dict, dry_run: bool,
+                        verbose: bool, config_edits: list[ConfigEdit]) -> bool:
+
     ## Gather and setup configs based on the status of connected and disconnected monitor(s) ##
 
     # Get monitor connection statuses #
@@ -130,61 +174,241 @@ def run(left_monitor_configs: list = None, center_monitor_configs: list = None,
 
     #################### Write configs to file, or if dry_run, send them to stdout #####################
 
-    # Waybar
-
-    with open(WAYBAR_CONFIG_FILE, 'r') as waybar_config_file, \
-            open(WAYBAR_CONFIG_TMP_FILE, 'w') as waybar_config_tmp_file:
-        for line in waybar_config_file:
-            if WAYBAR_POSITION_REGEX.match(line):
-                waybar_config_tmp_file.write(re.sub(WAYBAR_POSITION_REGEX, hypr_monitor_config.waybar_position, line))
-            else:
-                waybar_config_tmp_file.write(line)
-
-    if dry_run:
-        print(f'See generated Waybar config in:\n\t{WAYBAR_CONFIG_TMP_FILE}')
-    elif verbose:
-        with open(WAYBAR_CONFIG_TMP_FILE, 'r') as waybar_config_tmp_file:
-            print(waybar_config_tmp_file.read())
-    else:
-        shutil.move(WAYBAR_CONFIG_TMP_FILE, WAYBAR_CONFIG_FILE)
-
-    # Hyprland
-
-    with open(HYPR_CONFIG_FILE, 'r') as hypr_config_file, \
-            open(HYPR_CONFIG_TMP_FILE,'w') as hypr_config_tmp_file:
-
-        for line in hypr_config_file:
-            if left_monitor_config_line_regex and left_monitor_config_line_regex.match(line):
-                hypr_config_tmp_file.write(repr(hypr_monitor_config.left_monitor))
-            elif center_monitor_config_line_regex and center_monitor_config_line_regex.match(line):
-                hypr_config_tmp_file.write(repr(hypr_monitor_config.center_monitor))
-            elif right_monitor_config_line_regex and right_monitor_config_line_regex.match(line):
-                hypr_config_tmp_file.write(repr(hypr_monitor_config.right_monitor))
-            elif builtin_monitor_config_line_regex and builtin_monitor_config_line_regex.match(line):
-                hypr_config_tmp_file.write(repr(hypr_monitor_config.builtin_monitor))
-            elif workspace_one_through_five_config_line.match(line):
-                hypr_config_tmp_file.write(hypr_monitor_config.handle_workspaces_1_through_5_config(line))
-            elif workspace_six_through_seven_config_line.match(line):
-                hypr_config_tmp_file.write(hypr_monitor_config.handle_workspaces_6_and_7_config(line))
-            elif workspace_eight_through_ten_config_line.match(line):
-                hypr_config_tmp_file.write(hypr_monitor_config.handle_workspaces_8_through_10_config(line))
-            elif workspace_eleven_config_line.match(line):
-                new_ws11_line = re.sub(r'default:(true|false)',
-                                       'default:true'
-                                               if hypr_monitor_config.any_external_monitors_connected()
-                                               else 'default:false',
-                                       line)
-                hypr_config_tmp_file.write(new_ws11_line)
-            else:
-                hypr_config_tmp_file.write(line)
-
-    if dry_run:
-        print(f'See generated Hyprland config in:\n\t{HYPR_CONFIG_TMP_FILE}')
-    elif verbose:
-        with open(HYPR_CONFIG_TMP_FILE, 'r') as hypr_config_tmp_file:
-            print(hypr_config_tmp_file.read())
+    # Every config written is recorded in the generation store (see bin/hypr_config_generations.py),
+    # which replaces the old .bak copies. When a config is rewritten from the same content for the same
+    # layout plan as before, the output recorded back then is reused instead of rendering it again.
+
+    generation_store = shared_generation_store()
+    connection_state = hypr_monitor_config.connection_state
+    layout_plan = hypr_monitor_config.layout_plan
+
+    # When the configs were compiled for every connection state ahead of time (see --compile and
+    # bin/hypr_prerendered_configs.py), putting the ones for this state in place is all there is to do,
+    # unless there are other edits to write along with them
+
+    prerendered_configs = shared_prerendered_configs()
+    secondary_monitor = 'l' if hypr_monitor_config.secondary_monitor_left else 'r'
+
+    if not dry_run and not verbose and not config_edits:
+        changed_configs = prerendered_configs.apply(prerender_arguments, connection_state, secondary_monitor)
+
+        if changed_configs is not None:
+            for config_name, previous, new_config in changed_configs.values():
+                generation_store.record(config_name, connection_state, GenerationStore.input_key(previous, layout_plan),
+                                        previous, new_config)
+
+            return any(config_name != WAYBAR_CONFIG_NAME for config_name, _, _ in changed_configs.values())
+
+    # Waybar. The config model is cached by mtime, so the daemon only re-parses it when it was edited
+    # by hand. Each bar's "output" value is patched at its known offsets, see bin/hypr_waybar_config.py
+
+    try:
+        waybar_config = load_waybar_config(WAYBAR_CONFIG_FILE)
+        waybar_input_key = GenerationStore.input_key(waybar_config.data, layout_plan)
+        new_waybar_config = generation_store.lookup(WAYBAR_CONFIG_NAME, waybar_input_key)
+
+        if new_waybar_config is None:
+            new_waybar_config = waybar_config.with_outputs(hypr_monitor_config.waybar_output,
+                                                           hypr_monitor_config.enabled_monitor_names)
+    except WaybarConfigError as error:
+        print(f'Error! Could not update the Waybar config: {error}', file=sys.stderr)
     else:
-        shutil.move(HYPR_CONFIG_TMP_FILE, HYPR_CONFIG_FILE)
+        if dry_run:
+            with open(WAYBAR_CONFIG_TMP_FILE, 'wb') as waybar_config_tmp_file:
+                waybar_config_tmp_file.write(new_waybar_config)
+
+            print(f'See generated Waybar config in:\n\t{WAYBAR_CONFIG_TMP_FILE}')
+        elif verbose:
+            print(new_waybar_config.decode())
+        elif write_waybar_config(WAYBAR_CONFIG_FILE, new_waybar_config):
+            generation_store.record(WAYBAR_CONFIG_NAME, connection_state, waybar_input_key, waybar_config.data,
+                                    new_waybar_config)
+
+    # Hyprland. The monitor and workspace lines are found through the config model (see
+    # bin/hypr_conf.py), in whichever sourced file they are in, and only those lines are replaced, along
+    # with the lines of any other edits. The edits are part of the plan the output is recorded for.
+
+    hypr_conf = load_hypr_conf(HYPR_CONFIG_FILE)
+    hypr_config_written = False
+    hypr_entries = hypr_config_entries(hypr_conf)
+    edit_replacements = config_edit_replacements(hypr_conf, config_edits)
+    hypr_layout_plan = layout_plan + ''.join(f'{config_edit}\n' for config_edit in config_edits)
+
+    for hypr_config_file_name in [*hypr_entries, *[path for path in edit_replacements if path not in hypr_entries]]:
+        entries = hypr_entries.get(hypr_config_file_name, [])
+        is_main_config_file = hypr_config_file_name == hypr_conf.path
+        config_name = hypr_config_name(hypr_conf, hypr_config_file_name)
+        hypr_config_tmp_file_name = HYPR_CONFIG_TMP_FILE if is_main_config_file \
+            else f'{HYPR_CONFIG_TMP_FILE}.{os.path.basename(hypr_config_file_name)}'
+
+        with open(hypr_config_file_name, 'rb') as hypr_config_file:
+            hypr_config = hypr_config_file.read()
+
+        hypr_input_key = GenerationStore.input_key(hypr_config, hypr_layout_plan)
+        new_hypr_config = generation_store.lookup(config_name, hypr_input_key)
+
+        if new_hypr_config is None:
+            new_hypr_config = render_hypr_config(hypr_monitor_config, hypr_config, entries,
+                                                 edit_replacements.get(hypr_config_file_name))
+
+        if dry_run:
+            with open(hypr_config_tmp_file_name, 'wb') as hypr_config_tmp_file:
+                hypr_config_tmp_file.write(new_hypr_config)
+
+            print(f'See generated Hyprland config in:\n\t{hypr_config_tmp_file_name}')
+        elif verbose:
+            print(new_hypr_config.decode())
+        elif new_hypr_config != hypr_config:
+            write_config_file(hypr_config_file_name, new_hypr_config.decode())
+            generation_store.record(config_name, connection_state, hypr_input_key, hypr_config, new_hypr_config)
+            hypr_config_written = True
+
+    # The cache could not be used, e.g. a config was edited, so it is compiled again once the configs
+    # for this hot swap are in place and the lock is released, see compile_stale_prerendered_configs
+
+    if prerendered_configs.compiled and not dry_run and not verbose:
+        prerendered_configs.mark_stale(prerender_arguments)
+
+    return hypr_config_written
+
+
+def hypr_config_entries(hypr_conf: HyprConf) -> dict[str, list[HyprConfEntry]]:
+
+    # The monitor and workspace entries that are rewritten, by the file they are in
+
+    entries = {}
+
+    for entry in [*hypr_conf.find(MONITOR_KEYWORD, include_commented=True), *hypr_conf.find(WORKSPACE_KEYWORD)]:
+        if not entry.section:
+            entries.setdefault(entry.file, []).append(entry)
+
+    return entries
+
+
+def hypr_config_name(hypr_conf: HyprConf, hypr_config_file_name: str) -> str:
+
+    # The name of a Hyprland config file in the generation store
+
+    if hypr_config_file_name == hypr_conf.path:
+        return HYPR_CONFIG_NAME
+
+    return f'{HYPR_CONFIG_NAME}:{hypr_config_file_name}'
+
+
+def render_hypr_config(hypr_monitor_config: HyprMonitorConfig, hypr_config: bytes,
+                       entries: list[HyprConfEntry], edit_replacements: dict[int, str] = None) -> bytes:
+    hypr_config_lines = hypr_config.decode().splitlines(keepends=True)
+    replacements = dict(edit_replacements or {})
+
+    for entry in entries:
+        new_line = render_hypr_config_line(hypr_monitor_config, entry, hypr_config_lines[entry.line_number])
+
+        if new_line is not None:
+            replacements[entry.line_number] = new_line
+
+    return replace_lines(hypr_config.decode(), replacements).encode()
+
+
+def compile_prerendered_configs(arguments: dict, prerendered_configs: PrerenderedConfigs):
+
+    # Renders the Hyprland and Waybar configs for every connection state and secondary monitor side,
+    # from the configs as they are now, see bin/hypr_prerendered_configs.py. Only reading the configs
+    # is done under the lock, so no hot swap or edit waits on all the rendering. A config edited
+    # meanwhile makes the cache stale again, so it is compiled again after the next hot swap.
+
+    with config_lock(HYPR_CONFIG_FILE):
+        try:
+            waybar_config = load_waybar_config(WAYBAR_CONFIG_FILE)
+        except WaybarConfigError:
+            waybar_config = None
+
+        hypr_conf = load_hypr_conf(HYPR_CONFIG_FILE)
+        hypr_configs = {}
+
+        for hypr_config_file_name, entries in hypr_config_entries(hypr_conf).items():
+            with open(hypr_config_file_name, 'rb') as hypr_config_file:
+                hypr_configs[hypr_config_file_name] = (hypr_config_file.read(), entries)
+
+    configs = {WAYBAR_CONFIG_FILE: WAYBAR_CONFIG_NAME} if waybar_config else {}
+    configs.update({hypr_config_file_name: hypr_config_name(hypr_conf, hypr_config_file_name)
+                    for hypr_config_file_name in hypr_configs})
+    artifacts = {}
+
+    for secondary_monitor in SECONDARY_MONITOR_SIDES:
+        monitor_names = [arguments[slot][0] for slot in MONITOR_SLOTS if arguments[slot]]
+
+        for connected_monitor_names in connection_states(monitor_names):
+            hypr_monitor_config = HyprMonitorConfig(
+                    *[HyprMonitor(*arguments[slot]) if arguments[slot] else None for slot in MONITOR_SLOTS],
+                    secondary_monitor,
+                    arguments[DISABLE_BUILTIN_ARGUMENT]
+                )
+
+            # The layout rules assume certain monitor slots are given, e.g. moving the builtin monitor
+            # to where the center monitor would be, so with fewer slots given some connection states
+            # can not be laid out. Those are left out and rendered on the spot, should they come up.
+
+            try:
+                hypr_monitor_config.set_connected_monitor_configs(connected_monitor_names)
+            except AttributeError:
+                continue
+
+            state_artifacts = {}
+
+            if waybar_config:
+                state_artifacts[WAYBAR_CONFIG_FILE] = waybar_config.with_outputs(
+                        hypr_monitor_config.waybar_output, hypr_monitor_config.enabled_monitor_names)
+
+            for hypr_config_file_name, (hypr_config, entries) in hypr_configs.items():
+                state_artifacts[hypr_config_file_name] = render_hypr_config(hypr_monitor_config, hypr_config,
+                                                                            entries)
+
+            artifacts[artifact_key(hypr_monitor_config.connection_state, secondary_monitor)] = state_artifacts
+
+    prerendered_configs.save(arguments, configs, artifacts)
+
+
+def compile_stale_prerendered_configs():
+
+    # Called by whoever hot swaps, once the hot swap is done, so the swap itself never waits on
+    # rendering every connection state
+
+    prerendered_configs = shared_prerendered_configs()
+    stale_arguments = prerendered_configs.take_stale_arguments()
+
+    if stale_arguments is not None:
+        compile_prerendered_configs(stale_arguments, prerendered_configs)
+
+
+def render_hypr_config_line(hypr_monitor_config: HyprMonitorConfig, entry: HyprConfEntry, line: str) -> str | None:
+
+    # The new line for a monitor or workspace entry, or None to leave it as it is
+
+    if entry.keyword == MONITOR_KEYWORD:
+        monitor_name = HyprConfMonitor(entry).name
+
+        for monitor in hypr_monitor_config.monitors:
+            if monitor.monitor_name == monitor_name:
+                return repr(monitor)
+
+        return None
+
+    workspace_number = HyprConfWorkspace(entry).number
+
+    if workspace_number is None:
+        return None
+    elif 1 <= workspace_number <= 5:
+        return hypr_monitor_config.handle_workspaces_1_through_5_config(line)
+    elif 6 <= workspace_number <= 7:
+        return hypr_monitor_config.handle_workspaces_6_and_7_config(line)
+    elif 8 <= workspace_number <= 10:
+        return hypr_monitor_config.handle_workspaces_8_through_10_config(line)
+    elif workspace_number == 11:
+        return re.sub(r'default:(true|false)',
+                      'default:true' if hypr_monitor_config.any_external_monitors_connected() else 'default:false',
+                      line)
+
+    return None
 
 
 if __name__ == "__main__":
@@ -208,6 +432,7 @@ if __name__ == "__main__":
     [--verbose]
     --secondary-monitor <l|r>
     [--when-external-connected-disable-builtin]
+    [--compile]
 
     For help with these values, see https://wiki.hyprland.org/configuring/monitors/
     '''
@@ -270,6 +495,13 @@ if __name__ == "__main__":
             action='store_true'
             )
 
+    arg_parser.add_argument(
+            '--compile',
+            help='Render the configs for every connection state ahead of time, unless that was already done '
+                 + 'for the same configs and monitors, so that hot swaps only have to put them in place',
+            action='store_true'
+            )
+
     cli_args = arg_parser.parse_args()
 
     # If no Hyprland and/or Waybar config backup exists, make them
@@ -289,6 +521,17 @@ if __name__ == "__main__":
         if config and not HyprMonitorConfig.validate_monitor_config_args(config):
             exit(1)
 
+    if cli_args.compile and not cli_args.dry_run:
+        prerender_arguments = {slot: getattr(cli_args, slot) for slot in MONITOR_SLOTS}
+        prerender_arguments[DISABLE_BUILTIN_ARGUMENT] = cli_args.when_external_connected_disable_builtin
+        prerendered_configs = shared_prerendered_configs()
+
+        if not prerendered_configs.is_current(prerender_arguments):
+            compile_prerendered_configs(prerender_arguments, prerendered_configs)
+
+            if cli_args.verbose:
+                print('Compiled the configs for every connection state')
+
     run(cli_args.left_monitor,
         cli_args.center_monitor,
         cli_args.right_monitor,
@@ -297,3 +540,5 @@ if __name__ == "__main__":
         cli_args.when_external_connected_disable_builtin,
         cli_args.dry_run,
         cli_args.verbose)
+
+    compile_stale_prerendered_configs()